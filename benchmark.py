@@ -0,0 +1,381 @@
+from src.logging import logging
+import src.utils as utils
+import src.synthesis_pipeline as synthesis_pipeline
+import src.streaming_json as streaming_json
+from src.tokenizers.base_tokenizer import base_Tokenizer
+import src.character_db as character_db
+import src.http_client as http_client
+from stub_server import StubServer
+import requests
+import random
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import argparse
+import asyncio
+import json
+import time
+
+print("Starting Pantella Benchmark Script")
+
+# Each benchmark uses synthetic data and fake backends so it can be run without a game, LLM or TTS installed.
+
+def fake_llm_stream(tokens, token_delay):
+    """Blocking token stream, like the ones returned by acreate()"""
+    for token in tokens:
+        time.sleep(token_delay)
+        yield token
+
+async def simulated_response(threaded, tokens, token_delay, tokens_per_sentence, synthesis_delay, audio_duration):
+    """Simulate BaseConversationManager.get_response() and return the time to first audio"""
+    sentence_queue = asyncio.Queue()
+    start_time = time.time()
+    first_audio_time = None
+
+    async def process_response():
+        token_count = 0
+        if threaded:
+            stream = utils.stream_in_thread(fake_llm_stream, tokens, token_delay)
+        else:
+            async def blocking_stream():
+                for token in fake_llm_stream(tokens, token_delay):
+                    yield token
+            stream = blocking_stream()
+        async for _ in stream:
+            token_count += 1
+            if token_count % tokens_per_sentence == 0:
+                time.sleep(synthesis_delay) # synthesize() is still called synchronously
+                await sentence_queue.put("voiceline.wav")
+        await sentence_queue.put(None)
+
+    async def send_response():
+        nonlocal first_audio_time
+        while True:
+            queue_output = await sentence_queue.get()
+            if queue_output is None:
+                break
+            if first_audio_time is None:
+                first_audio_time = time.time() - start_time
+            await asyncio.sleep(audio_duration)
+
+    await asyncio.gather(process_response(), send_response())
+    return first_audio_time, time.time() - start_time
+
+def benchmark_time_to_first_audio(args):
+    """Compare time to first audio with the LLM stream consumed on the event loop versus in a producer thread"""
+    tokens = ["token"] * args.tokens
+    for threaded in [False, True]:
+        first_audio_time, total_time = asyncio.run(simulated_response(threaded, tokens, args.token_delay, args.tokens_per_sentence, args.synthesis_delay, args.audio_duration))
+        logging.info(f"{'Threaded' if threaded else 'Blocking'} LLM stream - Time to first audio: {round(first_audio_time, 4)} seconds, Total response time: {round(total_time, 4)} seconds")
+
+class FakeSynthesizer:
+    """Stands in for a TTS engine that takes synthesis_delay seconds per voiceline"""
+    def __init__(self, synthesis_delay, workers):
+        self.synthesis_delay = synthesis_delay
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.lip_generation = SimpleNamespace(future=lambda final_voiceline_file: None)
+
+    def get_synthesis_executor(self):
+        return self.executor
+
+    def synthesize(self, voiceline, character, wait_for_lip=True):
+        time.sleep(self.synthesis_delay)
+        return f"{voiceline}.wav"
+
+async def simulated_synthesis(pipelined, args):
+    """Simulate the LLM finalizing voicelines while they are synthesized and played, and return the total response time"""
+    sentence_queue = asyncio.Queue()
+    event = asyncio.Event()
+    event.set()
+    synthesizer = FakeSynthesizer(args.synthesis_delay, args.synthesis_workers)
+    config = SimpleNamespace(tts_synthesis_queue_size=args.synthesis_queue_size)
+    conversation_manager = SimpleNamespace(config=config, synthesizer=synthesizer)
+    sentences = args.tokens // args.tokens_per_sentence
+    start_time = time.time()
+
+    async def process_response():
+        pipeline = synthesis_pipeline.SynthesisPipeline(conversation_manager, sentence_queue, event) if pipelined else None
+        for sentence_number in range(sentences):
+            await asyncio.sleep(args.token_delay * args.tokens_per_sentence) # generating the sentence
+            if pipelined:
+                await pipeline.submit(f"voiceline_{sentence_number}", None)
+            else:
+                audio_file = synthesizer.synthesize(f"voiceline_{sentence_number}", None)
+                await sentence_queue.put([audio_file, f"voiceline_{sentence_number}"])
+                event.clear()
+                await event.wait()
+        if pipelined:
+            await pipeline.close()
+        await sentence_queue.put(None)
+
+    async def send_response():
+        sent = []
+        while True:
+            queue_output = await sentence_queue.get()
+            if queue_output is None:
+                break
+            sent.append(queue_output[1])
+            event.set()
+            await asyncio.sleep(args.audio_duration)
+        assert sent == [f"voiceline_{sentence_number}" for sentence_number in range(sentences)], "Voicelines were sent out of order"
+
+    await asyncio.gather(process_response(), send_response())
+    synthesizer.executor.shutdown()
+    return time.time() - start_time
+
+def benchmark_synthesis_pipeline(args):
+    """Compare total response time with voicelines synthesized inline versus in the background synthesis pipeline"""
+    for pipelined in [False, True]:
+        total_time = asyncio.run(simulated_synthesis(pipelined, args))
+        logging.info(f"{'Pipelined' if pipelined else 'Inline'} synthesis - Total response time: {round(total_time, 4)} seconds")
+
+def benchmark_streaming_json(args):
+    """Compare re-parsing the whole chain-of-thought JSON on every chunk with the incremental StreamingJSONParser"""
+    thoughts = {f"thought_{index}": "I should think about this very carefully before I answer. " * 4 for index in range(args.json_fields)}
+    thoughts["response_to_user"] = "Well met, traveler. What brings you to Whiterun?"
+    raw_json = json.dumps(thoughts, indent=4)
+    chunks = [raw_json[index:index+4] for index in range(0, len(raw_json), 4)] # ~4 characters per token
+
+    start_time = time.time()
+    raw_response = ""
+    for chunk in chunks:
+        raw_response += chunk
+        try:
+            json.loads(raw_response+"\"}") # one of the up to three full parses the old parser did per chunk
+        except:
+            pass
+    logging.info(f"Full re-parse per chunk - {len(raw_json)} characters: {round(time.time() - start_time, 4)} seconds")
+
+    start_time = time.time()
+    json_parser = streaming_json.StreamingJSONParser()
+    response_to_user = ""
+    for chunk in chunks:
+        for path, delta in json_parser.feed(chunk):
+            if path == ("response_to_user",):
+                response_to_user += delta
+    assert response_to_user == thoughts["response_to_user"]
+    logging.info(f"StreamingJSONParser - {len(raw_json)} characters: {round(time.time() - start_time, 4)} seconds")
+
+    # JSONAccumulator has to rebuild the same JSON from the events, for objects and for a root string streamed in several chunks
+    json_parser = streaming_json.StreamingJSONParser()
+    json_accumulator = streaming_json.JSONAccumulator()
+    for chunk in chunks:
+        json_accumulator.add(json_parser.feed(chunk))
+    assert json_accumulator.value() == json_parser.value() == thoughts
+    root_string = json.dumps("A root string streamed in several chunks")
+    json_parser = streaming_json.StreamingJSONParser()
+    json_accumulator = streaming_json.JSONAccumulator()
+    for index in range(0, len(root_string), 3):
+        json_accumulator.add(json_parser.feed(root_string[index:index+3]))
+    json_accumulator.add(json_parser.finish())
+    assert json_accumulator.value() == json_parser.value() == json.loads(root_string)
+
+class FakeCollection:
+    """Stands in for a ChromaDB collection - get() returns copies of everything, like a full collection scan does"""
+    def __init__(self, message_count):
+        self.documents = [f"Synthetic message number {index}" for index in range(message_count)]
+        self.metadatas = [{"role": "user" if index % 2 == 0 else "assistant", "timestamp": float(index), "location": "Whiterun", "conversation_id": str(index // 20), "token_count": 5} for index in range(message_count)]
+        self.ids = [str(index) for index in range(message_count)]
+
+    def get(self):
+        return {"documents": list(self.documents), "metadatas": [dict(metadata) for metadata in self.metadatas], "ids": list(self.ids)}
+
+def benchmark_memory_index(args):
+    """Compare the neighbor lookups done by one chromadb_memory.update_memories() using full collection scans versus the in-memory message index"""
+    import src.memory_managers.chromadb_memory as chromadb_memory
+    memory_manager = chromadb_memory.MemoryManager.__new__(chromadb_memory.MemoryManager) # skip __init__, nothing here needs a real ChromaDB client or character
+    memory_manager.config = SimpleNamespace(emotion_composition={"joy": ["joy"], "anger": ["rage"]})
+    memory_manager.character_manager = SimpleNamespace(name="Benchmark")
+    memory_manager.messages_memories = FakeCollection(args.memory_messages)
+    related_messages = [{"id": str(index)} for index in range(0, args.memory_messages, max(1, args.memory_messages // args.memory_results))][:args.memory_results]
+
+    start_time = time.time()
+    for message in related_messages: # what get_around_message() did before: get_message_index() and get_all_messages() both scanned the whole collection
+        memory_manager.load_message_index()
+        message_index = memory_manager.get_message_index(message)
+        memory_manager.load_message_index()
+        [dict(msg) for msg in memory_manager.message_index[max(0, message_index-4):message_index+3]]
+    logging.info(f"Full collection scans - {len(related_messages)} related messages over {args.memory_messages} messages: {round(time.time() - start_time, 4)} seconds")
+
+    start_time = time.time()
+    memory_manager.load_message_index()
+    logging.info(f"Loading the message index once: {round(time.time() - start_time, 4)} seconds")
+    start_time = time.time()
+    for message in related_messages:
+        memory_manager.get_around_message(message, 4, 2)
+    logging.info(f"Message index - {len(related_messages)} related messages over {args.memory_messages} messages: {round(time.time() - start_time, 4)} seconds")
+
+class FakeTokenizer(base_Tokenizer):
+    """base_Tokenizer with a whitespace token count, so only the message formatting is being timed"""
+    def get_token_count(self, string):
+        return len(string.split())
+
+def render_uncompiled(tokenizer, messages):
+    """What get_string_from_messages() did before message templates were compiled - Every message filled in message_format from scratch"""
+    context = ""
+    for message in messages:
+        context += tokenizer.compile_start_message(message["role"], message["name"]) + message["content"] + tokenizer.compile_end_message(message["role"], message["name"])
+    return context
+
+def benchmark_message_format(args):
+    """Compare filling in message_format for every message with the compiled message templates"""
+    with open("prompt_styles/normal_en_llama3.json", "r") as f:
+        style = json.load(f)["style"]
+    config = SimpleNamespace(prompt_style_version=1, **style)
+    tokenizer = FakeTokenizer(SimpleNamespace(config=config))
+    roles = [(config.user_name, "[player]"), (config.assistant_name, "Lydia"), (config.system_name, None)]
+    messages = []
+    for index in range(args.context_messages):
+        role, name = roles[index % len(roles)]
+        messages.append({"role": role, "name": name, "content": f"Message number {index}, about the dragon at Whiterun."})
+    assert render_uncompiled(tokenizer, messages) == tokenizer.get_string_from_messages(messages)
+
+    start_time = time.time()
+    for _ in range(args.format_repeats):
+        render_uncompiled(tokenizer, messages)
+    logging.info(f"Filling in message_format per message - {args.context_messages} messages x {args.format_repeats}: {round(time.time() - start_time, 4)} seconds")
+
+    start_time = time.time()
+    for _ in range(args.format_repeats):
+        tokenizer.get_string_from_messages(messages)
+    logging.info(f"Compiled message templates - {args.context_messages} messages x {args.format_repeats}: {round(time.time() - start_time, 4)} seconds")
+
+def benchmark_character_db(args):
+    """Compare rebuilding CharacterDB views and scanning every character for id suffixes with the cached views and suffix indexes"""
+    random.seed(0)
+    db = character_db.CharacterDB.__new__(character_db.CharacterDB) # skip loading the real database and voice model files
+    db.config = SimpleNamespace(game_id="skyrim")
+    db._characters = []
+    db.views = {}
+    races = ["Nord", "Imperial", "Breton", "Redguard", "Khajiit"]
+    for index in range(args.characters):
+        db._characters.append(db.format_character({
+            "name": f"Character {index}",
+            "voice_model": f"Voice{index % 300}",
+            "skyrim_voice_folder": f"Voice{index % 300}",
+            "race": random.choice(races),
+            "gender": random.choice(["Male", "Female"]),
+            "ref_id": f"{random.randrange(16**8):08X}",
+            "base_id": f"{random.randrange(16**8):08X}",
+        }))
+    db.invalidate_views()
+    lookups = [random.choice(db._characters) for _ in range(args.character_lookups)]
+    lookups = [(character["ref_id"][-6:], character["base_id"][-6:]) for character in lookups] # the game only sends the last 6 hex digits of the ids
+
+    start_time = time.time()
+    for ref_id, base_id in lookups:
+        for db_character in db._characters:
+            if ((str(db_character['ref_id']).endswith(ref_id) and str(db_character['base_id']).endswith(base_id))) or ((str(db_character['ref_id']).upper().endswith(ref_id.upper()) and str(db_character['base_id']).upper().endswith(base_id.upper()))):
+                break
+    logging.info(f"Linear id suffix scan - {args.character_lookups} lookups over {args.characters} characters: {round(time.time() - start_time, 4)} seconds")
+
+    start_time = time.time()
+    db.get_character_by_id_suffixes(*lookups[0])
+    logging.info(f"Building the id suffix indexes once: {round(time.time() - start_time, 4)} seconds")
+    start_time = time.time()
+    for ref_id, base_id in lookups:
+        assert db.get_character_by_id_suffixes(ref_id, base_id) is not None
+    logging.info(f"Id suffix indexes - {args.character_lookups} lookups over {args.characters} characters: {round(time.time() - start_time, 4)} seconds")
+
+    for name in ["characters", "voice_folders", "all_voice_models", "male_voice_models", "female_voice_models"]:
+        build = getattr(db, f"build_{name}")
+        start_time = time.time()
+        for _ in range(args.view_repeats):
+            build()
+        rebuilt = time.time() - start_time
+        getattr(db, name) # built once on the first access
+        start_time = time.time()
+        for _ in range(args.view_repeats):
+            getattr(db, name)
+        logging.info(f"{name} x {args.view_repeats} - rebuilt every access: {round(rebuilt, 4)} seconds, cached: {round(time.time() - start_time, 4)} seconds")
+
+    voice_models = [f"Voice {index}" for index in range(args.character_lookups)]
+    start_time = time.time()
+    for voice_model in voice_models:
+        db.get_voice_folder_by_voice_model(voice_model)
+    logging.info(f"get_voice_folder_by_voice_model - {args.character_lookups} lookups: {round(time.time() - start_time, 4)} seconds")
+
+def benchmark_startup(args):
+    """Break down where the time goes when importing Pantella, using python -X importtime in a fresh interpreter so nothing is already imported"""
+    start_time = time.time()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", args.startup_import], capture_output=True, text=True)
+    logging.info(f"'{args.startup_import}' took {round(time.time() - start_time, 3)} seconds in a new interpreter")
+    if result.returncode != 0:
+        logging.error(f"'{args.startup_import}' failed:\n{result.stderr[-2000:]}")
+    self_times = {} # top level package(or src.<module> for Pantella's own modules) -> microseconds spent importing it, not counting what it imports from other packages
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_time, _, module = line[len("import time:"):].split("|")
+        try:
+            self_time = int(self_time.strip())
+        except ValueError: # the header line
+            continue
+        parts = module.strip().split(".")
+        group = ".".join(parts[:2]) if parts[0] == "src" else parts[0]
+        self_times[group] = self_times.get(group, 0) + self_time
+    total = sum(self_times.values())
+    logging.info(f"Total import time: {round(total / 1000000, 3)} seconds over {len(self_times)} packages")
+    for group, self_time in sorted(self_times.items(), key=lambda item: item[1], reverse=True)[:args.startup_top]:
+        logging.info(f"  {round(self_time / 1000000, 3):>8}s {round(self_time / max(total, 1) * 100, 1):>5}% {group}")
+
+def benchmark_http_clients(args):
+    """Compare a new connection per request(module level requests.post()) with the pooled keep-alive HTTPClient against the offline stub server"""
+    config = SimpleNamespace(http_connect_timeout=5, http_read_timeout=30, http_retries=2, http_retry_backoff=0.1, http_pool_size=4)
+    with StubServer(latency=args.stub_latency) as stub_server:
+        url = f"{stub_server.base_url}/extra/tokencount"
+        start_time = time.time()
+        for _ in range(args.http_requests):
+            requests.post(url, json={"prompt": "How many tokens is this?"}).json()
+        logging.info(f"requests.post() - {args.http_requests} requests: {round(time.time() - start_time, 4)} seconds")
+
+        client = http_client.HTTPClient("koboldcpp", config)
+        start_time = time.time()
+        for _ in range(args.http_requests):
+            client.post(url, json={"prompt": "How many tokens is this?"}).json()
+        logging.info(f"HTTPClient.post() - {args.http_requests} requests: {round(time.time() - start_time, 4)} seconds")
+
+        async def concurrent_requests():
+            await asyncio.gather(*[client.apost(f"{stub_server.base_url}/tts_to_audio/", json={"text": "Hello there.", "speaker_wav": "FemaleNord", "language": "en"}) for _ in range(args.http_requests)])
+        start_time = time.time()
+        asyncio.run(concurrent_requests())
+        logging.info(f"HTTPClient.apost() - {args.http_requests} concurrent requests: {round(time.time() - start_time, 4)} seconds")
+        for line in client.latency_report():
+            logging.info(line)
+
+benchmarks = {
+    "time_to_first_audio": benchmark_time_to_first_audio,
+    "synthesis_pipeline": benchmark_synthesis_pipeline,
+    "streaming_json": benchmark_streaming_json,
+    "memory_index": benchmark_memory_index,
+    "message_format": benchmark_message_format,
+    "character_db": benchmark_character_db,
+    "startup": benchmark_startup,
+    "http_clients": benchmark_http_clients,
+}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run Pantella performance benchmarks')
+    parser.add_argument('benchmark', choices=list(benchmarks.keys()), help='The benchmark to run')
+    parser.add_argument('--tokens', type=int, default=200, help='Number of tokens the fake LLM generates')
+    parser.add_argument('--token_delay', type=float, default=0.02, help='Seconds per token for the fake LLM')
+    parser.add_argument('--tokens_per_sentence', type=int, default=20, help='Number of tokens per sentence')
+    parser.add_argument('--synthesis_delay', type=float, default=0.1, help='Seconds to synthesize one voiceline')
+    parser.add_argument('--audio_duration', type=float, default=0.5, help='Seconds of audio per voiceline')
+    parser.add_argument('--synthesis_workers', type=int, default=1, help='Number of synthesis pipeline worker threads')
+    parser.add_argument('--synthesis_queue_size', type=int, default=3, help='Maximum number of voicelines waiting in the synthesis pipeline')
+    parser.add_argument('--json_fields', type=int, default=200, help='Number of thought fields in the chain-of-thought JSON')
+    parser.add_argument('--memory_messages', type=int, default=50000, help='Number of synthetic messages in the memory benchmarks')
+    parser.add_argument('--memory_results', type=int, default=5, help='Number of related messages looked up per memory update')
+    parser.add_argument('--context_messages', type=int, default=200, help='Number of messages in the context for the message format benchmark')
+    parser.add_argument('--format_repeats', type=int, default=100, help='Number of times the context is rendered in the message format benchmark')
+    parser.add_argument('--characters', type=int, default=100000, help='Number of synthetic characters in the character database benchmark')
+    parser.add_argument('--character_lookups', type=int, default=100, help='Number of character lookups in the character database benchmark')
+    parser.add_argument('--view_repeats', type=int, default=5, help='Number of times each character database view is accessed')
+    parser.add_argument('--startup_import', type=str, default="import src.conversation_manager", help='Python code whose imports are broken down by the startup benchmark')
+    parser.add_argument('--startup_top', type=int, default=25, help='Number of slowest packages shown by the startup benchmark')
+    parser.add_argument('--http_requests', type=int, default=200, help='Number of requests sent to the stub server by the http clients benchmark')
+    parser.add_argument('--stub_latency', type=float, default=0.0, help='Seconds the stub server waits before every response')
+    args = parser.parse_args()
+    benchmarks[args.benchmark](args)
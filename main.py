@@ -1,14 +1,16 @@
+import time
+startup_start = time.time() # for the startup time breakdown once the conversation manager is ready
 from src.logging import logging
 import os
 print(os.path.dirname(__file__))
 import src.conversation_manager as cm
 import src.config_loader as config_loader
+import src.plugin_registry as plugin_registry
 import src.utils as utils
 import threading
 import random
 import traceback
 import asyncio
-import time
 try:
     import gradio as gr
     imported_gradio = True
@@ -38,6 +40,8 @@ logging.info(f"Pantella Seed: {seed}")
 
 logging.info("Loading blocked logging paths -- No logs will be generated from these files")
 logging.block_logs_from = config.block_logs_from # block logs from certain files
+logging.block_log_types = config.block_log_types # block certain types of logs, e.g. ["DEBUG", "CONFIG"]
+logging.log_level = config.log_level # drop logs below this level before they're formatted
 
 utils.cleanup_mei(config.remove_mei_folders) # clean up old instances of exe runtime files
 
@@ -89,6 +93,8 @@ except Exception as e:
     logging.error(tb)
     input("Press Enter to exit.")
     raise e
+logging.config(f"Pantella started in {round(time.time() - startup_start, 3)} seconds")
+plugin_registry.startup_report() # which plugins were imported and how long each took, run with `python benchmark.py startup` for a full breakdown
 
 if config.debug_mode and imported_gradio:
     with gr.Blocks() as mem_gr_blocks:
@@ -0,0 +1,63 @@
+print("Importing audio_merge.py")
+from src.logging import logging
+import os
+import io
+import time
+import soundfile as sf
+logging.info("Imported required libraries in audio_merge.py")
+
+CHUNK_FRAMES = 65536 # frames copied at a time, so merging never holds more than one chunk of audio in memory
+
+def open_audio(audio, wait=0.0, poll_interval=0.02):
+    """Open a phrase for reading - audio can be a path, the bytes of an audio file or a file-like object. Paths that don't exist yet are polled for up to wait seconds, since some servers return before the file they wrote is visible"""
+    if isinstance(audio, (bytes, bytearray)):
+        return sf.SoundFile(io.BytesIO(audio))
+    if hasattr(audio, "read"):
+        audio.seek(0)
+        return sf.SoundFile(audio)
+    deadline = time.time() + wait
+    while not os.path.exists(audio) and time.time() < deadline:
+        time.sleep(poll_interval)
+    if not os.path.exists(audio):
+        logging.error(f'Could not find voiceline file: {audio}')
+        raise FileNotFoundError(f'Could not find voiceline file: {audio}')
+    return sf.SoundFile(audio)
+
+def describe(audio):
+    return audio if isinstance(audio, str) else f"<{type(audio).__name__}>"
+
+def merge_audio_files(audio_files, output_file, wait=0.6, chunk_frames=CHUNK_FRAMES):
+    """Merge phrases into one audio file, in order
+
+    The phrases are streamed through one SoundFile writer a chunk at a time instead of being read whole and concatenated into a growing array, so merging takes time linear in the total length of the audio.
+    Every phrase must have the same sample rate and channel count as the first one, the output uses the first phrase's format and subtype. Phrases can be paths or in-memory audio files(bytes or file-like objects).
+    """
+    if len(audio_files) == 0:
+        raise ValueError("No audio files to merge")
+    logging.info(f'Merging audio files: {[describe(audio_file) for audio_file in audio_files]}')
+    logging.info(f'Output file: {output_file}')
+    writer = None
+    total_frames = 0
+    try:
+        for audio_file in audio_files:
+            with open_audio(audio_file, wait) as reader:
+                if writer is None:
+                    writer = sf.SoundFile(output_file, "w", samplerate=reader.samplerate, channels=reader.channels, format=reader.format, subtype=reader.subtype)
+                elif reader.samplerate != writer.samplerate or reader.channels != writer.channels:
+                    logging.error(f'Could not merge {describe(audio_file)}: {reader.samplerate}Hz {reader.channels} channel(s), expected {writer.samplerate}Hz {writer.channels} channel(s) like the first phrase')
+                    raise ValueError(f'Could not merge {describe(audio_file)}: {reader.samplerate}Hz {reader.channels} channel(s), expected {writer.samplerate}Hz {writer.channels} channel(s) like the first phrase')
+                for block in reader.blocks(blocksize=chunk_frames, dtype="int16" if writer.subtype == "PCM_16" else "float32", always_2d=True): # int16 copies PCM_16 phrases without converting them
+                    writer.write(block)
+                    total_frames += len(block)
+    except Exception as e:
+        if writer is not None:
+            writer.close()
+            writer = None
+            if os.path.exists(output_file): # don't leave a partially merged voiceline behind
+                os.remove(output_file)
+        raise e
+    finally:
+        if writer is not None:
+            writer.close()
+    logging.info(f'Merged {len(audio_files)} audio files into {total_frames} frames')
+    return output_file
@@ -1,6 +1,7 @@
 print("Loading character_db.py...")
 from src.logging import logging
 import src.utils as utils
+import src.name_matcher as name_matcher
 import json
 import os
 import pandas as pd
@@ -17,6 +18,7 @@ class CharacterDB():
         self.base_id_index = {}
         self.ref_id_index = {}
         self.unique_ref_index = {}
+        self.views = {} # name -> view derived from self._characters(sorted characters, voice folders, id suffix indexes...), built the first time they're used and cleared by invalidate_views()
         self.valid = []
         self.invalid = []
         self.db_type = None
@@ -87,6 +89,7 @@ class CharacterDB():
                     self.base_id_index[character['base_id']] = character
                 if character['ref_id'] != None and str(character['ref_id']) != "" and str(character['ref_id']) != "nan":
                     self.ref_id_index[character['ref_id']] = character
+        self.invalidate_views()
         if self.db_type != None and self.db_type != 'json':
             self.db_type = 'mixed'
         else:
@@ -113,6 +116,7 @@ class CharacterDB():
                 self.base_id_index[character['base_id']] = character
             if character['ref_id'] != None and str(character['ref_id']).strip() != "" and str(character['ref_id']).strip().lower() != "nan":
                 self.ref_id_index[character['ref_id']] = character
+        self.invalidate_views()
         if self.db_type != None and self.db_type != 'csv':
             self.db_type = 'mixed'
         else:
@@ -169,8 +173,21 @@ class CharacterDB():
     def get_unique_ref_index(self,character):
         return self.unique_ref_index[f"{character['name']}({character['ref_id']})[{character['base_id']}]"]
 
+    def invalidate_views(self):
+        """Forget every cached view of the characters - Must be called whenever self._characters changes"""
+        self.views = {}
+
+    def get_view(self, name, build):
+        """Get a cached view of the characters, building it with build() if it hasn't been built since the characters last changed - Views are shared, so don't modify them"""
+        if name not in self.views:
+            self.views[name] = build()
+        return self.views[name]
+
     @property
     def characters(self):
+        return self.get_view("characters", self.build_characters)
+
+    def build_characters(self):
         filtered = []
         for character in self._characters:
             if character['name'] != None and character['name'] != "" and str(character['name']).lower() != "nan":
@@ -182,9 +199,11 @@ class CharacterDB():
         info = self.format_character(info)
         if info['name'] != None and info['name'] != "" and info['name'] != "nan":
             self._characters.append(info)
-            self.named_index[info['name']] = self.characters[-1]
-            self.base_id_index[info['base_id']] = self.characters[-1] 
-            self.ref_id_index[info['ref_id']] = self.characters[-1]
+            self.invalidate_views()
+            self.unique_ref_index[f"{info['name']}({info['ref_id']})[{info['base_id']}]"] = info
+            self.named_index[info['name']] = info
+            self.base_id_index[info['base_id']] = info
+            self.ref_id_index[info['ref_id']] = info
             if self.db_type == 'json':
                 if not os.path.exists(self.character_database_path): # If the directory doesn't exist, create it
                     os.makedirs(self.character_database_path) 
@@ -203,20 +222,28 @@ class CharacterDB():
             logging.warning(f"Could not find character '{name}' in character database using name lookup.")
             return None
         
+    def get_name_matcher(self, strip_characters=[]):
+        """Get a NameMatcher for the names of every character in the database, shared by every character that's checking messages for names"""
+        strip_characters = "".join(sorted(set(strip_characters)))
+        return self.get_view(f"name_matcher_{strip_characters}", lambda: name_matcher.NameMatcher([character["name"] for character in self.characters], strip_characters))
+
     def get_character_by_voice_folder(self, voice_folder): # Look through non-generic characters for a character with the given voice folder
+        return self.get_view("voice_model_index", self.build_voice_model_index).get(voice_folder.lower()) # If no character is found, return None
+
+    def build_voice_model_index(self): # lowercase voice model -> first character in self.characters using it
+        index = {}
         for character in self.characters:
-            if character['voice_model'].lower() == voice_folder.lower(): # If the voice model matches, return the character
-                return character
-        return None # If no character is found, return None
+            index.setdefault(character['voice_model'].lower(), character)
+        return index
     
     def get_voice_folder_by_voice_model(self, voice_model):
         # logging.info(f"voice_model_ids: {voice_model}/{voice_model.replace(' ', '')}")
         folder = None
-        for voice_folder in self.voice_folders:
-            if voice_model == voice_folder:
-                folder = self.voice_folders[voice_folder]
-            if voice_model.replace(' ', '') == voice_folder:
-                folder = self.voice_folders[voice_folder]
+        voice_folders = self.voice_folders
+        voice_folder_positions = self.get_view("voice_folder_positions", lambda: {voice_folder: i for i, voice_folder in enumerate(self.voice_folders)})
+        matches = [voice_folder for voice_folder in (voice_model, voice_model.replace(' ', '')) if voice_folder in voice_folders]
+        if len(matches) > 0:
+            folder = voice_folders[max(matches, key=lambda voice_folder: voice_folder_positions[voice_folder])] # the match latest in voice_folders wins, same as when this was a loop over voice_folders
         # logging.info(f"folder:",folder)
         if folder == None:
             folder = voice_model.replace(' ', '')
@@ -464,16 +491,15 @@ class CharacterDB():
             # Ref/Base ID Lookup
             logging.info(f"Performing ref_id and base_id lookup for character '{character_ref_id}({character_base_id})'")
             if character_ref_id is not None and character_base_id is not None and character_match is None:
-                for db_character in self._characters:
-                    if ((str(db_character['ref_id']).endswith(character_ref_id) and str(db_character['base_id']).endswith(character_base_id))) or ((str(db_character['ref_id']).upper().endswith(character_ref_id.upper()) and str(db_character['base_id']).upper().endswith(character_base_id.upper()))):
-                        character_match = db_character
-                        matching_parts = {
-                            "name": character_match['name'] == character_name,
-                            "ref_id": True,
-                            "base_id": True
-                        }
-                        logging.info(f"Found possible character '{character_name}' association in character database using ref_id and base_id lookup.")
-                        break
+                db_character = self.get_character_by_id_suffixes(character_ref_id, character_base_id)
+                if db_character is not None:
+                    character_match = db_character
+                    matching_parts = {
+                        "name": character_match['name'] == character_name,
+                        "ref_id": True,
+                        "base_id": True
+                    }
+                    logging.info(f"Found possible character '{character_name}' association in character database using ref_id and base_id lookup.")
         
         if self.config.allow_exact_base_id_matching:
             # Exact Base ID Lookup
@@ -492,16 +518,15 @@ class CharacterDB():
             # Endswith Base ID Lookup
             logging.info(f"Performing endswith base_id lookup for character '{character_base_id}'")
             if character_base_id is not None and character_match is None:
-                for db_character in self._characters:
-                    if str(db_character['base_id']).endswith(character_base_id) or str(db_character['base_id']).upper().endswith(character_base_id.upper()):
-                        character_match = db_character
-                        matching_parts = {
-                            "name": character_match['name'] == character_name,
-                            "ref_id": character_match['ref_id'] == character_ref_id,
-                            "base_id": True
-                        }
-                        logging.info(f"Found possible character '{character_name}' association in character database using base_id lookup.")
-                        break
+                db_character = self.get_character_by_id_suffixes(None, character_base_id)
+                if db_character is not None:
+                    character_match = db_character
+                    matching_parts = {
+                        "name": character_match['name'] == character_name,
+                        "ref_id": character_match['ref_id'] == character_ref_id,
+                        "base_id": True
+                    }
+                    logging.info(f"Found possible character '{character_name}' association in character database using base_id lookup.")
 
         # No Match - Generate Character if LLM supports it
         if character_match is None:
@@ -521,6 +546,33 @@ class CharacterDB():
         logging.info(f"Matching Parts:",matching_parts)
         return (character_match), matching_parts
 
+    def get_id_suffix_index(self, id_type, length): # uppercase last length characters of the ref_id or base_id -> positions in self._characters of the characters with it, in load order
+        def build():
+            index = {}
+            for position, character in enumerate(self._characters):
+                character_id = str(character[id_type]).upper()
+                if len(character_id) >= length:
+                    index.setdefault(character_id[len(character_id)-length:], []).append(position)
+            return index
+        return self.get_view(f"{id_type}_suffix_index_{length}", build) # the game always sends ids of the same length, so usually only one length is ever built
+
+    def get_character_by_id_suffixes(self, ref_id_suffix=None, base_id_suffix=None):
+        """Get the first character(in load order) whose ref_id and base_id end with the given suffixes, ignoring case - Either suffix can be None to not check that id"""
+        suffixes = {}
+        if ref_id_suffix is not None:
+            suffixes["ref_id"] = str(ref_id_suffix).upper()
+        if base_id_suffix is not None:
+            suffixes["base_id"] = str(base_id_suffix).upper()
+        if len(suffixes) == 0:
+            return None
+        candidates = {id_type: self.get_id_suffix_index(id_type, len(suffix)).get(suffix, []) for id_type, suffix in suffixes.items()}
+        shortest = min(candidates, key=lambda id_type: len(candidates[id_type])) # only the characters matching the rarer suffix need to be checked against the other one
+        for position in candidates[shortest]: # positions are in load order, so the first one that matches both is the first match
+            character = self._characters[position]
+            if all(str(character[id_type]).upper().endswith(suffix) for id_type, suffix in suffixes.items()):
+                return character
+        return None
+
     def has_character(self, character):
         if str(character['name']) == "nan":
             print("character:",character)
@@ -644,6 +696,9 @@ class CharacterDB():
         
     @property
     def male_voice_models(self):
+        return self.get_view("male_voice_models", self.build_male_voice_models)
+
+    def build_male_voice_models(self):
         valid = {}
         for character in self._characters:
             if character["gender"].capitalize() == "Male" and "Female" not in character["voice_model"]:
@@ -668,6 +723,9 @@ class CharacterDB():
     
     @property
     def female_voice_models(self):
+        return self.get_view("female_voice_models", self.build_female_voice_models)
+
+    def build_female_voice_models(self):
         valid = {}
         for character in self._characters:
             if character["gender"].capitalize() == "Female" and "Male" not in character["voice_model"]:
@@ -692,6 +750,9 @@ class CharacterDB():
     
     @property
     def all_voice_models(self):
+        return self.get_view("all_voice_models", self.build_all_voice_models)
+
+    def build_all_voice_models(self):
         models = []
         for character in self.characters:
             if character["voice_model"] != "":
@@ -704,6 +765,9 @@ class CharacterDB():
         
     @property
     def voice_folders(self): # Returns a dictionary of voice models and their corresponding voice folders
+        return self.get_view("voice_folders", self.build_voice_folders)
+
+    def build_voice_folders(self):
         folders = {} 
         for character in self.characters:
             if character['voice_model'] != "":
@@ -722,6 +786,9 @@ class CharacterDB():
     
     @property
     def all_voice_folders(self):
+        return self.get_view("all_voice_folders", self.build_all_voice_folders)
+
+    def build_all_voice_folders(self):
         folders = []
         for character in self.characters:
             if character['skyrim_voice_folder'] != "":
@@ -295,6 +295,10 @@ class base_Character:
         """Perform a step in the memory manager - Some memory managers may need to perform some action every step"""
         self.memory_manager.before_step()
 
+    def wait_for_memories(self):
+        """Wait for the memory manager to finish retrieving memories in the background, if it does that"""
+        self.memory_manager.wait_for_memories()
+
     def reached_conversation_limit(self):
         """Ran when the conversation limit is reached, or the conversation is ended - Some memory managers may need to perform some action when the conversation limit is reached"""
         return self.memory_manager.reached_conversation_limit()
@@ -311,17 +315,10 @@ class base_Character:
 
     def check_for_new_knows(self, msg, add_game_events=True):
         """Check if the message contains a new character that the character has met"""
-        valid_names = [character["name"] for character in self.conversation_manager.character_database.characters]
-        valid_names.append(self.conversation_manager.player_name)
-        valid_names = [name for name in valid_names if name != None]
-        valid_names = [name for name in valid_names if name not in self.language["banned_learnable_names"]]
-        lower_case_versions = [name.lower() for name in valid_names]
-        pairs = list(zip(valid_names, lower_case_versions))
-        msg_words = msg.split(" ")
-        for char in self.prompt_style["end_of_sentence_chars"] + [",", ":", ";"]:
-            msg_words = [word.replace(char, "") for word in msg_words]
-        for name, lower_case_name in pairs:
-            if name in msg_words or lower_case_name in msg_words:
+        matcher = self.conversation_manager.character_database.get_name_matcher(self.prompt_style["end_of_sentence_chars"] + [",", ":", ";"])
+        banned_names = self.language["banned_learnable_names"]
+        for name in matcher.find(msg, [self.conversation_manager.player_name]):
+            if name not in banned_names:
                 self.meet(name, add_game_events)
 
     def __str__(self):
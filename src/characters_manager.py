@@ -19,6 +19,10 @@ class Characters:
         self.conversation_manager = conversation_manager
         self.config = self.conversation_manager.config
         self.character_manager_class = character_manager.create_character_manager(self.config)
+        self.base_replacement_dict_memo = None # (prompt dependencies, replacement_dict without the in-game time filled in), see get_prompt_dependencies()
+        self.replacement_dict_memo = None # ((prompt dependencies, in-game time), replacement_dict)
+        self.system_prompt_memo = None # (raw prompt, (prompt dependencies, in-game time), system prompt)
+        self.system_prompt_message = None # the last system prompt message, with its token count
         logging.info("Characters Manager created")
 
     @property
@@ -98,9 +102,45 @@ class Characters:
         # logging.info("Language:", language["language_name"] + "("+language["language_code"]+")")
         return language
         
-    @property
-    def replacement_dict(self): # Returns a dictionary of replacement values for the current context -- Dynamic Variables
-        """Return a dictionary of replacement values for the current context"""
+    def get_character_prompt_dependencies(self, character):
+        """Everything a character's replacement_dict reads that can change during a conversation - relationship level, knows and stranger change the perspective player name and trust"""
+        return (
+            character.name,
+            id(character),
+            getattr(character, "in_game_relationship_level", None),
+            tuple(sorted(getattr(character, "knows", []))), # changes when the character meets the player with meet()
+            getattr(character, "stranger", None),
+            getattr(character, "race", None),
+            getattr(character, "gender", None),
+            getattr(character, "age", None),
+            getattr(character, "bio", None),
+        )
+
+    def get_prompt_dependencies(self):
+        """Everything the expensive parts of the replacement_dict depend on - Until one of these changes, the character replacement dicts, relationship summaries, bios and behavior summary don't need building again"""
+        conversation_manager = self.conversation_manager
+        behavior_manager = conversation_manager.behavior_manager
+        in_game_time = conversation_manager.current_in_game_time
+        return (
+            conversation_manager.get_conversation_type(),
+            getattr(conversation_manager, "radiant_dialogue", False), # changes which behaviors are valid
+            tuple(self.get_character_prompt_dependencies(character) for character in self.active_characters.values()),
+            conversation_manager.player_name,
+            getattr(conversation_manager, "player_race", None),
+            getattr(conversation_manager, "player_gender", None),
+            getattr(conversation_manager, "current_location", None),
+            in_game_time["hour24"] if in_game_time is not None else None, # the minute is filled in on every build, the hour is here so time of day changes rebuild everything
+            (id(behavior_manager), len(getattr(behavior_manager, "behaviors", []))),
+            conversation_manager.game_interface.get_current_context_string(), # served from memory by the file buffers, so comparing the string itself is as cheap as comparing its mtime and catches same-second edits
+        )
+
+    def get_replacement_dict_key(self):
+        """The key the finished replacement_dict is memoized under - The prompt dependencies and the exact in-game time"""
+        in_game_time = self.conversation_manager.current_in_game_time
+        return (self.get_prompt_dependencies(), tuple(in_game_time.items()) if in_game_time is not None else None)
+
+    def build_base_replacement_dict(self):
+        """Build the parts of the replacement_dict that don't depend on the in-game time, or None if the conversation type can't be determined"""
         conversation_type = self.conversation_manager.get_conversation_type()
         if conversation_type == "single_player_with_npc": # TwoNPC no player style context
             logging.info("SingleNPCw/Player style context, returning replacement_dict from active character")
@@ -125,8 +165,25 @@ class Characters:
                 "language": self.language["in_game_language_name"],
             }
         else:
+            return None
+        replacement_dict["behavior_summary"] = self.conversation_manager.behavior_manager.get_behavior_summary(self.active_characters_list[0]) # formatted with the rest of the replacement_dict in replacement_dict # TODO: Make this work better for multi character conversations
+        replacement_dict["behavior_keywords"] = ", ".join(self.conversation_manager.behavior_manager.behavior_keywords)
+        return replacement_dict
+
+    @property
+    def replacement_dict(self): # Returns a dictionary of replacement values for the current context -- Dynamic Variables
+        """Return a dictionary of replacement values for the current context - Memoized until one of the prompt dependencies or the in-game time changes"""
+        key = self.get_replacement_dict_key()
+        dependencies, _ = key
+        if self.replacement_dict_memo is not None and self.replacement_dict_memo[0] == key:
+            return dict(self.replacement_dict_memo[1])
+        if self.base_replacement_dict_memo is None or self.base_replacement_dict_memo[0] != dependencies:
+            self.base_replacement_dict_memo = (dependencies, self.build_base_replacement_dict())
+        base_replacement_dict = self.base_replacement_dict_memo[1]
+        if base_replacement_dict is None:
             logging.warning("Could not determine conversation type, returning empty replacement_dict")
             return {}
+        replacement_dict = dict(base_replacement_dict)
         
         if self.conversation_manager.current_in_game_time is not None: # If in-game time is available, add in-game time properties to replacement_dict
             time_group = utils.get_time_group(self.conversation_manager.current_in_game_time["hour24"]) # get time group from in-game time before 12/24 hour conversion
@@ -147,7 +204,7 @@ class Characters:
         replacement_dict["player_name"] = self.conversation_manager.player_name
         replacement_dict["player_race"] = self.conversation_manager.player_race
         replacement_dict["player_gender"] = self.conversation_manager.player_gender
-        replacement_dict["behavior_summary"] = self.conversation_manager.behavior_manager.get_behavior_summary(self.active_characters_list[0]) # Add behavior summary to replacement_dict and format it using replacement_dict before doing so # TODO: Make this work better for multi character conversations
+        behavior_keywords = replacement_dict.pop("behavior_keywords") # added back after the behavior summary is formatted, same as before it was memoized
         if "name" in replacement_dict: # If name is in replacement_dict, add name2 and names to replacement_dict
             replacement_dict["behavior_summary"] = replacement_dict["behavior_summary"].format(**replacement_dict)
         else:
@@ -155,7 +212,7 @@ class Characters:
             for name in self.names:
                 replacement_dict["name"+str(self.names.index(name)+1)] = name
             replacement_dict["behavior_summary"] = replacement_dict["behavior_summary"].format(**replacement_dict)
-        replacement_dict["behavior_keywords"] = ", ".join(self.conversation_manager.behavior_manager.behavior_keywords)
+        replacement_dict["behavior_keywords"] = behavior_keywords
 
         
         if "bio" in replacement_dict: # If bio is in replacement_dict, add bio2 and bios to replacement_dict
@@ -169,12 +226,13 @@ class Characters:
             replacement_dict["language"] = self.prompt_style["language"]["in_game_language_name"]
 
         replacement_dict["context"] = ""
-        context_string = self.conversation_manager.game_interface.get_current_context_string()
+        context_string = dependencies[-1] # read by get_prompt_dependencies()
         if context_string is not None and context_string != "":
             replacement_dict["context"] = context_string.format(**replacement_dict)
 
         logging.info("Replacement Dict: ", replacement_dict)
-        return replacement_dict
+        self.replacement_dict_memo = (key, replacement_dict)
+        return dict(replacement_dict)
 
     def render_game_event(self,line:str):
         """Render a game event line using the language file"""
@@ -289,11 +347,24 @@ class Characters:
             return ""
 
         prompt = self.get_raw_prompt()
+        key = self.get_replacement_dict_key()
+        if self.system_prompt_memo is not None and self.system_prompt_memo[0] == prompt and self.system_prompt_memo[1] == key:
+            return self.system_prompt_memo[2]
         
         system_prompt = prompt.format(**self.replacement_dict)
         # logging.info("System Prompt: " + system_prompt)
+        self.system_prompt_memo = (prompt, key, system_prompt)
         return system_prompt
 
+    def get_system_prompt_message(self):
+        """Return the system prompt as a message with its token count - The count is only worked out again when the system prompt changes"""
+        system_prompt = self.get_system_prompt()
+        if self.system_prompt_message is None or self.system_prompt_message["content"] != system_prompt:
+            system_prompt_message = {'role': self.config.system_name, 'content': system_prompt, "type":"prompt"}
+            system_prompt_message["token_count"] = self.conversation_manager.tokenizer.get_token_count_of_message(system_prompt_message)
+            self.system_prompt_message = system_prompt_message
+        return dict(self.system_prompt_message)
+
     def get_character(self, info):
         """Return a character object from the current character manager"""
         character = self.character_manager_class(self, info)
@@ -319,7 +390,12 @@ class Characters:
     def before_step(self):
         """Perform a before step in the memory manager - Some memory managers may need to perform some action every step"""
         for character in self.active_characters_list:
-            character.after_step()
+            character.before_step()
+
+    def wait_for_memories(self):
+        """Wait for every active character's memory manager to finish retrieving memories in the background - They all run at the same time, so this takes as long as the slowest one"""
+        for character in self.active_characters_list:
+            character.wait_for_memories()
 
     def reached_conversation_limit(self):
         """Perform an end of conversation step in the memory manager - Some memory managers may need to perform some action every step"""
@@ -25,6 +25,7 @@ logging.info("Imported all interface configs, ready to use them!")
 class ConfigLoader:
     def __init__(self, config_path='config.json'):
         self.config_path = config_path
+        self.prompt_style_version = 0 # incremented whenever the prompt style changes, so anything compiled from it knows to recompile
         self.prompt_styles = {}
         self._raw_prompt_styles = {}
         self.behavior_styles = {}
@@ -288,6 +289,7 @@ class ConfigLoader:
         else:
             logging.error(f"Prompt style not set in config file. Using default prompt style.")
             self._prompt_style = self.prompt_styles["normal_en"]
+        self.prompt_style_version += 1
         # self.get_tokenizer_settings_from_prompt_style()
         logging.info("Getting tokenizer settings from prompt style")
         logging.config("Prompt Style:", json.dumps(self._prompt_style, indent=4))
@@ -315,6 +317,8 @@ class ConfigLoader:
                 "behavior_manager": "auto",
                 "memory_manager": "auto",
                 "character_manager_type": "auto",
+                "file_buffer_watchdog": True, # Use watchdog(if it's installed) to be told when the game changes a _pantella_*.txt file buffer, otherwise they're polled
+                "file_buffer_poll_interval": 0.05, # Seconds between checks for changed file buffers when watchdog isn't used
             },
             "Addons": {
                 "disabled_addons": [],
@@ -432,6 +436,8 @@ class ConfigLoader:
                 "chromadb_memory_direction": "topdown", # topdown or bottomup
                 "chromadb_query_size": 5,
                 "chromadb_memory_editor_enabled": True,
+                "chromadb_async_memory_retrieval": True,
+                "chromadb_memory_wait_timeout": 2.0,
             },
             "SpeechToText": {
                 "stt_enabled": False,
@@ -473,6 +479,7 @@ class ConfigLoader:
                 "conversation_limit_pct": 0.9,
                 "min_conversation_length": 5,
                 "reload_buffer": 20,
+                "threaded_llm_streaming": True, # Consume the LLM's token stream in a producer thread so TTS and audio playback can run while tokens are arriving
                 # "reload_wait_time": 1,
             },
             "PromptStyle":{
@@ -593,6 +600,13 @@ class ConfigLoader:
                 "narrator_voice": "MaleKhajiit",
                 "narrator_volume": 0.5, # 50% volume
                 "narrator_delay": 0.2, # 200ms delay
+                "tts_synthesis_workers": 1, # Number of threads synthesizing voicelines in the background while the LLM is still generating - Only raise this for TTS engines that can handle concurrent requests, like remote API servers
+                "tts_synthesis_queue_size": 3, # Maximum number of voicelines that can be waiting on synthesis or playback before the LLM has to wait for them, 0 disables the synthesis pipeline and synthesizes each voiceline before generating the next one
+                "voiceline_cache_enabled": True, # Reuse previously synthesized voicelines(and their lip files) when the same voice says the exact same line again
+                "voiceline_cache_max_size_mb": 512, # Maximum size of the voiceline cache on disk, the least recently used voicelines are deleted first
+                "speaker_embedding_cache_size": 64, # How many voices' speaker embeddings(prepared reference audio for ChatTTS, F5-TTS, E2-TTS and OuteTTS) to keep in memory, they're also saved to data/speaker_embeddings
+                "lip_generator": "face_fx_wrapper", # The lip generator to use from src/lip_generators/ - Falls back to default_lip if it can't run on this system(e.g. FaceFXWrapper without wine)
+                "lip_generation_workers": 2, # Number of lip files that can be generated at once while the next voicelines are being synthesized
             },
             "xTTS": {
                 "xtts_device": "cuda",
@@ -621,6 +635,8 @@ class ConfigLoader:
                 "xvasynth_banned_voice_models": [],
                 "xvasynth_base_url": "http://127.0.0.1:8008",
                 "xvasynth_banned_voice_models": [],
+                "xvasynth_phrase_concurrency": 2, # Number of phrases of a long voiceline sent to xVASynth at once for xVAPitch(v3) models, which can't be batch synthesized - 1 synthesizes them one after another
+                "xvasynth_early_first_phrase": False, # Synthesize and play the first phrase of a long voiceline on its own, so playback can start before the rest of the voiceline is synthesized
             },
             "xTTS_api": {
                 "xtts_api_dir": ".\\xtts-api-server-pantella\\",
@@ -696,6 +712,15 @@ class ConfigLoader:
                 "gpt_sovits_top_p": 1.0,
                 "gpt_sovits_banned_voice_models": [],
                 "gpt_sovits_error_on_too_short_or_too_long_audio": True,
+                "gpt_sovits_conditioning_cache_size": 16, # How many voices to keep the reference audio conditioning(prompt semantic tokens, BERT features, spectrograms) of in memory, least recently used first out
+                "gpt_sovits_conditioning_cache_to_disk": True, # Save the reference audio conditioning of each voice to data/tts_conditioning so it doesn't need working out again after a restart
+            },
+            "HTTP": {
+                "http_connect_timeout": 5, # Seconds to wait to connect to a local backend like xVASynth, the xTTS API or koboldcpp
+                "http_read_timeout": 120, # Seconds to wait for a backend to respond once connected, long enough for a slow voice model to load
+                "http_retries": 2, # How many times to retry a request that couldn't connect or got a 502/503/504 response
+                "http_retry_backoff": 0.5, # Seconds to wait before the first retry, doubled for every retry after that
+                "http_pool_size": 4, # Number of keep-alive connections kept open to each backend
             },
             "Debugging": {
                 "debug_mode": False,
@@ -712,6 +737,7 @@ class ConfigLoader:
             "Errors": {
                 "block_logs_from": [],
                 "block_log_types": [],
+                "log_level": "DEBUG", # DEBUG, INFO, OUTPUT, WARNING or ERROR
                 "error_on_empty_full_reply": False,
                 "continue_on_voice_model_error": False,
                 "continue_on_missing_character": False,
@@ -768,6 +794,8 @@ class ConfigLoader:
                 "behavior_manager": self.behavior_manager,
                 "memory_manager": self.memory_manager,
                 "character_manager_type": self.character_manager_type,
+                "file_buffer_watchdog": self.file_buffer_watchdog,
+                "file_buffer_poll_interval": self.file_buffer_poll_interval,
             },
             "Addons":{
                 "disabled_addons": self.disabled_addons,
@@ -792,6 +820,8 @@ class ConfigLoader:
                 "chromadb_memory_direction": self.chromadb_memory_direction,
                 "chromadb_query_size": self.chromadb_query_size,
                 "chromadb_memory_editor_enabled": self.chromadb_memory_editor_enabled,
+                "chromadb_async_memory_retrieval": self.chromadb_async_memory_retrieval,
+                "chromadb_memory_wait_timeout": self.chromadb_memory_wait_timeout,
             },
             "SpeechToText": {
                 "stt_enabled": self.stt_enabled,
@@ -833,6 +863,7 @@ class ConfigLoader:
                 "conversation_limit_pct": self.conversation_limit_pct,
                 "min_conversation_length": self.min_conversation_length,
                 "reload_buffer": self.reload_buffer,
+                "threaded_llm_streaming": self.threaded_llm_streaming,
                 # "reload_wait_time": self.reload_wait_time,
             },
             "PromptStyle":{
@@ -933,6 +964,13 @@ class ConfigLoader:
                 "narrator_voice": self.narrator_voice,
                 "narrator_volume": self.narrator_volume,
                 "narrator_delay": self.narrator_delay,
+                "tts_synthesis_workers": self.tts_synthesis_workers,
+                "tts_synthesis_queue_size": self.tts_synthesis_queue_size,
+                "voiceline_cache_enabled": self.voiceline_cache_enabled,
+                "voiceline_cache_max_size_mb": self.voiceline_cache_max_size_mb,
+                "speaker_embedding_cache_size": self.speaker_embedding_cache_size,
+                "lip_generator": self.lip_generator,
+                "lip_generation_workers": self.lip_generation_workers,
             },
             "xTTS": {
                 "xtts_device": self.xtts_device,
@@ -959,6 +997,8 @@ class ConfigLoader:
                 "use_sr": self.use_sr,
                 "xvasynth_banned_voice_models": self.xvasynth_banned_voice_models,
                 "xvasynth_base_url": self.xvasynth_base_url,
+                "xvasynth_phrase_concurrency": self.xvasynth_phrase_concurrency,
+                "xvasynth_early_first_phrase": self.xvasynth_early_first_phrase,
             },
             "xTTS_api": {
                 "xtts_api_dir": self.xtts_api_dir,
@@ -1021,6 +1061,15 @@ class ConfigLoader:
                 "gpt_sovits_top_p": self.gpt_sovits_top_p,
                 "gpt_sovits_banned_voice_models": self.gpt_sovits_banned_voice_models,
                 "gpt_sovits_error_on_too_short_or_too_long_audio": self.gpt_sovits_error_on_too_short_or_too_long_audio,
+                "gpt_sovits_conditioning_cache_size": self.gpt_sovits_conditioning_cache_size,
+                "gpt_sovits_conditioning_cache_to_disk": self.gpt_sovits_conditioning_cache_to_disk,
+            },
+            "HTTP": {
+                "http_connect_timeout": self.http_connect_timeout,
+                "http_read_timeout": self.http_read_timeout,
+                "http_retries": self.http_retries,
+                "http_retry_backoff": self.http_retry_backoff,
+                "http_pool_size": self.http_pool_size,
             },
             "Debugging": {
                 "debug_mode": self.debug_mode,
@@ -1037,6 +1086,7 @@ class ConfigLoader:
             "Errors": {
                 "block_logs_from": self.block_logs_from,
                 "block_log_types": self.block_log_types,
+                "log_level": self.log_level,
                 "error_on_empty_full_reply": self.error_on_empty_full_reply,
                 "continue_on_voice_model_error": self.continue_on_voice_model_error,
                 "continue_on_missing_character": self.continue_on_missing_character,
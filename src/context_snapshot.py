@@ -0,0 +1,62 @@
+print("Importing context_snapshot.py")
+from src.logging import logging
+import json
+import time
+logging.info("Imported required libraries in context_snapshot.py")
+
+class ContextSnapshot:
+    """The context(list of formatted messages) made for one generation, shared by everything that needs it during that generation
+
+    Building the context re-renders the system prompt, retrieves memories and can take a screenshot when vision is enabled, so it's built once per generation and the LLM call, the token budget and the logs all use the same snapshot.
+    The token count and the loggable copy are only worked out the first time they're asked for, and log() doesn't serialize anything if the log level would drop the message.
+    """
+    def __init__(self, conversation_manager, messages):
+        self.conversation_manager = conversation_manager
+        self.messages = messages
+        self.created_at = time.time()
+        self.conversation_step = getattr(conversation_manager, "conversation_step", None)
+        self._token_count = None
+        self._loggable_messages = None
+
+    def __len__(self):
+        return len(self.messages)
+
+    def __iter__(self):
+        return iter(self.messages)
+
+    @property
+    def token_count(self):
+        """Number of tokens the context uses, counted the first time it's needed"""
+        if self._token_count is None:
+            self._token_count = self.conversation_manager.tokenizer.num_tokens_from_messages(self.messages)
+        return self._token_count
+
+    def loggable(self):
+        """Get the messages with image data replaced by a placeholder, so they can be logged"""
+        if self._loggable_messages is None:
+            loggable_messages = []
+            for message in self.messages:
+                if type(message["content"]) == str:
+                    loggable_messages.append(message)
+                else:
+                    new_content = []
+                    for content in message["content"]:
+                        if content["type"] == "image_url":
+                            new_content.append({
+                                "type": "image_url",
+                                "url":"<image_url>"
+                            })
+                        else:
+                            new_content.append(content)
+                    loggable_messages.append({
+                        "role": message["role"],
+                        "content": new_content
+                    })
+            self._loggable_messages = loggable_messages
+        return self._loggable_messages
+
+    def log(self, level="DEBUG", label="Context"):
+        """Log the whole context as JSON at the given level - Skipped without serializing anything if the level isn't being logged"""
+        if not logging.is_enabled(level):
+            return
+        getattr(logging, level.lower())(f"{label} ({len(self.messages)} messages):", json.dumps(self.loggable(), indent=2))
@@ -12,6 +12,8 @@ from src.game_interfaces.base_interface import BaseGameInterface as GameInterfac
 # from src.inference_engines.base_llm import base_LLM
 # import src.stt as stt
 import src.character_db as character_db
+import src.http_client as http_client
+import src.context_snapshot as context_snapshot
 import uuid
 import json
 import random
@@ -44,6 +46,7 @@ class BaseConversationManager:
         self.player_name = None # Initialised at start of every conversation in await_and_setup_conversation()
         self.tokens_available = 0 # Initialised at start of every conversation in await_and_setup_conversation()
         self.messages = [] # Initialised at start of every conversation in await_and_setup_conversation()
+        self.context_snapshot = None # The context used for the latest generation, see get_context_snapshot()
         self.conversation_step = 0 # The current step of the conversation - 0 is before any conversation has started, 1 is the first step of the conversation, etc.
         self.restart = False # Can be set at any time to force restart of conversation manager - Will ungracefully end any ongoing conversation client side
         self.conversation_id = str(uuid.uuid4()) # Generate a unique ID for the conversation
@@ -71,6 +74,7 @@ class BaseConversationManager:
             self.conversation_step = 0 # reset conversation step count
             self.game_interface.end_conversation() # end conversation in game with current active character
             logging.info('Conversation ended')
+            http_client.log_latency_report() # how the TTS/tokenizer backends have been responding so far
 
     def setup_character(self, character_info):
         """Setup the character that the player has selected and add them to the conversation"""
@@ -119,6 +123,7 @@ class BaseConversationManager:
         msg["location"] = self.game_interface.get_current_location() # Add location to message
         if "type" not in msg:
             msg["type"] = "message" # Add type to message
+        msg["token_count"] = self.tokenizer.get_token_count_of_message(msg) # Count the message once now, the memory managers and the context budget check reuse the count
         self.messages.append(msg)
         self.character_manager.add_message(msg)
 
@@ -161,35 +166,20 @@ class BaseConversationManager:
             return []
         return self.inference_engine.get_context()
     
+    def get_context_snapshot(self):
+        """Build the context for the next generation once, and keep it as self.context_snapshot so the LLM call, the token budget and the logs can share it"""
+        self.context_snapshot = context_snapshot.ContextSnapshot(self, self.get_context())
+        return self.context_snapshot
+
     def get_loggable_context(self): # Returns the current context(in the form of a list of messages) for the given active characters in the ongoing conversation
-        messages = self.get_context()
-        loggable_context = []
-        for message in messages:
-            if type(message["content"]) == str:
-                loggable_context.append(message)
-            else:
-                new_content = []
-                for content in message["content"]:
-                    if content["type"] == "image_url":
-                        new_content.append({
-                            "type": "image_url",
-                            "url":"<image_url>"
-                        })
-                    else:
-                        new_content.append(content)
-                loggable_context.append({
-                    "role": message["role"],
-                    "content": new_content
-                })
-                logging.info(f"Loggable context: {json.dumps(loggable_context, indent=4)}")
-                # input("Press enter to continue")
-        return loggable_context
+        return self.get_context_snapshot().loggable()
     
     async def get_response(self, force_speaker=None):
         """Get response from LLM and NPC(s) in the conversation"""
         sentence_queue = asyncio.Queue() # Create queue to hold sentences to be processed
         event = asyncio.Event() # Create event to signal when the response has been received
         event.set() # Set event to true to allow the first sentence to be processed
+        self.response_start_time = time.time() # Used by the game interface to log the time to first audio
 
         await asyncio.gather(
             self.inference_engine.process_response(sentence_queue, event, force_speaker=force_speaker),
@@ -88,7 +88,7 @@ class ConversationManager(BaseConversationManager):
         elif self.radiant_dialogue and self.character_manager.active_character_count() > 2:
             valid_conversation = True
         if valid_conversation:
-            tokens_in_use = self.tokenizer.num_tokens_from_messages(self.get_context())
+            tokens_in_use = self.get_context_snapshot().token_count
         else:
             tokens_in_use = 0
         self.tokens_available = self.config.maximum_local_tokens - tokens_in_use # calculate number of tokens available for the conversation
@@ -168,7 +168,7 @@ class ConversationManager(BaseConversationManager):
             time.sleep(0.2)
             return
         logging.info('Stepping through conversation...')
-        logging.info(f"Messages: {json.dumps(self.get_loggable_context(), indent=2)}")
+        logging.info(f"Messages: {len(self.messages)}") # the whole context is logged at debug level when it's built for the next generation, see ContextSnapshot.log()
         # if self.inference_engine.type == "chat":
         #     logging.info(f"Presumed Raw Prompt: {self.inference_engine.tokenizer.get_string_from_messages(self.get_context())}")
         # elif self.inference_engine.type == "normal":
@@ -251,5 +251,5 @@ class ConversationManager(BaseConversationManager):
 
         self.character_manager.after_step() # Let the characters know that a step has been taken
         # if the conversation is becoming too long, save the conversation to memory and reload
-        if self.tokenizer.num_tokens_from_messages(self.messages[1:]) > (round(self.tokens_available*self.config.conversation_limit_pct,0)): # if the conversation is becoming too long, save the conversation to memory and reload
+        if self.tokenizer.num_tokens_from_messages_cached(self.messages[1:]) > (round(self.tokens_available*self.config.conversation_limit_pct,0)): # if the conversation is becoming too long, save the conversation to memory and reload
             self.reload_conversation()
\ No newline at end of file
@@ -86,7 +86,7 @@ class ConversationManager(BaseConversationManager):
 
         self.messages = [] # clear messages
 
-        self.tokens_available = self.config.maximum_local_tokens - self.tokenizer.num_tokens_from_messages(self.get_context()) # calculate number of tokens available for the conversation
+        self.tokens_available = self.config.maximum_local_tokens - self.get_context_snapshot().token_count # calculate number of tokens available for the conversation
 
         self.game_interface.update_game_events() # update game events before first player input
         try: # get response from NPC to player greeting
@@ -112,7 +112,7 @@ class ConversationManager(BaseConversationManager):
 
         await self.update_game_state()
         logging.info('Stepping through conversation...')
-        logging.info(f"Messages: {json.dumps(self.get_context(), indent=2)}")
+        logging.info(f"Messages: {len(self.messages)}") # the whole context is logged at debug level when it's built for the next generation, see ContextSnapshot.log()
         
         transcript_cleaned = ''
         transcribed_text = None
@@ -160,5 +160,5 @@ class ConversationManager(BaseConversationManager):
 
         self.character_manager.after_step() # Let the characters know after a step has been taken
         # if the conversation is becoming too long, save the conversation to memory and reload
-        if self.tokenizer.num_tokens_from_messages(self.messages[1:]) > (round(self.tokens_available*self.config.conversation_limit_pct,0)): # if the conversation is becoming too long, save the conversation to memory and reload
+        if self.tokenizer.num_tokens_from_messages_cached(self.messages[1:]) > (round(self.tokens_available*self.config.conversation_limit_pct,0)): # if the conversation is becoming too long, save the conversation to memory and reload
             self.reload_conversation()
\ No newline at end of file
@@ -0,0 +1,125 @@
+print("Importing emotion_model.py")
+from src.logging import logging
+import os
+import json
+import threading
+from collections import OrderedDict
+import numpy as np
+logging.info("Imported required libraries in emotion_model.py")
+
+def top_elements(array, k):
+    ind = np.argpartition(array, -k)[-k:]
+    return ind[np.argsort(array[ind])][::-1]
+
+EMPTY_PREDICTION = {"🫥":1} # dotted face emoji
+
+class EmotionModel:
+    """Process wide TorchMoji emoji predictor shared by every memory manager
+
+    The weights, vocabulary and emoji codes are loaded the first time a prediction is needed instead of once per character.
+    Recent predictions are remembered, so when several characters are listening to the same message it's only scored once.
+    """
+    def __init__(self, config):
+        self.config = config
+        self.max_length = self.config.torchmoji_max_length
+        self.model = None
+        self.tokenizer = None
+        self.emoji_codes = None
+        self.lock = threading.Lock() # the TorchMoji tokenizer keeps state between calls, so only one batch is scored at a time
+        self.recent_predictions = OrderedDict() # (string, emoji_count) -> prediction, least recently used first
+        self.recent_predictions_size = 256
+
+    def load(self):
+        """Load TorchMoji if it hasn't been loaded yet - Caller must hold the lock"""
+        if self.model is not None:
+            return
+        from src.torchmoji.sentence_tokenizer import SentenceTokenizer
+        from src.torchmoji.model_def import torchmoji_emojis
+        logging.info("Loading TorchMoji...")
+        if self.config.linux_mode:
+            torchmoji_model_path = os.path.join(os.getcwd(), "data/models/torchmoji/pytorch_model.bin")
+            torchmoji_vocab_path = os.path.join(os.getcwd(), "data/models/torchmoji/vocabulary.json")
+            emoji_codes_path = os.path.join(os.getcwd(), "data/models/torchmoji/emoji_codes.json")
+        else:
+            torchmoji_model_path = os.path.join(os.getcwd(), "data\\models\\torchmoji\\pytorch_model.bin")
+            torchmoji_vocab_path = os.path.join(os.getcwd(), "data\\models\\torchmoji\\vocabulary.json")
+            emoji_codes_path = os.path.join(os.getcwd(), "data\\models\\torchmoji\\emoji_codes.json")
+        with open(torchmoji_vocab_path, 'r') as f:
+            vocabulary = json.load(f)
+        with open(emoji_codes_path, 'r') as f:
+            self.emoji_codes = json.load(f)
+        self.tokenizer = SentenceTokenizer(vocabulary, self.max_length)
+        self.model = torchmoji_emojis(torchmoji_model_path)
+        logging.info("TorchMoji loaded.")
+        logging.info(self.model)
+
+    def predict(self, string, emoji_count=10):
+        """Predict emojis from a string"""
+        return self.predict_batch([string], emoji_count)[0]
+
+    def predict_batch(self, strings, emoji_count=10):
+        """Predict emojis for many strings with one forward pass over a padded batch, returns one prediction per string"""
+        predictions = [None] * len(strings)
+        to_score = OrderedDict() # string -> indexes in strings that need it
+        with self.lock:
+            for i, string in enumerate(strings):
+                if string.strip() == '':
+                    predictions[i] = dict(EMPTY_PREDICTION)
+                elif (string, emoji_count) in self.recent_predictions:
+                    self.recent_predictions.move_to_end((string, emoji_count))
+                    predictions[i] = dict(self.recent_predictions[(string, emoji_count)])
+                else:
+                    to_score.setdefault(string, []).append(i)
+            if len(to_score) > 0:
+                self.load()
+                unique_strings = list(to_score.keys())
+                try:
+                    scored = self._score(unique_strings, emoji_count)
+                except Exception as e: # a string that tokenizes to nothing can break the whole batch, so fall back to scoring them one at a time
+                    logging.warning(f"Batched TorchMoji prediction failed, scoring {len(unique_strings)} strings one at a time: {e}")
+                    scored = []
+                    for string in unique_strings:
+                        try:
+                            scored.append(self._score([string], emoji_count)[0])
+                        except Exception as e:
+                            logging.error(f"TorchMoji prediction failed for string: {string}: {e}")
+                            scored.append(dict(EMPTY_PREDICTION))
+                for string, prediction in zip(unique_strings, scored):
+                    self.recent_predictions[(string, emoji_count)] = prediction
+                    for i in to_score[string]:
+                        predictions[i] = dict(prediction)
+                while len(self.recent_predictions) > self.recent_predictions_size:
+                    self.recent_predictions.popitem(last=False)
+        return predictions
+
+    def _score(self, strings, emoji_count):
+        """Run the model on a batch of non-empty strings - Caller must hold the lock"""
+        tokenized, _, _ = self.tokenizer.tokenize_sentences(strings)
+        if len(tokenized) == 0:
+            return [dict(EMPTY_PREDICTION) for _ in strings]
+        prob = self.model(tokenized)
+        predictions = []
+        for i in range(len(strings)):
+            # Find top emojis for each sentence. Emoji ids (0-63)
+            # correspond to the mapping in emoji_overview.png
+            # at the root of the torchMoji repo.
+            t_prob = prob[i]
+            return_label = {}
+            for ind in top_elements(t_prob, emoji_count):
+                # unicode emoji + :alias: -> propability
+                return_label[self.emoji_codes[str(ind)]] = t_prob[ind]
+            if len(return_label) == 0:
+                return_label = dict(EMPTY_PREDICTION)
+            predictions.append(return_label)
+        return predictions
+
+_emotion_model = None
+_emotion_model_lock = threading.Lock()
+
+def get_emotion_model(config):
+    """Get the emotion model shared by every memory manager - Nothing is loaded until the first prediction"""
+    global _emotion_model
+    with _emotion_model_lock:
+        if _emotion_model is None:
+            _emotion_model = EmotionModel(config)
+        return _emotion_model
@@ -0,0 +1,208 @@
+print("Importing file_buffers.py")
+from src.logging import logging
+import os
+import threading
+import asyncio
+logging.info("Imported required libraries in file_buffers.py")
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    watchdog_available = True
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+    watchdog_available = False
+
+class _BufferEventHandler(FileSystemEventHandler):
+    """Forwards watchdog events for _pantella_*.txt files to the FileBuffers that owns it"""
+    def __init__(self, file_buffers):
+        self.file_buffers = file_buffers
+
+    def on_any_event(self, event):
+        if getattr(event, "is_directory", False):
+            return
+        for path in (getattr(event, "src_path", None), getattr(event, "dest_path", None)):
+            if path:
+                name = self.file_buffers.get_name_from_path(path)
+                if name is not None:
+                    self.file_buffers.changed(name)
+
+class FileBuffers:
+    """In-memory view of the _pantella_*.txt files the game and Pantella use to talk to each other
+
+    Each buffer is read from disk once and then served from memory until it changes. Changes are picked up from watchdog's file system notifications when watchdog is installed, otherwise a background thread compares each watched file's mtime and size every poll_interval seconds.
+    Waiting for a buffer to get a value (wait_until() from threads, await wait_for() from the event loop) sleeps until the buffer changes instead of re-opening the file in a loop.
+    """
+    def __init__(self, folder, poll_interval=0.05, use_watchdog=True, linux_mode=False):
+        self.folder = folder
+        self.poll_interval = max(0.001, poll_interval)
+        self.linux_mode = linux_mode
+        self.buffers = {} # name -> {"stat": (mtime_ns, size) of the file when it was read, "text": contents, "dirty": True once the file has changed since it was read}
+        self.versions = {} # name -> number of changes seen, so waiters can tell that something happened
+        self.condition = threading.Condition() # guards buffers/versions/async_waiters and wakes up wait_until() callers
+        self.async_waiters = {} # name -> [(loop, asyncio.Future)] woken up when the buffer changes
+        self.observer = None
+        self.poller = None
+        self.stopped = False
+        if use_watchdog and watchdog_available:
+            try:
+                self.observer = Observer()
+                self.observer.schedule(_BufferEventHandler(self), self.folder, recursive=False)
+                self.observer.daemon = True
+                self.observer.start()
+                logging.info(f"Watching {self.folder} for file buffer changes with watchdog")
+            except Exception as e:
+                logging.warning(f"Could not watch {self.folder} with watchdog, polling for file buffer changes instead: {e}")
+                self.observer = None
+        elif use_watchdog:
+            logging.info("watchdog is not installed, polling for file buffer changes instead")
+        if self.observer is None:
+            self.poller = threading.Thread(target=self._poll_loop, name="file_buffer_poller", daemon=True)
+            self.poller.start()
+            logging.info(f"Polling {self.folder} for file buffer changes every {self.poll_interval} seconds")
+
+    def get_paths(self, name):
+        """Paths the buffer can be found at, in the order they're tried"""
+        paths = [os.path.join(self.folder, f"{name}.txt")]
+        if self.linux_mode: # Papyrus running under wine sometimes writes the file with the Windows separator as part of the name
+            paths.append(os.path.join(self.folder, f"\\{name}.txt"))
+        return paths
+
+    def get_name_from_path(self, path):
+        """Get the buffer name for a path, or None if it isn't a _pantella_*.txt file"""
+        file_name = os.path.basename(path).lstrip("\\")
+        if not file_name.startswith("_pantella_") or not file_name.endswith(".txt"):
+            return None
+        return file_name[:-4]
+
+    def _stat(self, name):
+        """Get (path, (mtime_ns, size)) of the first path the buffer exists at, or (None, None) if it doesn't exist"""
+        for path in self.get_paths(name):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            return path, (stat.st_mtime_ns, stat.st_size)
+        return None, None
+
+    def _decode(self, data):
+        try:
+            return data.decode('utf-8')
+        except UnicodeDecodeError:
+            try:
+                return data.decode('ansi')
+            except LookupError: # the ansi codec only exists on Windows
+                return data.decode('cp1252', errors='replace')
+
+    def read(self, name):
+        """Get the contents of a buffer, only touching the disk if it has changed since it was last read - Raises FileNotFoundError if the file doesn't exist"""
+        path, stat = self._stat(name) # stat even when watchdog is running, since its events can be dropped(queue overflows, network or wine mounts, the folder being recreated) and a stat is cheap next to re-reading the file
+        if path is None:
+            with self.condition:
+                self.buffers.pop(name, None)
+            raise FileNotFoundError(f"Could not find {name}.txt in {self.folder}")
+        with self.condition:
+            buffer = self.buffers.get(name)
+            if buffer is not None and not buffer["dirty"] and buffer["stat"] == stat:
+                return buffer["text"]
+        with open(path, 'rb') as f:
+            data = f.read()
+        text = self._decode(data)
+        with self.condition:
+            self.buffers[name] = {"stat": stat, "text": text, "dirty": False}
+        return text
+
+    def read_line(self, name):
+        """Get the first line of a buffer with surrounding whitespace removed"""
+        return self.read(name).split("\n", 1)[0].strip()
+
+    def changed(self, name):
+        """Mark a buffer as changed and wake up anything waiting on it - Called by the watcher, and by the game interface after writing to a buffer itself"""
+        with self.condition:
+            if name in self.buffers:
+                self.buffers[name]["dirty"] = True
+            self.versions[name] = self.versions.get(name, 0) + 1
+            waiters = self.async_waiters.pop(name, [])
+            self.condition.notify_all()
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(self._wake, future)
+            except RuntimeError: # the loop has been closed
+                pass
+
+    def _wake(self, future):
+        if not future.done():
+            future.set_result(True)
+
+    def _poll_loop(self):
+        """Compare the mtime and size of every buffer that's been read or waited on, and report the ones that changed"""
+        while not self.stopped:
+            with self.condition:
+                names = set(self.buffers.keys()) | set(self.versions.keys())
+                known_stats = {name: self.buffers[name]["stat"] for name in self.buffers}
+            for name in names:
+                _, stat = self._stat(name)
+                if stat != known_stats.get(name):
+                    with self.condition:
+                        buffer = self.buffers.get(name)
+                        already_known = buffer is not None and buffer["dirty"]
+                        if buffer is None and stat is None:
+                            continue
+                    if not already_known:
+                        self.changed(name)
+            time_to_sleep = self.poll_interval
+            with self.condition:
+                self.condition.wait_for(lambda: self.stopped, timeout=time_to_sleep)
+
+    def _read_line_or_empty(self, name):
+        try:
+            return self.read_line(name)
+        except FileNotFoundError:
+            return ''
+
+    def wait_until(self, name, predicate=lambda line: line != '', callback=None):
+        """Block until the first line of a buffer satisfies predicate, and return it - A missing file counts as an empty buffer. callback is called every time the buffer is checked"""
+        with self.condition:
+            self.versions.setdefault(name, 0) # make sure the poller is watching it
+        while True:
+            with self.condition:
+                version = self.versions[name]
+            line = self._read_line_or_empty(name)
+            if callback is not None:
+                callback()
+            if predicate(line):
+                return line
+            with self.condition: # the timeout is a safety net in case a change notification is missed, e.g. a write within the file system's mtime resolution
+                self.condition.wait_for(lambda: self.versions[name] != version or self.stopped, timeout=max(self.poll_interval, 0.5))
+            if self.stopped:
+                return line
+
+    async def wait_for(self, name, predicate=lambda line: line != ''):
+        """Wait until the first line of a buffer satisfies predicate without blocking the event loop, and return it - e.g. `await buffers.wait_for('_pantella_current_actor')`"""
+        loop = asyncio.get_running_loop()
+        with self.condition:
+            self.versions.setdefault(name, 0)
+        while True:
+            future = loop.create_future()
+            with self.condition:
+                self.async_waiters.setdefault(name, []).append((loop, future))
+            line = self._read_line_or_empty(name) # read after registering, so a change between the read and the wait isn't missed
+            if predicate(line) or self.stopped:
+                with self.condition:
+                    waiters = self.async_waiters.get(name, [])
+                    if (loop, future) in waiters:
+                        waiters.remove((loop, future))
+                return line
+            try:
+                await asyncio.wait_for(future, timeout=max(self.poll_interval, 0.5))
+            except asyncio.TimeoutError:
+                pass
+
+    def stop(self):
+        """Stop watching for changes"""
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        if self.observer is not None:
+            self.observer.stop()
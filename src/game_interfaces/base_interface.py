@@ -177,8 +177,15 @@ class BaseGameInterface:
         logging.error(f"send_audio_to_external_software not implemented for game_interface {self.__class__.__name__}")
         raise NotImplementedError
 
+    def log_time_to_first_audio(self):
+        """Log how long it took from the start of the response until the first voiceline was sent to the external software"""
+        response_start_time = getattr(self.conversation_manager, "response_start_time", None)
+        if response_start_time is not None:
+            logging.info(f"Time to first audio: {round(time.time() - response_start_time, 5)} seconds")
+
     async def send_response(self, sentence_queue, event):
         """Send response from sentence queue generated by `process_response()`"""
+        first_audio = True
         while True: # keep getting audio files from the queue until the queue is empty
             queue_output = await sentence_queue.get() # get the next audio file from the queue
             if queue_output is None:
@@ -192,6 +199,9 @@ class BaseGameInterface:
                 if not self.config.continue_on_failure_to_send_audio_to_game_interface:
                     input("Press Enter to continue...")
                     raise e
+            if first_audio:
+                self.log_time_to_first_audio()
+                first_audio = False
             event.set() # set the event to let the process_response() function know that it can generate the next sentence while the last sentence's audio is playing
             
             # wait for the audio playback to complete before getting the next file
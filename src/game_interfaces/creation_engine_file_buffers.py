@@ -1,6 +1,7 @@
 print("Importing game_interfaces/creation_engine_file_buffers.py")
 from src.logging import logging, time
 from src.game_interfaces.base_interface import BaseGameInterface
+from src.file_buffers import FileBuffers
 import src.utils as utils
 import os
 import shutil
@@ -39,6 +40,9 @@ class GameInterface(BaseGameInterface):
         self.f4_wav_file1 = f'MutantellaOutput1.wav'
         self.f4_wav_file2 = f'MutantellaOutput2.wav'
         self.f4_lip_file = f'00001ED2_1.lip'
+
+        # cached view of the _pantella_*.txt files, only re-read when the game changes them - Made even if the game path doesn't exist yet, missing files read as empty and the watcher falls back to polling until they appear
+        self.file_buffers = FileBuffers(self.game_path, self.config.file_buffer_poll_interval, self.config.file_buffer_watchdog, self.config.linux_mode)
         logging.info("Loading creation engine file buffers game interface")
 
     @property
@@ -183,6 +187,7 @@ class GameInterface(BaseGameInterface):
 
     async def send_response(self, sentence_queue, event):
         """Send response from sentence queue generated by `process_response()`"""
+        first_audio = True
         while True: # keep getting audio files from the queue until the queue is empty
             queue_output = await sentence_queue.get() # get the next audio file from the queue
             if queue_output is None:
@@ -190,28 +195,22 @@ class GameInterface(BaseGameInterface):
                 break # stop getting audio files from the queue if the queue is empty
 
             await self.send_audio_to_external_software(queue_output) # send the audio file to the external software and start playing it.
+            if first_audio:
+                self.log_time_to_first_audio()
+                first_audio = False
             event.set() # set the event to let the process_response() function know that it can generate the next sentence while the last sentence's audio is playing
             
             #if Fallout4 is running the audio will be sync by checking if say line is set to false because the game can internally check if an audio file has finished playing
             # wait for the audio playback to complete before getting the next file
             if self.game_id == "fallout4":
-                with open(f'{self.root_mod_folter}\\_pantella_actor_count.txt', 'r', encoding='utf-8') as f:
-                    pantellaactorcount = f.read().strip() 
-                # Outer loop to continuously check the files
-                while True:
-                    all_false = True  # Flag to check if all files have 'false'
-
-                    # Iterate through the number of files indicated by pantellaactorcount
-                    for i in range(1, int(pantellaactorcount) + 1):
-                        file_name = f'{self.root_mod_folter}\\_pantella_say_line_{i}.txt'
-                        with open(file_name, 'r', encoding='utf-8') as f:
-                            content = f.read().strip()
-                            if content.lower() != 'false':
-                                all_false = False  # Set the flag to False if any file is not 'false'
-                                break  # Break the for loop and continue the while loop
-                    if all_false:
-                        break  # Break the outer loop if all files are 'false'
-                    await asyncio.sleep(0.1)  # Adjust the sleep duration as needed
+                pantellaactorcount = int(self.file_buffers.read('_pantella_actor_count').strip())
+                say_line_buffers = [f'_pantella_say_line_{i}' for i in range(1, pantellaactorcount + 1)]
+                is_false = lambda line: line.lower() == 'false'
+                while True: # wait until every say line buffer is 'false' - the game changing a buffer wakes us up, instead of re-opening every file every 100ms
+                    for say_line_buffer in say_line_buffers:
+                        await self.file_buffers.wait_for(say_line_buffer, is_false)
+                    if all(is_false(self.file_buffers.read_line(say_line_buffer)) for say_line_buffer in say_line_buffers): # check again in case an earlier one changed while waiting on a later one
+                        break
             else: # if Skyrim's running then estimate audio duration to sync lip files
                 audio_duration = await self.get_audio_duration(queue_output[0])
                 # wait for the audio playback to complete before getting the next file
@@ -234,6 +233,7 @@ class GameInterface(BaseGameInterface):
                     write_path = f'{self.game_path}/{text_file_name}.txt'
                 with open(write_path, write_type, encoding='utf-8') as f:
                     f.write(text)
+                self.file_buffers.changed(text_file_name) # don't wait for the watcher to notice our own write
                 break
             except PermissionError:
                 logging.info(f'Permission denied to write to {text_file_name}.txt. Retrying...')
@@ -245,36 +245,14 @@ class GameInterface(BaseGameInterface):
 
 
     def load_data_when_available(self, text_file_name, text = '', callback = None):
-        while text == '':
-            if self.config.linux_mode:
-                try:
-                    # print(f"Checking for '{text_file_name}.txt' in {self.game_path}/")
-                    with open(f'{self.game_path}/{text_file_name}.txt', 'r', encoding='utf-8') as f:
-                        # print(f"Found '{text_file_name}.txt' in {self.game_path}/")
-                        text = f.readline().strip()
-                except:
-                    try:
-                        # print(f"Checking for '\\{text_file_name}.txt' in {self.game_path}/")
-                        with open(f'{self.game_path}/\\{text_file_name}.txt', 'r', encoding='utf-8') as f:
-                            # print(f"Found '\\{text_file_name}.txt' in {self.game_path}/")
-                            text = f.readline().strip()
-                    except:
-                        # print(f"Checking for '{text_file_name}.txt' in {self.game_path}/")
-                        with open(f'{self.game_path}/{text_file_name}.txt', 'r', encoding='ansi') as f:
-                            # print(f"Found '{text_file_name}.txt' in {self.game_path}/")
-                            text = f.readline().strip()
-            else:
-                try:
-                    with open(f'{self.game_path}\\{text_file_name}.txt', 'r', encoding='utf-8') as f:
-                        text = f.readline().strip()
-                except:
-                    with open(f'{self.game_path}\\{text_file_name}.txt', 'r', encoding='ansi') as f:
-                        text = f.readline().strip()
-            # decrease stress on CPU while waiting for file to populate
-            if callback != None:
-                callback()
-            time.sleep(0.01)
-        return text
+        """Wait for a file buffer to be populated and return its first line - If text isn't empty it's returned straight away"""
+        if text != '':
+            return text
+        return self.file_buffers.wait_until(text_file_name, callback=callback) # sleeps until the buffer changes instead of re-opening the file every 10ms
+
+    async def wait_for(self, text_file_name, predicate = lambda line: line != ''):
+        """Wait for the first line of a file buffer to satisfy predicate(by default, to be populated) without blocking the event loop, and return it"""
+        return await self.file_buffers.wait_for(text_file_name, predicate)
     
 
     @utils.time_it
@@ -412,9 +390,7 @@ class GameInterface(BaseGameInterface):
     def get_current_context_string(self):
         """Wait for context string to populate"""
         
-        with open(f'{self.game_path}\\_pantella_context_string.txt', 'r', encoding='utf-8') as f:
-            context_string = f.readline().strip()
-        return context_string
+        return self.file_buffers.read_line('_pantella_context_string')
     
     def queue_actor_method(self, actor_character, method_name, *args):
         """Queue an arbitrary method to be run on the actor in game via the game interface."""
@@ -436,6 +412,7 @@ class GameInterface(BaseGameInterface):
             try:
                 with open(f'{self.game_path}\\_pantella_actor_methods.txt', 'a', encoding='utf-8') as f:
                     f.write(f'{function_call}\n')
+                self.file_buffers.changed('_pantella_actor_methods')
                 break
             except PermissionError:
                 logging.info(f'Permission denied to write to _pantella_actor_methods.txt. Retrying...')
@@ -447,31 +424,20 @@ class GameInterface(BaseGameInterface):
     def is_radiant_dialogue(self):
         """Check if radiant dialogue is enabled"""
         logging.info(f"Waiting for radiant dialogue to populate...")
-        if self.config.linux_mode:
-            with open(f'{self.game_path}/_pantella_radiant_dialogue.txt', 'r', encoding='utf-8') as f:
-                radiant_dialogue = f.readline().strip().lower()
-        else:
-            with open(f'{self.game_path}\\_pantella_radiant_dialogue.txt', 'r', encoding='utf-8') as f: # check if radiant dialogue is enabled
-                radiant_dialogue = f.readline().strip().lower()
+        radiant_dialogue = self.file_buffers.read_line('_pantella_radiant_dialogue').lower()
         logging.info(f"Radiant dialogue: {radiant_dialogue}")
         return radiant_dialogue == 'true'
 
     def is_conversation_ended(self):
-        if self.config.linux_mode:
-            with open(f'{self.game_path}/_pantella_end_conversation.txt', 'r', encoding='utf-8') as f:
-                conversation_ended = f.readline().strip().lower()
-        else:
-            with open(f'{self.game_path}\\_pantella_end_conversation.txt', 'r', encoding='utf-8') as f: # check if conversation has ended
-                conversation_ended = f.readline().strip().lower()
-        return conversation_ended == 'true'
+        """Check if the conversation has ended in-game"""
+        return self.file_buffers.read_line('_pantella_end_conversation').lower() == 'true'
     
     def load_ingame_actor_count(self):
-        with open(f'{self.game_path}\\_pantella_actor_count.txt', 'r', encoding='utf-8') as f: # check how many characters are in the conversation
-            try:
-                num_characters_selected = int(f.readline().strip())
-            except:
-                logging.info('Failed to read _pantella_actor_count.txt')
-                num_characters_selected = 0
+        try: # check how many characters are in the conversation
+            num_characters_selected = int(self.file_buffers.read_line('_pantella_actor_count'))
+        except ValueError:
+            logging.info('Failed to read _pantella_actor_count.txt')
+            num_characters_selected = 0
         return num_characters_selected
     
     def load_unnamed_npc(self, character_name):
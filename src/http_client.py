@@ -0,0 +1,145 @@
+print("Importing http_client.py")
+from src.logging import logging
+import time
+import bisect
+import asyncio
+import threading
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+logging.info("Imported required libraries in http_client.py")
+
+RETRY_STATUS_CODES = {502, 503, 504} # the server is up but not ready yet, or a proxy in front of it is having a moment
+
+class LatencyHistogram:
+    """Counts of request latencies in fixed buckets, so percentiles can be estimated without keeping every sample"""
+    bucket_bounds = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60] # seconds, the last bucket is everything slower
+
+    def __init__(self):
+        self.counts = [0] * (len(self.bucket_bounds) + 1)
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds, error=False):
+        self.counts[bisect.bisect_left(self.bucket_bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        if error:
+            self.errors += 1
+
+    def percentile(self, percent):
+        """Upper bound of the bucket the percentile falls in"""
+        if self.count == 0:
+            return 0.0
+        target = self.count * percent / 100
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return self.bucket_bounds[index] if index < len(self.bucket_bounds) else self.max
+        return self.max
+
+    def summary(self):
+        if self.count == 0:
+            return "no requests"
+        return f"{self.count} requests, {self.errors} errors, mean {round(self.total / self.count * 1000, 1)}ms, p50 <= {round(self.percentile(50) * 1000)}ms, p95 <= {round(self.percentile(95) * 1000)}ms, max {round(self.max * 1000, 1)}ms"
+
+class HTTPClient:
+    """Keep-alive HTTP client for one backend(xVASynth, xTTS API, koboldcpp etc.)
+
+    Requests reuse pooled connections instead of opening a new TCP connection every time, have a (connect, read) timeout, and are retried a bounded number of times on connection errors and 502/503/504 responses.
+    Latency is recorded per endpoint in a LatencyHistogram. arequest()/aget()/apost() run the same requests from the event loop without blocking it.
+    """
+    def __init__(self, name, config):
+        self.name = name
+        self.timeout = (config.http_connect_timeout, config.http_read_timeout)
+        self.retries = max(0, config.http_retries)
+        self.retry_backoff = config.http_retry_backoff
+        self.pool_size = max(1, config.http_pool_size)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size) # retries are done by request() so they're counted in the histograms
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.histograms = {} # "METHOD /path" -> LatencyHistogram
+        self.histograms_lock = threading.Lock()
+        self.executor = None # thread pool for the async requests, created on first use
+
+    def record(self, method, url, seconds, error=False):
+        endpoint = f"{method.upper()} {urlsplit(url).path or '/'}"
+        with self.histograms_lock:
+            if endpoint not in self.histograms:
+                self.histograms[endpoint] = LatencyHistogram()
+            self.histograms[endpoint].add(seconds, error)
+
+    def request(self, method, url, timeout=None, retries=None, **kwargs):
+        """Send a request with the session, retrying up to retries times(the client's default if None) - timeout can be a number or a (connect, read) tuple"""
+        if timeout is None:
+            timeout = self.timeout
+        if retries is None:
+            retries = self.retries
+        attempt = 0
+        while True:
+            start = time.time()
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except requests.exceptions.ConnectionError as e: # includes connect timeouts, read timeouts aren't retried since the server might still be working on the request
+                self.record(method, url, time.time() - start, error=True)
+                if attempt >= retries:
+                    raise e
+                logging.warning(f"{self.name} - {method.upper()} {url} failed, retrying({attempt + 1}/{retries}): {e}")
+            except Exception as e:
+                self.record(method, url, time.time() - start, error=True)
+                raise e
+            else:
+                self.record(method, url, time.time() - start, error=response.status_code >= 400)
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= retries:
+                    return response
+                logging.warning(f"{self.name} - {method.upper()} {url} returned {response.status_code}, retrying({attempt + 1}/{retries})")
+            time.sleep(self.retry_backoff * (2 ** attempt))
+            attempt += 1
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    async def arequest(self, method, url, **kwargs):
+        """request() without blocking the event loop - Uses the same connection pool, retries and histograms"""
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix=f"{self.name}_http")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, lambda: self.request(method, url, **kwargs))
+
+    async def aget(self, url, **kwargs):
+        return await self.arequest("GET", url, **kwargs)
+
+    async def apost(self, url, **kwargs):
+        return await self.arequest("POST", url, **kwargs)
+
+    def latency_report(self):
+        """Get a line per endpoint describing its latency histogram"""
+        with self.histograms_lock:
+            return [f"{self.name} {endpoint}: {histogram.summary()}" for endpoint, histogram in sorted(self.histograms.items())]
+
+_clients = {} # backend name -> HTTPClient
+_clients_lock = threading.Lock()
+
+def get_client(name, config):
+    """Get the HTTP client shared by everything talking to the named backend"""
+    with _clients_lock:
+        if name not in _clients:
+            _clients[name] = HTTPClient(name, config)
+        return _clients[name]
+
+def log_latency_report():
+    """Log the latency histograms of every backend that's been used"""
+    with _clients_lock:
+        clients = list(_clients.values())
+    for client in clients:
+        for line in client.latency_report():
+            logging.info(line)
@@ -1,6 +1,8 @@
 print("Importing base_LLM.py")
 from src.logging import logging, time
 import src.utils as utils
+import src.synthesis_pipeline as synthesis_pipeline
+import src.streaming_json as streaming_json
 import re
 import unicodedata
 import time
@@ -9,6 +11,7 @@ import traceback
 import base64
 import json
 import urllib.request
+import asyncio
 import numpy as np
 from PIL import Image
 from pydantic import BaseModel, Field
@@ -152,6 +155,8 @@ class base_LLM():
         self.completions_supported = True
         self.cot_supported = False
         self.character_generation_supported = False
+        self.formatted_messages = {} # (message key, perspective player name, multi NPC) -> (source fields, formatted message) for the messages in the last context, see get_formatted_message()
+        self.formatted_messages_dependencies = None # (active characters, perspective player name, player name) the cached formatted messages were made for
         if self.vision_enabled:
             if self.config.paddle_ocr and not ocr_loaded: # Load paddleocr if it's installed
                 logging.error(f"Error loading paddleocr for vision enabled inference engine. Please check that you have installed paddleocr correctly. OCR will not be used but basic image embedding will still work.")
@@ -618,15 +623,13 @@ class base_LLM():
     def get_messages(self):
         """Get the messages from the conversation manager"""
         logging.info(f"Getting messages from conversation manager")
-        system_prompt = self.character_manager.get_system_prompt() # get system prompt
-        system_prompt_message = {'role': self.config.system_name, 'content': system_prompt, "type":"prompt"}
-        system_prompt_message_token_count = self.conversation_manager.tokenizer.get_token_count_of_message(system_prompt_message)
-        system_prompt_message["token_count"] = system_prompt_message_token_count
+        system_prompt_message = self.character_manager.get_system_prompt_message() # get system prompt, only rebuilt when something it depends on has changed
         msgs = [] # add system prompt to context
         msgs.extend(self.messages) # add messages to context
 
         memory_offset = self.character_manager.memory_offset
         memory_offset_direction = self.character_manager.memory_offset_direction
+        self.character_manager.wait_for_memories() # memory retrieval was started when the player's message came in, use it if it's ready or wait up to the configured timeout
         memories = self.character_manager.get_memories()
         # insert memories into msgs based on memory_offset_direction "topdown" for from the beginning and "bottomup" for from the end, and insert it at memory_offset from the beginning or end
         if memory_offset == 0: # if memory offset is 0, then insert memories after the system prompt
@@ -647,11 +650,55 @@ class base_LLM():
             schema_message["token_count"] = schema_message_token_count
             msgs.append(schema_message) # add schema description to context at the end of the messages
         
-        logging.debug("Messages List:", json.dumps(msgs, indent=4))
+        if logging.is_enabled("DEBUG"): # don't serialize every message just to drop the log
+            logging.debug("Messages List:", json.dumps(msgs, indent=4))
         logging.info(f"Messages: {len(msgs)}")
         return msgs
         
-    def get_context(self): # TODO: Redo all of this method to be less stupid
+    def get_message_source_fields(self, msg):
+        """Everything format_message() reads from a message, used to tell if a cached formatted message is still correct"""
+        return (msg['role'], "name" in msg, msg.get("name"), msg['content'], msg.get("timestamp"), msg.get("location"), msg.get("type"))
+
+    def format_message(self, msg, player_name):
+        """Format a message to be sent to the LLM - Replaces [player] with the player name appropriate for the type of conversation"""
+        if msg['role'] == self.config.user_name: # if the message is from the player
+            formatted_msg = {
+                'role': self.config.user_name,
+                'name': msg['name'] if "name" in msg else player_name,
+            }
+            if formatted_msg["name"] == "[player]":
+                formatted_msg["name"] = player_name
+        elif msg['role'] == self.config.assistant_name: # if the message is from an NPC
+            if "name" not in msg: # support for role, content, and name messages
+                logging.warning(f"Message from NPC does not contain name(this might be fine, but might not be!):",msg)
+            formatted_msg = {
+                'role': self.config.assistant_name,
+                'name': msg['name'].replace("[player]", player_name) if "name" in msg else "",
+            }
+        else: # system messages, and support for just role and content messages - depreciated
+            formatted_msg = {
+                'role': msg['role'],
+            }
+        formatted_msg['content'] = msg['content'].replace("[player]", player_name)
+        for key in ["timestamp", "location", "type"]:
+            if key in msg:
+                formatted_msg[key] = msg[key]
+        return formatted_msg
+
+    def get_formatted_message(self, msg, perspective_player_name, multi_npc, formatted_messages):
+        """Get the formatted version of a message, only formatting it again if it's new or has changed since the last context was made - Formatted messages used are added to formatted_messages so the cache only ever holds the current context"""
+        if "id" in msg:
+            key = (msg["id"], perspective_player_name, multi_npc)
+        else: # memories and prompt messages made on the fly don't have ids, but the source fields are checked so a reused object id can't return the wrong message
+            key = (id(msg), perspective_player_name, multi_npc)
+        source_fields = self.get_message_source_fields(msg)
+        cached = self.formatted_messages.get(key)
+        if cached is None or cached[0] != source_fields:
+            cached = (source_fields, self.format_message(msg, self.player_name if multi_npc else perspective_player_name))
+        formatted_messages[key] = cached
+        return dict(cached[1]) # copied, some inference engines change the messages they're given
+
+    def get_context(self):
         """Get the correct set of messages to use with the LLM to generate the next response"""
         msgs = self.get_messages()
         formatted_messages = [] # format messages to be sent to LLM - Replace [player] with player name appropriate for the type of conversation
@@ -667,114 +714,16 @@ class base_LLM():
             perspective_player_name, _ = perspective_character.get_perspective_player_identity()
         else:
             perspective_player_name = self.player_name
-
-        for msg in msgs: # Add player name to messages based on the type of conversation
-            if msg['role'] == self.config.user_name: # if the message is from the player
-                if self.character_manager.active_character_count() > 1: # if multi NPC conversation use the player's actual name
-                    formatted_msg = {
-                        'role': self.config.user_name,
-                        'name': msg['name'] if "name" in msg else self.player_name,
-                        'content': msg['content'].replace("[player]", self.player_name),
-                    }
-                    if msg["name"] == "[player]":
-                        formatted_msg["name"] = self.player_name
-                    if "timestamp" in msg:
-                        formatted_msg["timestamp"] = msg["timestamp"]
-                    if "location" in msg:
-                        formatted_msg["location"] = msg["location"]
-                    if "type" in msg:
-                        formatted_msg["type"] = msg["type"]
-                else: # if single NPC conversation use the NPC's perspective player name
-                    formatted_msg = {
-                        'role': self.config.user_name,
-                        'name': msg['name'] if "name" in msg else perspective_player_name,
-                        'content': msg['content'].replace("[player]", perspective_player_name),
-                    }
-                    if "name" in msg and msg["name"] == "[player]":
-                        formatted_msg["name"] = perspective_player_name
-                    if "timestamp" in msg:
-                        formatted_msg["timestamp"] = msg["timestamp"]
-                    if "location" in msg:
-                        formatted_msg["location"] = msg["location"]
-                    if "type" in msg:
-                        formatted_msg["type"] = msg["type"]
-            elif msg['role'] == self.config.system_name: # if the message is from the system
-                    if self.character_manager.active_character_count() > 1: # if multi NPC conversation use the player's actual name
-                        formatted_msg = {
-                            'role': msg['role'],
-                            'content': msg['content'].replace("[player]", self.player_name),
-                        }
-                        if "timestamp" in msg:
-                            formatted_msg["timestamp"] = msg["timestamp"]
-                        if "location" in msg:
-                            formatted_msg["location"] = msg["location"]
-                        if "type" in msg:
-                            formatted_msg["type"] = msg["type"]
-                    else:
-                        formatted_msg = {
-                            'role': msg['role'],
-                            'content': msg['content'].replace("[player]", perspective_player_name),
-                        }
-                        if "timestamp" in msg:
-                            formatted_msg["timestamp"] = msg["timestamp"]
-                        if "location" in msg:
-                            formatted_msg["location"] = msg["location"]
-                        if "type" in msg:
-                            formatted_msg["type"] = msg["type"]
-            elif msg['role'] == self.config.assistant_name: # if the message is from an NPC
-                if self.character_manager.active_character_count() > 1: # if multi NPC conversation use the player's actual name
-                    if "name" not in msg: # support for role, content, and name messages
-                        logging.warning(f"Message from NPC does not contain name(this might be fine, but might not be!):",msg)
-                    formatted_msg = {
-                        'role': self.config.assistant_name,
-                        'name': msg['name'].replace("[player]", self.player_name) if "name" in msg else "",
-                        'content': msg['content'].replace("[player]", self.player_name),
-                    }
-                    if "timestamp" in msg:
-                        formatted_msg["timestamp"] = msg["timestamp"]
-                    if "location" in msg:
-                        formatted_msg["location"] = msg["location"]
-                    if "type" in msg:
-                        formatted_msg["type"] = msg["type"]
-                else: # if single NPC conversation use the NPC's perspective player name
-                    if "name" not in msg: # support for role, content, and name messages
-                        logging.warning(f"Message from NPC does not contain name(this might be fine, but might not be!):",msg)
-                    formatted_msg = {
-                        'role': self.config.assistant_name,
-                        'name': msg['name'].replace("[player]", perspective_player_name) if "name" in msg else "",
-                        'content': msg['content'].replace("[player]", perspective_player_name),
-                    }
-                    if "timestamp" in msg:
-                        formatted_msg["timestamp"] = msg["timestamp"]
-                    if "location" in msg:
-                        formatted_msg["location"] = msg["location"]
-                    if "type" in msg:
-                        formatted_msg["type"] = msg["type"]
-            else: # support for just role and content messages - depreciated
-                if self.character_manager.active_character_count() > 1: # if multi NPC conversation use the player's actual name
-                    formatted_msg = {
-                        'role': msg['role'],
-                        'content': msg['content'].replace("[player]", self.player_name),
-                    }
-                    if "timestamp" in msg:
-                        formatted_msg["timestamp"] = msg["timestamp"]
-                    if "location" in msg:
-                        formatted_msg["location"] = msg["location"]
-                    if "type" in msg:
-                        formatted_msg["type"] = msg["type"]
-                else: # if single NPC conversation use the NPC's perspective player name
-                    formatted_msg = {
-                        'role': msg['role'],
-                        'content': msg['content'].replace("[player]", perspective_player_name),
-                    }
-                    if "timestamp" in msg:
-                        formatted_msg["timestamp"] = msg["timestamp"]
-                    if "location" in msg:
-                        formatted_msg["location"] = msg["location"]
-                    if "type" in msg:
-                        formatted_msg["type"] = msg["type"]
-
-            formatted_messages.append(formatted_msg)
+        multi_npc = self.character_manager.active_character_count() > 1 # if multi NPC conversation use the player's actual name, otherwise use the NPC's perspective player name
+
+        dependencies = (tuple(self.character_manager.active_characters.keys()), perspective_player_name, self.player_name)
+        if dependencies != self.formatted_messages_dependencies: # someone joined or left, or the player is seen differently now, so every message needs formatting again
+            self.formatted_messages = {}
+            self.formatted_messages_dependencies = dependencies
+        used_formatted_messages = {}
+        for msg in msgs:
+            formatted_messages.append(self.get_formatted_message(msg, perspective_player_name, multi_npc, used_formatted_messages))
+        self.formatted_messages = used_formatted_messages
         if self.vision_enabled and self.append_system_image_near_end:
             base64_image, image, ascii_block = self.get_player_perspective()
             image_message_content = self.config.image_message.replace("{ocr}",ascii_block)
@@ -844,175 +793,49 @@ class base_LLM():
                 formatted_messages = formatted_messages[:depth] + [image_message] + formatted_messages[depth:] # Add the image message to the context
         return formatted_messages
     
+    def get_context_snapshot(self):
+        """Build the context for this generation through the conversation manager, so the token budget and logs see the same context as the LLM, and log it at debug level"""
+        snapshot = self.conversation_manager.get_context_snapshot()
+        snapshot.log("DEBUG")
+        return snapshot
+
     def generate_response(self, message_prefix="", force_speaker=None):
         """Generate response from LLM one text chunk at a time"""
         if self.cot_supported and self.cot_enabled and self.conversation_manager.thought_process is not None:
             print("Generating CoT response...")
-            raw_response = ""
-            response_json = {}
-            last_diff_json = {}
-            for chunk in self.acreate(self.get_context(), message_prefix=message_prefix, force_speaker=force_speaker):
+            json_parser = streaming_json.StreamingJSONParser() # parses only the new text of each chunk, so long thought processes stay linear in the response length
+            for chunk in self.acreate(self.get_context_snapshot().messages, message_prefix=message_prefix, force_speaker=force_speaker):
                 # logging.debug(f"Raw Chunk:",chunk)
                 formatted_chunk = self.format_content(chunk)
-                raw_response += formatted_chunk
-
-                special_characters = [
-                    "{",
-                    "}",
-                    "[",
-                    "]",
-                ]
-                raw_special_character_list = ""
-                for character in raw_response:
-                    if character in special_characters:
-                        raw_special_character_list += character
-                
-                reflection_characters = list(raw_special_character_list)
-                reflection_characters.reverse()
-                response_ending = ""
-                left_bracket_ignore = 0 
-                left_square_bracket_ignore = 0
-                for character in reflection_characters:
-                    if character == "{":
-                        if left_bracket_ignore > 0:
-                            left_bracket_ignore -= 1
-                        else:
-                            response_ending = response_ending + "}"
-                    elif character == "}":
-                        left_bracket_ignore += 1
-                    elif character == "[":
-                        if left_square_bracket_ignore > 0:
-                            left_square_bracket_ignore -= 1
-                        else:
-                            response_ending = response_ending + "]"
-                    elif character == "]":
-                        left_square_bracket_ignore += 1
-
-                diff_json = {}
-
-                def parse_list(new_json, orig_json):
-                    res_json = {}
-                    for i in range(len(new_json)):
-                        if type(new_json[i]) == list and len(new_json[i]) > 0:
-                            if i < len(orig_json):
-                                if new_json[i] != orig_json[i]:
-                                    # res_json.append(parse_list(new_json[i], orig_json[i]))
-                                    res_json[i] = parse_list(new_json[i], orig_json[i])
-                            else:
-                                # res_json.append(new_json[i])
-                                res_json[i] = new_json[i]
-                        elif type(new_json[i]) == dict:
-                            if i < len(orig_json):
-                                if new_json[i] != orig_json[i]:
-                                    # res_json.append(parse_dict(new_json[i], orig_json[i]))
-                                    res_json[i] = parse_dict(new_json[i], orig_json[i])
-                            else:
-                                # res_json.append(new_json[i])
-                                # res_json[i] = new_json[i]
-                                res_json[i] = {}
-                                for key in new_json[i]:
-                                    if key not in orig_json[i]:
-                                        res_json[i][key] = new_json[i][key]
-                        else:
-                            if i < len(orig_json):
-                                if type(new_json[i]) == str:
-                                    # res_json.append(new_json[i][len(orig_json[i]):])
-                                    # if res_json[-1] == "":
-                                    #     res_json.pop()
-                                    string_new = str(new_json[i])
-                                    string_orig = str(orig_json[i])
-                                    string_diff = string_new[len(string_orig):]
-                                    if string_diff != "":
-                                        res_json[i] = string_diff
-                                else:
-                                    string_new = str(new_json[i])
-                                    string_orig = str(orig_json[i])
-                                    string_diff = string_new[len(string_orig):]
-                                    # if string_diff != "":
-                                    #     res_json.append(type(orig_json[i])(string_diff))
-                                    # else:
-                                    #     res_json.append(orig_json[i])
-                                    if string_diff != "":
-                                        res_json[i] = type(orig_json[i])(string_diff)
-                            else:
-                                # res_json.append(new_json[i])
-                                res_json[i] = new_json[i]
-                    return res_json
-
-                def parse_dict(new_json, orig_json):
-                    # print("New JSON:",new_json)
-                    # print("Orig JSON:",orig_json)
-                    res_json = {}
-                    for key in new_json:
-                        if type(new_json[key]) == list and len(new_json[key]) > 0:
-                            if key in orig_json: # key in orig_json
-                                if new_json[key] != orig_json[key]:
-                                    res_json[key] = parse_list(new_json[key], orig_json[key])
-                            else: # key not in orig_json
-                                res_json[key] = new_json[key]
-                        elif type(new_json[key]) == dict: # key is a dictionary
-                            if key in orig_json: # key in orig_json
-                                if new_json[key] != orig_json[key]:
-                                    res_json[key] = parse_dict(new_json[key], orig_json[key])
-                            else: # key not in orig_json
-                                res_json[key] = {}
-                                for sub_key in new_json[key]:
-                                    if key not in orig_json:
-                                        res_json[key][sub_key] = new_json[key][sub_key]
-
-                        else:
-                            if key in orig_json: # key in orig_json
-                                if type(new_json[key]) == str: # key is a string 
-                                    res_json[key] = new_json[key][len(orig_json[key]):]
-                                    if res_json[key] == "":
-                                        del res_json[key]
-                                else: # key is a number
-                                    string_new = str(new_json[key])
-                                    string_orig = str(orig_json[key])
-                                    string_diff = string_new[len(string_orig):]
-                                    if string_diff != "":
-                                        res_json[key] = type(orig_json[key])(string_diff)
-                                    else:
-                                        del res_json[key]
-                            else: # key not in orig_json
-                                res_json[key] = new_json[key]
-                    return res_json
-
-                reference_response = str(raw_response).strip()
-
-                if reference_response.endswith(","):
-                    reference_response = reference_response[:-1]
-                try:
-                    new_response_json = json.loads(reference_response)
-                except:
-                    try:
-                        new_response_json = json.loads(reference_response+response_ending)
-                    except:
-                        try:
-                            new_response_json = json.loads(reference_response+"\""+response_ending)
-                        except:
-                            # logging.error(f"Could not parse JSON from response: {reference_response}")
-                            # logging.debug(f"Response Ending: {response_ending}")
-                            new_response_json = {}
-                
-                if new_response_json != response_json:
-                    diff_json = parse_dict(new_response_json, response_json)
-                # else:
-                #     logging.info("No new JSON found.")
-                response_json = new_response_json
-                        
-                if diff_json != {} and diff_json != last_diff_json:
-                    last_diff_json = diff_json
+                events = json_parser.feed(formatted_chunk)
+                diff_json = streaming_json.events_to_dict(events) # only the new content, e.g. {"response_to_user": " Hello"}
+                if diff_json != {}:
                     yield {
                         "chunk": diff_json,
-                        "complete_json": new_response_json,
+                        "events": events, # a new list every feed(), so the consumer can rebuild the full JSON with a JSONAccumulator without sharing the parser across threads
                     }
+            events = json_parser.finish()
+            diff_json = streaming_json.events_to_dict(events)
+            if diff_json != {}:
+                yield {
+                    "chunk": diff_json,
+                    "events": events,
+                }
         else:
             print("Generating normal response...")
-            for chunk in self.acreate(self.get_context(), message_prefix=message_prefix, force_speaker=force_speaker):
+            for chunk in self.acreate(self.get_context_snapshot().messages, message_prefix=message_prefix, force_speaker=force_speaker):
                 # logging.debug(f"Raw Chunk:",chunk)
                 yield chunk
         
+    async def stream_response(self, message_prefix="", force_speaker=None):
+        """Asynchronously stream the response from generate_response() - The blocking LLM stream is consumed in a producer thread so the event loop stays free for TTS and audio playback while tokens are arriving"""
+        if self.config.threaded_llm_streaming:
+            async for chunk in utils.stream_in_thread(self.generate_response, message_prefix=message_prefix, force_speaker=force_speaker):
+                yield chunk
+        else:
+            for chunk in self.generate_response(message_prefix=message_prefix, force_speaker=force_speaker):
+                yield chunk
+        
     def format_content(self, chunk):
         # TODO: This is a temporary fix. The LLM class should be returning a string only, but some inference engines don't currently. This will be fixed in the future.
         # logging.info(f"Formatting content type: {type(chunk)}")
@@ -1167,6 +990,10 @@ class base_LLM():
                 logging.info(f"Symbol to Insert: {symbol_insert}")
 
 
+        response_stream = None # used to store the asynchronous response stream so it can be closed if generation stops early
+        self.synthesis_pipeline = None # used to synthesize voicelines in the background while the response is still being generated
+        if self.config.tts_synthesis_queue_size > 0:
+            self.synthesis_pipeline = synthesis_pipeline.SynthesisPipeline(self.conversation_manager, sentence_queue, event)
         while retries >= 0: # keep trying to connect to the API until it works
             # if full_reply != '': # if the full reply is not empty, then the LLM has generated a response and the next_author should be extracted from the start of the generation
             #     self.conversation_manager.new_message({"role": next_author, "content": full_reply})
@@ -1233,15 +1060,16 @@ class base_LLM():
                 same_roleplay_symbol = self._prompt_style["roleplay_suffix"] == self._prompt_style["roleplay_prefix"] # used to determine if the roleplay symbol is the same for both the prefix and suffix
 
                 if self.cot_enabled and self.cot_supported and self.conversation_manager.thought_process is not None:
-                    full_json = {}
+                    json_accumulator = streaming_json.JSONAccumulator() # the full JSON of the chunks received so far, the parser itself stays on the producer's thread
                     
                 logging.debug(f"was_typing_roleplay: {was_typing_roleplay}")
                 logging.debug(f"currently_typing_roleplay: {typing_roleplay}")
                 logging.info(f"Starting response generation...")
-                for chunk in self.generate_response(message_prefix=symbol_insert, force_speaker=force_speaker):
+                response_stream = self.stream_response(message_prefix=symbol_insert, force_speaker=force_speaker)
+                async for chunk in response_stream:
                     if self.cot_enabled and self.cot_supported and self.conversation_manager.thought_process is not None:
                         if self.cot_enabled and self.cot_supported and self.conversation_manager.thought_process is not None:
-                            full_json = chunk["complete_json"]
+                            json_accumulator.add(chunk["events"])
                             chunk = chunk["chunk"]
                         if "response_to_user" not in chunk:
                             logging.info(f"Thought Chunk:",chunk)
@@ -1320,6 +1148,7 @@ class base_LLM():
                     if next_author is None: # if next_author is None after generating a chunk of content, then the LLM didn't choose a character to speak next yet.
                         proposed_next_author += content
                         if self.message_signifier in proposed_next_author: # if the proposed next author contains the message signifier, then the next author has been chosen
+                            await self.flush_voicelines() # the previous speaker's voicelines have to be sent before the active character can change
                             sentence, next_author, verified_author, retries, bad_author_retries, system_loop = self.check_author(proposed_next_author, next_author, verified_author, possible_players, retries, bad_author_retries, system_loop)
                             if next_author is not None:
                                 raw_reply = raw_reply.split(self.message_signifier, 1)[1]
@@ -1545,7 +1374,8 @@ class base_LLM():
                                 logging.info(f"Voice line: \"{voice_line}\" is definitely not empty.")
                                 self.conversation_manager.behavior_manager.pre_sentence_evaluate(self.conversation_manager.game_interface.active_character, sentence) # check if the sentence contains any behavior keywords for NPCs
                                 if use_narrator: # if the asterisk is open, then the narrator is speaking
-                                    time.sleep(self.config.narrator_delay)
+                                    await self.flush_voicelines()
+                                    await asyncio.sleep(self.config.narrator_delay)
                                     voice_lines.append((voice_line.strip(), "narrator"))
                                     voiceline_path = self.conversation_manager.synthesizer._say(voice_line.strip(), self.config.narrator_voice, self.config.narrator_volume)
                                     # audio_duration = await self.conversation_manager.game_interface.get_audio_duration(voiceline_path)
@@ -1595,7 +1425,10 @@ class base_LLM():
                             logging.info(f"Response generation complete. Stopping generation.")
                             break
 
+                await response_stream.aclose() # stop the LLM stream if generation was stopped early
+                response_stream = None
                 if self.cot_enabled and self.cot_supported and self.conversation_manager.thought_process is not None:
+                    full_json = json_accumulator.value() or {}
                     print(f"Full Thought Process:",json.dumps(full_json, indent=4))
 
                 # input("Press enter to continue...") # For pausing after attempt at generating a response
@@ -1610,6 +1443,9 @@ class base_LLM():
                         continue
                 break
             except Exception as e:
+                if response_stream is not None:
+                    await response_stream.aclose()
+                    response_stream = None
                 if force_speaker is not None:
                     next_author = force_speaker.name
                     proposed_next_author = next_author
@@ -1629,11 +1465,13 @@ class base_LLM():
                     logging.error(f"Could not connect to LLM API\nError:")
                     logging.error(e)
                     input('Press enter to continue...')
+                    self.cancel_voicelines()
                     raise e
                 logging.error(f"LLM API Error: {e}")
                 tb = traceback.format_exc()
                 logging.error(tb)
                 if not self.config.continue_on_llm_api_error:
+                    self.cancel_voicelines()
                     raise e
                 if 'Invalid author' in str(e):
                     logging.info(f"Retrying without saying error voice line")
@@ -1649,15 +1487,17 @@ class base_LLM():
                     continue
                 else:
                     # raise e # Enable this to stop the conversation if the LLM fails to generate a response so that the user can see the error
+                    await self.flush_voicelines()
                     await self.conversation_manager.game_interface.active_character.say("I can't find the right words at the moment.")
                     logging.info('Retrying connection to API...')
                     retries -= 1
-                    time.sleep(5)
+                    await asyncio.sleep(5)
 
         if voice_line_sentences > 0: # if the voice line is not empty, then generate the audio for the voice line
             logging.info(f"Generating voiceline: \"{voice_line.strip()}\" for {self.conversation_manager.game_interface.active_character.name}.")
             if typing_roleplay: # if the asterisk is open, then the narrator is speaking
-                time.sleep(self.config.narrator_delay)
+                await self.flush_voicelines()
+                await asyncio.sleep(self.config.narrator_delay)
                 voiceline_path = self.conversation_manager.synthesizer._say(voice_line.strip(), self.config.narrator_voice, self.config.narrator_volume)
                 voice_lines.append((voice_line.strip(), "narrator"))
                 # audio_duration = await self.conversation_manager.game_interface.get_audio_duration(voiceline_path)
@@ -1672,14 +1512,19 @@ class base_LLM():
         if len(sentence.strip()) > 0: # if the sentence is not empty, then have the character speak the sentence
             logging.info(f"Final sentence: {sentence}")
             if typing_roleplay: # if the asterisk is open, then the narrator is speaking
-                time.sleep(self.config.narrator_delay)
+                await self.flush_voicelines()
+                await asyncio.sleep(self.config.narrator_delay)
                 voiceline_path = self.conversation_manager.synthesizer._say(sentence.strip(), self.config.narrator_voice, self.config.narrator_volume)
                 voice_lines.append((sentence.strip(), "narrator"))
             else: # if the asterisk is closed, then the NPC is speaking
                 voice_lines.append((sentence.strip(), self.conversation_manager.game_interface.active_character.name))
+                await self.flush_voicelines()
                 await self.conversation_manager.game_interface.active_character.say(sentence)
             sentence = ''
 
+        if self.synthesis_pipeline is not None:
+            await self.synthesis_pipeline.close() # wait for the remaining voicelines to be synthesized and sent
+            self.synthesis_pipeline = None
         await sentence_queue.put(None) # Mark the end of the response for self.conversation_manager.game_interface.send_response() and self.conversation_manager.game_interface.send_response()
 
         raw_reply = raw_reply.strip()
@@ -1822,8 +1667,22 @@ class base_LLM():
             logging.info(f"Remaining Sentence: {sentence}")
         return sentence, next_author, verified_author, retries, bad_author_retries, system_loop
 
+    async def flush_voicelines(self):
+        """Wait for every voiceline in the synthesis pipeline to be sent to the game interface"""
+        if self.synthesis_pipeline is not None:
+            await self.synthesis_pipeline.flush()
+
+    def cancel_voicelines(self):
+        """Drop any voicelines still in the synthesis pipeline"""
+        if self.synthesis_pipeline is not None:
+            self.synthesis_pipeline.cancel()
+            self.synthesis_pipeline = None
+
     async def generate_voiceline(self, string, sentence_queue, event):
         """Generate audio for a voiceline"""
+        if self.synthesis_pipeline is not None: # synthesize in the background and let send_response() play it once every voiceline before it has been sent
+            await self.synthesis_pipeline.submit(string, self.conversation_manager.game_interface.active_character)
+            return
         # Generate the audio and return the audio file path
         try:
             audio_file = self.conversation_manager.synthesizer.synthesize(string, self.conversation_manager.game_interface.active_character)
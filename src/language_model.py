@@ -1,28 +1,14 @@
 print("Importing language_model.py")
 from src.logging import logging
 import src.tokenizer as tokenizers
-import os
-import importlib
+from src.plugin_registry import PluginRegistry
 logging.info("Imported required libraries in language_model.py")
 
-with open(os.path.join(os.path.dirname(__file__), "module_banlist"), "r") as f:
-    banned_modules = f.read().split("\n")
-
 default = "openai" # The default LLM to use if the one specified in config.json is not found or if default is specified in config.json
-LLM_Types = {}
-# Get all LLMs from src/inference_engines/ and add them to LLM_Types
-for file in os.listdir(os.path.join(os.path.dirname(__file__), "inference_engines/")):
-    if file.endswith(".py") and not file.startswith("__"):
-        module_name = file[:-3]
-        if module_name in banned_modules:
-            logging.warning(f"Skipping banned language model: {module_name}")
-            continue
-        logging.info(f"Importing {module_name} from src.inference_engines")
-        if module_name != "base_llm":
-            module = importlib.import_module(f"src.inference_engines.{module_name}")
-            LLM_Types[module.inference_engine_name] = module    
-LLM_Types["default"] = LLM_Types[default]
-logging.info("Imported all LLMs to LLM_Types, ready to create a LLM object!")
+# Find all LLMs in src/inference_engines/ - they're only imported once they're used, so unused inference engines don't pull in their dependencies
+LLM_Types = PluginRegistry("inference_engines", "inference_engine_name", "base_llm", "language model")
+LLM_Types.alias("default", default)
+logging.info("Found all LLMs for LLM_Types, ready to create a LLM object!")
 # print available LLMs
 logging.config(f"Available LLMs: {LLM_Types.keys()}")
 
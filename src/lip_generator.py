@@ -0,0 +1,97 @@
+print("Importing lip_generator.py")
+from src.logging import logging
+import os
+import importlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+logging.info("Imported required libraries in lip_generator.py")
+
+with open(os.path.join(os.path.dirname(__file__), "module_banlist"), "r") as f:
+    banned_modules = f.read().split("\n")
+
+default = "face_fx_wrapper" # The default lip generator to use if the one specified in config.json is not found or if default is specified in config.json
+fallback = "default_lip" # Used when the configured lip generator isn't installed, e.g. FaceFXWrapper without wine
+lip_generator_Types = {}
+# Get all lip generators from src/lip_generators/ and add them to lip_generator_Types
+for file in os.listdir(os.path.join(os.path.dirname(__file__), "lip_generators/")):
+    if file.endswith(".py") and not file.startswith("__"):
+        module_name = file[:-3]
+        if module_name in banned_modules:
+            logging.warning(f"Skipping banned lip generator: {module_name}")
+            continue
+        logging.info(f"Importing {module_name} from src.lip_generators")
+        if module_name != "base_lip_generator":
+            try:
+                module = importlib.import_module(f"src.lip_generators.{module_name}")
+                logging.info(f"Imported {module_name} from src.lip_generators")
+                lip_generator_Types[module.lip_generator_slug] = module
+            except Exception as e:
+                logging.error(f"Failed to import {module_name}: {e}")
+lip_generator_Types["default"] = lip_generator_Types[default]
+logging.config(f"Available lip generators: {lip_generator_Types.keys()}")
+
+def create_lip_generator(conversation_manager):
+    """Create the lip generator specified in config.json, falling back to the default lip file if it can't run on this system"""
+    slug = conversation_manager.config.lip_generator
+    if slug not in lip_generator_Types:
+        logging.error(f"Could not find lip generator '{slug}'! Please check your config.json file and try again!")
+        input("Press enter to continue...")
+        raise ValueError(f"Could not find lip generator '{slug}'! Please check your config.json file and try again!")
+    lip_generator = lip_generator_Types[slug].LipGenerator(conversation_manager)
+    if not lip_generator.is_installed() and lip_generator.lip_generator_slug != fallback:
+        logging.error(f"Lip generator '{lip_generator.lip_generator_slug}' is not installed, falling back to '{fallback}'")
+        lip_generator = lip_generator_Types[fallback].LipGenerator(conversation_manager)
+    logging.config(f"Using lip generator: {lip_generator.lip_generator_slug}")
+    return lip_generator
+
+class LipGenerationPool:
+    """Long lived pool of lip generation workers shared by every tts engine
+
+    synthesize() hands finished voicelines to the pool and can return straight away, so the next voiceline is synthesized while this one's lip file is generated.
+    Anything that sends a voiceline to the game has to wait for its lip file with wait() or future() first.
+    """
+    def __init__(self, conversation_manager):
+        self.config = conversation_manager.config
+        self.lip_generator = create_lip_generator(conversation_manager)
+        self.executor = ThreadPoolExecutor(max_workers=max(1, self.config.lip_generation_workers), thread_name_prefix="lip_generation")
+        self.pending = {} # final_voiceline_file -> Future of the job writing its lip file
+        self.lock = threading.Lock()
+
+    def submit(self, job, final_voiceline_file, *args, **kwargs):
+        """Run job(*args, **kwargs) on the pool as the lip generation job for final_voiceline_file"""
+        future = self.executor.submit(job, *args, **kwargs)
+        with self.lock:
+            self.pending[final_voiceline_file] = future
+        future.add_done_callback(lambda done_future: self._job_done(final_voiceline_file, done_future))
+        return future
+
+    def _job_done(self, final_voiceline_file, future):
+        with self.lock:
+            if self.pending.get(final_voiceline_file) is future:
+                del self.pending[final_voiceline_file]
+        if future.exception() is not None:
+            logging.error(f"Lip generation failed for {final_voiceline_file}: {future.exception()}")
+
+    def future(self, final_voiceline_file):
+        """Get the Future of the lip generation job for final_voiceline_file, or None if there isn't one running"""
+        with self.lock:
+            return self.pending.get(final_voiceline_file)
+
+    def wait(self, final_voiceline_file):
+        """Block until the lip file for final_voiceline_file has been written(or failed to be)"""
+        future = self.future(final_voiceline_file)
+        if future is not None:
+            try:
+                future.result()
+            except Exception:
+                pass # already logged by _job_done()
+
+_pools = {} # id(conversation_manager) -> LipGenerationPool
+_pools_lock = threading.Lock()
+
+def get_lip_generation_pool(conversation_manager):
+    """Get the lip generation pool shared by every tts engine created for this conversation manager"""
+    with _pools_lock:
+        if id(conversation_manager) not in _pools:
+            _pools[id(conversation_manager)] = LipGenerationPool(conversation_manager)
+        return _pools[id(conversation_manager)]
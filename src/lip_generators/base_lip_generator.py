@@ -0,0 +1,26 @@
+from src.logging import logging
+logging.info("Importing base_lip_generator.py")
+import os
+logging.info("Imported required libraries in base_lip_generator.py")
+
+lip_generator_slug = "base_lip_generator"
+class base_LipGenerator:
+    """Writes the .lip file next to a synthesized voiceline - Subclasses are loaded by src/lip_generator.py"""
+    def __init__(self, conversation_manager):
+        self.lip_generator_slug = lip_generator_slug
+        self.conversation_manager = conversation_manager
+        self.config = self.conversation_manager.config
+        self.game = self.config.game_id
+        self.installed = True # Lip generators should check whether they can run once here, not on every voiceline
+
+    def is_installed(self):
+        """Whether this lip generator can be used on this system - Set once when the lip generator is created"""
+        return self.installed
+
+    def lip_file(self, final_voiceline_file):
+        return final_voiceline_file.replace(".wav", ".lip")
+
+    def generate(self, voiceline, final_voiceline_file):
+        """Generate the .lip file for the voiceline at final_voiceline_file"""
+        logging.error(f"generate() not implemented in {self.lip_generator_slug}, please implement it in your lip generator!")
+        raise NotImplementedError
@@ -0,0 +1,25 @@
+from src.logging import logging
+logging.info("Importing default_lip.py")
+import src.utils as utils
+import src.lip_generators.base_lip_generator as base_lip_generator
+import os
+import shutil
+logging.info("Imported required libraries in default_lip.py")
+
+lip_generator_slug = "default_lip"
+class LipGenerator(base_lip_generator.base_LipGenerator):
+    """Copies data/default.lip next to every voiceline - Doesn't need wine or FaceFXWrapper, so it's used wherever FaceFXWrapper can't run"""
+    def __init__(self, conversation_manager):
+        super().__init__(conversation_manager)
+        self.lip_generator_slug = lip_generator_slug
+        if self.config.linux_mode:
+            self.default_lip_file = utils.resolve_path()+'/data/default.lip'
+        else:
+            self.default_lip_file = utils.resolve_path()+'\\data\\default.lip'
+        self.installed = os.path.isfile(self.default_lip_file)
+        if not self.installed:
+            logging.error(f'Could not find the default lip file at: {self.default_lip_file}')
+
+    def generate(self, voiceline, final_voiceline_file):
+        """Copy the default lip file next to the voiceline"""
+        shutil.copyfile(self.default_lip_file, self.lip_file(final_voiceline_file))
@@ -0,0 +1,77 @@
+from src.logging import logging
+logging.info("Importing face_fx_wrapper.py")
+import src.utils as utils
+import src.lip_generators.base_lip_generator as base_lip_generator
+import subprocess
+import shutil
+import os
+from pathlib import Path
+logging.info("Imported required libraries in face_fx_wrapper.py")
+
+lip_generator_slug = "face_fx_wrapper"
+class LipGenerator(base_lip_generator.base_LipGenerator):
+    """Generates lip files with FaceFXWrapper and FonixData.cdf(under wine on Linux)"""
+    def __init__(self, conversation_manager):
+        super().__init__(conversation_manager)
+        self.lip_generator_slug = lip_generator_slug
+        current_dir = utils.resolve_path() # get current directory
+        if self.config.linux_mode:
+            self.cdf_path = f'{current_dir}/FaceFXWrapper/FonixData.cdf'
+            self.face_wrapper_executable = f'{current_dir}/FaceFXWrapper/FaceFXWrapper.exe'
+        else:
+            self.cdf_path = f'{current_dir}\\FaceFXWrapper\\FonixData.cdf'
+            self.face_wrapper_executable = f'{current_dir}\\FaceFXWrapper\\FaceFXWrapper.exe'
+        self.face_wrapper_game = self.game.lower()
+        if self.face_wrapper_game == 'fallout4vr' or self.face_wrapper_game == 'fallout4':
+            self.face_wrapper_game = 'Fallout4'
+        if self.face_wrapper_game == 'skyrimvr' or self.face_wrapper_game == 'skyrim':
+            self.face_wrapper_game = 'Skyrim'
+        logging.info(f'FaceFXWrapper Detected Game: {self.face_wrapper_game}')
+        self.installed = self.check_face_fx_wrapper()
+
+    def check_face_fx_wrapper(self):
+        """Check if FaceFXWrapper is installed and FonixData.cdf exists in the same directory as the script."""
+        installed = True
+
+        logging.info(f'Checking if FonixData.cdf exists at: {self.cdf_path}')
+        if os.path.isfile(self.cdf_path):
+            logging.info(f'Found FonixData.cdf at: {self.cdf_path}')
+        else:
+            logging.error(f'Could not find FonixData.cdf in "{Path(self.cdf_path).parent}" required by FaceFXWrapper.')
+            installed = False
+        
+        logging.info(f'Checking if FaceFXWrapper.exe exists at: {self.face_wrapper_executable}')
+        if os.path.isfile(self.face_wrapper_executable):
+            logging.info(f'Found FaceFXWrapper.exe at: {self.face_wrapper_executable}')
+        else:
+            logging.error(f'Could not find FaceFXWrapper.exe in "{Path(self.face_wrapper_executable).parent}" with which to create a Lip Sync file, download it from: https://github.com/Haurrus/FaceFXWrapper/releases')
+            installed = False
+
+        if self.config.linux_mode and shutil.which("wine") is None:
+            logging.error('Could not find wine, which is required to run FaceFXWrapper on Linux.')
+            installed = False
+            
+        return installed
+
+    def run_command(self, command):
+        """Run a command without opening a console window"""
+        startupinfo = None
+        if hasattr(subprocess, "STARTUPINFO"): # Windows only
+            startupinfo = subprocess.STARTUPINFO()
+            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        sp = subprocess.Popen(command, startupinfo=startupinfo, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stdout, stderr = sp.communicate()
+        if sp.returncode != 0:
+            logging.error(f'FaceFXWrapper exited with code {sp.returncode}: {stderr.decode("utf-8", errors="replace")}')
+
+    def generate(self, voiceline, final_voiceline_file):
+        """Generate a lip file using FaceFXWrapper and FonixData.cdf"""
+        resampled_voiceline_file = final_voiceline_file.replace(".wav", "_r.wav")
+        command = [self.face_wrapper_executable, self.face_wrapper_game, "USEnglish", self.cdf_path, final_voiceline_file, resampled_voiceline_file, self.lip_file(final_voiceline_file), voiceline]
+        if self.config.linux_mode:
+            command = ["wine"] + command
+        logging.info(f'Running command: {command}')
+        self.run_command(command)
+        # remove file created by FaceFXWrapper
+        if os.path.exists(resampled_voiceline_file):
+            os.remove(resampled_voiceline_file)
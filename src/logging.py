@@ -1,6 +1,9 @@
 import time
-import inspect
+import sys
 import os
+import queue
+import atexit
+import threading
 
 bcolors = {
     "WARNING": '\033[93m',
@@ -12,165 +15,179 @@ bcolors = {
     "SUCCESS": '\033[92m',
 }
 
+log_levels = { # lower is more verbose, logs below the logger's log_level are dropped before any work is done on them
+    "DEBUG": 10,
+    "INFO": 20,
+    "CONFIG": 20,
+    "OUTPUT": 25,
+    "SUCCESS": 25,
+    "WARNING": 30,
+    "ERROR": 40,
+}
+
 class Logger:
-    def __init__(self, log_file = './logging.log', block_logs_from = []):
+    def __init__(self, log_file = './logging.log', block_logs_from = [], log_level = "DEBUG", block_log_types = []):
         print("Creating Logger")
         self.format = '{time} [{location}] [{level}] {message}'
         self.log_file = log_file
         self.block_logs_from = block_logs_from
-
-    def get_message_object(self, *args, level = 'INFO', filepath = None):
+        self.block_log_types = block_log_types
+        self.log_level = log_level
+        self.relpaths = {} # caller file path -> path relative to the working directory, os.path.relpath() is too slow to run on every log
+        self.queue = queue.Queue() # (level, filepath, line, timestamp, message) waiting to be printed and written by the writer thread
+        self.writer = None
+        self.writer_lock = threading.Lock()
+        self.output_lock = threading.Lock() # errors are written from the calling thread, everything else from the writer thread
+        self.file = None # buffered handle to the log file, only touched by the writer thread(or by flush() once the queue is empty)
+        self.file_path = None
+        atexit.register(self.flush)
+
+    @property
+    def log_level(self):
+        return self._log_level
+
+    @log_level.setter
+    def log_level(self, log_level):
+        log_level = str(log_level).upper()
+        if log_level not in log_levels:
+            print(f"Unknown log level '{log_level}', logging everything")
+            log_level = "DEBUG"
+        self._log_level = log_level
+        self.log_level_number = log_levels[log_level]
+
+    def is_enabled(self, level):
+        """Check if messages of a level would be logged, so expensive log messages can be skipped before they're built"""
+        level = level.upper()
+        return log_levels.get(level, 0) >= self.log_level_number and level not in self.block_log_types
+
+    def get_message_object(self, *args, level = 'INFO', filepath = None, timestamp = None):
         return {
-            'time': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime()),
+            'time': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp)),
             'level': level,
             'location': filepath,
             'message': ' '.join([str(arg) for arg in args])
         }
 
+    def get_location(self, frame):
+        """Get the (path relative to the working directory, line number) of a stack frame"""
+        filepath = frame.f_code.co_filename
+        relpath = self.relpaths.get(filepath)
+        if relpath is None:
+            try:
+                relpath = os.path.relpath(filepath)
+            except ValueError: # on a different drive than the working directory
+                relpath = filepath
+            self.relpaths[filepath] = relpath
+        return relpath, frame.f_lineno
+
+    def _log(self, level, args):
+        """Log a message from whoever called the public logging method - Called as self._log() from info(), error(), etc. so the caller is two frames up"""
+        if log_levels[level] < self.log_level_number or level in self.block_log_types:
+            return
+        filepath, line = self.get_location(sys._getframe(2))
+        if filepath in self.block_logs_from:
+            return
+        timestamp = time.time()
+        message = ' '.join([str(arg) for arg in args]) # arguments are turned into strings now, so objects changed after logging are logged as they were
+        if level == "ERROR": # errors are often followed by input(), so they're written straight away after everything logged before them
+            self.flush()
+            with self.output_lock:
+                self._output(self._format_message(level, filepath, line, timestamp, message), level)
+                self._flush_file()
+                sys.stdout.flush()
+            return
+        self._start_writer()
+        self.queue.put((level, filepath, line, timestamp, message))
+
+    def _format_message(self, level, filepath, line, timestamp, message):
+        return self.format.format(time=time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp)), level=level, location=filepath+":"+str(line), message=message)
+
+    def _start_writer(self):
+        if self.writer is not None:
+            return
+        with self.writer_lock:
+            if self.writer is None:
+                self.writer = threading.Thread(target=self._write_loop, name="log_writer", daemon=True)
+                self.writer.start()
+
+    def _write_loop(self):
+        """Format, print and write queued messages - The log file is only flushed once the queue is empty, so bursts of logs are written together"""
+        while True:
+            level, filepath, line, timestamp, message = self.queue.get()
+            try:
+                with self.output_lock:
+                    self._output(self._format_message(level, filepath, line, timestamp, message), level)
+                    if self.queue.empty():
+                        self._flush_file()
+                        sys.stdout.flush()
+            except Exception as e:
+                print(f'Error writing log message: {e}')
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        """Wait until every queued message has been printed and written to the log file"""
+        if self.writer is not None and threading.current_thread() is not self.writer:
+            self.queue.join()
+        with self.output_lock:
+            self._flush_file()
+
+    def _flush_file(self):
+        try:
+            if self.file is not None:
+                self.file.flush()
+        except Exception as e:
+            print(f'Error writing to log file: {e}')
+
     def _output(self, message: str, level: str):
         message = message.encode('utf-8', errors='replace').decode('utf-8')
-        try:
+        try: # one write per line, print() writes the line and the newline separately which lets lines from other threads end up in between
             if level in bcolors:
-                print(bcolors[level]+message+bcolors["ENDC"])
+                sys.stdout.write(bcolors[level]+message+bcolors["ENDC"]+"\n")
             else:
-                print(message)
+                sys.stdout.write(message+"\n")
         except UnicodeEncodeError:
             print('Error encoding message')
         try:
-            with open(self.log_file, 'a') as f:
-                remove_colors = message
+            if self.file is None or self.file_path != self.log_file: # log_file is changed by the config after the logger is created
+                if self.file is not None:
+                    self.file.close()
+                self.file = open(self.log_file, 'a', encoding='utf-8', errors='replace')
+                self.file_path = self.log_file
+            if '\033' in message:
                 for color in bcolors.values():
-                    remove_colors = remove_colors.replace(color, '')
-                f.write(remove_colors + '\n')
+                    message = message.replace(color, '')
+            self.file.write(message + '\n')
         except Exception as e:
             print(f'Error writing to log file: {e}')
             # raise e
 
     def info(self, *args):
-        # get the caller's stack frame and extract its file path
-        frame_info = inspect.stack()[1]
-        filepath = frame_info[1]  # in python 3.5+, you can use frame_info.filename
-        del frame_info  # drop the reference to the stack frame to avoid reference cycles
-
-        # make the path absolute (optional)
-        filepath = os.path.relpath(filepath)
-        if filepath in self.block_logs_from:
-            return
-        line = inspect.currentframe().f_back.f_lineno
-        message = self.get_message_object(*args, level='INFO', filepath=filepath+":"+str(line))
-        self._output(self.format.format(**message), 'INFO')
+        self._log('INFO', args)
 
     def output(self, *args):
-        # get the caller's stack frame and extract its file path
-        frame_info = inspect.stack()[1]
-        filepath = frame_info[1]  # in python 3.5+, you can use frame_info.filename
-        del frame_info  # drop the reference to the stack frame to avoid reference cycles
+        self._log('OUTPUT', args)
 
-        # make the path absolute (optional)
-        filepath = os.path.relpath(filepath)
-        if filepath in self.block_logs_from:
-            return
-        line = inspect.currentframe().f_back.f_lineno
-        message = self.get_message_object(*args, level='OUTPUT', filepath=filepath+":"+str(line))
-        self._output(self.format.format(**message), 'OUTPUT')
-        
     def config(self, *args):
-        # get the caller's stack frame and extract its file path
-        frame_info = inspect.stack()[1]
-        filepath = frame_info[1]  # in python 3.5+, you can use frame_info.filename
-        del frame_info  # drop the reference to the stack frame to avoid reference cycles
-
-        # make the path absolute (optional)
-        filepath = os.path.relpath(filepath)
-        if filepath in self.block_logs_from:
-            return
-        line = inspect.currentframe().f_back.f_lineno
-        message = self.get_message_object(*args, level='CONFIG', filepath=filepath+":"+str(line))
-        self._output(self.format.format(**message), 'CONFIG')
+        self._log('CONFIG', args)
 
     def error(self, *args):
-        # get the caller's stack frame and extract its file path
-        frame_info = inspect.stack()[1]
-        filepath = frame_info[1]  # in python 3.5+, you can use frame_info.filename
-        del frame_info  # drop the reference to the stack frame to avoid reference cycles
-
-        # make the path absolute (optional)
-        filepath = os.path.relpath(filepath)
-        if filepath in self.block_logs_from:
-            return
-        line = inspect.currentframe().f_back.f_lineno
-        message = self.get_message_object(*args, level='ERROR', filepath=filepath+":"+str(line))
         # message['message'] += '\n\nStack Trace:\n'+traceback.format_exc()
-        self._output(self.format.format(**message), 'ERROR')
+        self._log('ERROR', args)
 
     def warning(self, *args):
-        # get the caller's stack frame and extract its file path
-        frame_info = inspect.stack()[1]
-        filepath = frame_info[1]  # in python 3.5+, you can use frame_info.filename
-        del frame_info  # drop the reference to the stack frame to avoid reference cycles
-
-        # make the path absolute (optional)
-        filepath = os.path.relpath(filepath)
-        if filepath in self.block_logs_from:
-            return
-        line = inspect.currentframe().f_back.f_lineno
-        message = self.get_message_object(*args, level='WARNING', filepath=filepath+":"+str(line))
-        self._output(self.format.format(**message), 'WARNING')
+        self._log('WARNING', args)
 
     def debug(self, *args):
-        # get the caller's stack frame and extract its file path
-        frame_info = inspect.stack()[1]
-        filepath = frame_info[1]  # in python 3.5+, you can use frame_info.filename
-        del frame_info  # drop the reference to the stack frame to avoid reference cycles
-
-        # make the path absolute (optional)
-        filepath = os.path.relpath(filepath)
-        if filepath in self.block_logs_from:
-            return
-        line = inspect.currentframe().f_back.f_lineno
-        message = self.get_message_object(*args, level='DEBUG', filepath=filepath+":"+str(line))
-        self._output(self.format.format(**message), 'DEBUG')
+        self._log('DEBUG', args)
 
     def success(self, *args):
-        # get the caller's stack frame and extract its file path
-        frame_info = inspect.stack()[1]
-        filepath = frame_info[1]  # in python 3.5+, you can use frame_info.filename
-        del frame_info  # drop the reference to the stack frame to avoid reference cycles
-
-        # make the path absolute (optional)
-        filepath = os.path.relpath(filepath)
-        if filepath in self.block_logs_from:
-            return
-        line = inspect.currentframe().f_back.f_lineno
-        message = self.get_message_object(*args, level='SUCCESS', filepath=filepath+":"+str(line))
-        self._output(self.format.format(**message), 'SUCCESS')
+        self._log('SUCCESS', args)
 
     def warn(self, *args):
-        # get the caller's stack frame and extract its file path
-        frame_info = inspect.stack()[1]
-        filepath = frame_info[1]  # in python 3.5+, you can use frame_info.filename
-        del frame_info  # drop the reference to the stack frame to avoid reference cycles
+        self._log('WARNING', args)
 
-        # make the path absolute (optional)
-        filepath = os.path.relpath(filepath)
-        if filepath in self.block_logs_from:
-            return
-        line = inspect.currentframe().f_back.f_lineno
-        message = self.get_message_object(*args, level='WARNING', filepath=filepath+":"+str(line))
-        self._output(self.format.format(**message), 'WARNING')
-        
     def out(self, *args):
-        # get the caller's stack frame and extract its file path
-        frame_info = inspect.stack()[1]
-        filepath = frame_info[1]  # in python 3.5+, you can use frame_info.filename
-        del frame_info  # drop the reference to the stack frame to avoid reference cycles
-
-        # make the path absolute (optional)
-        filepath = os.path.relpath(filepath)
-        if filepath in self.block_logs_from:
-            return
-        line = inspect.currentframe().f_back.f_lineno
-        message = self.get_message_object(*args, level='OUTPUT', filepath=filepath+":"+str(line))
-        self._output(self.format.format(**message), 'OUTPUT')
+        self._log('OUTPUT', args)
 
-logging = Logger() # Create a logger object to be used throughout the program
\ No newline at end of file
+logging = Logger() # Create a logger object to be used throughout the program
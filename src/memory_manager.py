@@ -1,25 +1,11 @@
 print("Importing memory_manager.py")
 from src.logging import logging
-import os
-import importlib
+from src.plugin_registry import PluginRegistry
 logging.info("Imported required libraries in memory_manager.py")
 
-with open(os.path.join(os.path.dirname(__file__), "module_banlist"), "r") as f:
-    banned_modules = f.read().split("\n")
-
-Manager_Types = {}
-# Get all Managers from src/memory_managers/ and add them to Manager_Types
-for file in os.listdir(os.path.join(os.path.dirname(__file__), "memory_managers/")):
-    if file.endswith(".py") and not file.startswith("__"):
-        module_name = file[:-3]
-        if module_name in banned_modules:
-            logging.warning(f"Skipping banned memory manager: {module_name}")
-            continue
-        logging.info(f"Importing {module_name} from src.memory_managers")
-        if module_name != "base_memory_manager":
-            module = importlib.import_module(f"src.memory_managers.{module_name}")
-            Manager_Types[module.manager_slug] = module
-logging.info("Imported all memory managers to Manager_Types, ready to create a memory manager object!")
+# Find all Managers in src/memory_managers/ - they're only imported once they're used, so chromadb isn't loaded unless it's selected
+Manager_Types = PluginRegistry("memory_managers", "manager_slug", "base_memory_manager", "memory manager")
+logging.info("Found all memory managers for Manager_Types, ready to create a memory manager object!")
 # print available memory managers
 logging.config(f"Available memory managers: {Manager_Types.keys()}")
 
@@ -48,6 +48,10 @@ class base_MemoryManager():
         """Ran when the conversation limit is reached, or the conversation is ended - Some memory managers may need to perform some action when the conversation limit is reached"""
         logging.warning("reached_conversation_limit() method not implemented in your memory manager.")
     
+    def wait_for_memories(self):
+        """Wait for memories that are being retrieved in the background - Memory managers that update their memories synchronously don't need to do anything here"""
+        pass
+    
     def _add_message(self, message, token_count):
         """Add a message to the memory manager"""
         logging.warning("_add_message() method not implemented in your memory manager.")
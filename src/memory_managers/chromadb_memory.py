@@ -2,6 +2,9 @@ print("Loading chromadb_memory.py...")
 from src.logging import logging
 import os
 import json
+import bisect
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 try:
     logging.info("Importing chromadb...")
     import chromadb
@@ -10,17 +13,23 @@ try:
 except Exception as e:
     logging.error(f"Error importing chromadb: {e}")
 from src.memory_managers.base_memory_manager import base_MemoryManager
-from src.torchmoji.sentence_tokenizer import SentenceTokenizer
-from src.torchmoji.model_def import torchmoji_emojis, torch
+import src.emotion_model as emotion_model
 import numpy as np
 logging.info("Imported required libraries in chromadb_memory.py")
 
-def top_elements(array, k):
-    ind = np.argpartition(array, -k)[-k:]
-    return ind[np.argsort(array[ind])][::-1]
-
 manager_slug = "chromadb_memory"
 
+_memory_retrieval_executor = None # shared by every memory manager, since the characters are made again for every conversation and a pool per character would never be shut down
+_memory_retrieval_executor_lock = threading.Lock()
+
+def get_memory_retrieval_executor():
+    """Get the thread pool every memory manager retrieves memories on"""
+    global _memory_retrieval_executor
+    with _memory_retrieval_executor_lock:
+        if _memory_retrieval_executor is None:
+            _memory_retrieval_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory_retrieval") # a stale query still running for one character doesn't hold up the next one
+        return _memory_retrieval_executor
+
 class MemoryManager(base_MemoryManager):
     def __init__(self,conversation_manager):
         super().__init__(conversation_manager)
@@ -33,29 +42,20 @@ class MemoryManager(base_MemoryManager):
             os.makedirs(self.conversation_history_directory+"chromadb/")
         self.client = chromadb.PersistentClient(self.conversation_history_directory+"chromadb/",Settings(anonymized_telemetry=False))
         
-        logging.info("Loading TorchMoji...")
-        if self.config.linux_mode:
-            torchmoji_model_path = os.path.join(os.getcwd(), "data/models/torchmoji/pytorch_model.bin")
-            torchmoji_vocab_path = os.path.join(os.getcwd(), "data/models/torchmoji/vocabulary.json")
-            emoji_codes_path = os.path.join(os.getcwd(), "data/models/torchmoji/emoji_codes.json")
-        else:
-            torchmoji_model_path = os.path.join(os.getcwd(), "data\\models\\torchmoji\\pytorch_model.bin")
-            torchmoji_vocab_path = os.path.join(os.getcwd(), "data\\models\\torchmoji\\vocabulary.json")
-            emoji_codes_path = os.path.join(os.getcwd(), "data\\models\\torchmoji\\emoji_codes.json")
-        with open(torchmoji_vocab_path, 'r') as f:
-            vocabulary = json.load(f)
+        self.emotion_model = emotion_model.get_emotion_model(self.config) # TorchMoji is shared by every character and only loaded when the first message is scored
         
-        self.torchmoji_model = torchmoji_emojis(torchmoji_model_path)
-        self.torchmoji_tokenizer = SentenceTokenizer(vocabulary, self.config.torchmoji_max_length)
-        self.emoji_codes = []
-        with open(emoji_codes_path, 'r') as f:
-            self.emoji_codes = json.load(f)
-        logging.info("TorchMoji loaded.")
-        
-        logging.info(self.torchmoji_model)
         self.messages_memories = self.client.get_or_create_collection(name="messages")
         # self.memory_blocks = self.client.get_or_create_collection(name="memories")
-        self.current_memories = []
+        self.message_index = [] # every message in memory in chronological order, loaded once from ChromaDB and kept up to date by _add_message() and forget_last_message()
+        self.message_timestamps = [] # timestamps of self.message_index, used to insert out of order messages in the right place
+        self.message_positions = {} # message id -> position in self.message_index
+        self.message_index_lock = threading.RLock() # the index is read by the memory retrieval thread while new messages are added to it
+        self.load_message_index()
+        self.current_memories = [] # only ever replaced as a whole, so readers see either the old memories or the new ones
+        self.memory_retrieval_executor = get_memory_retrieval_executor() # newer queries replace older ones, see start_memory_retrieval()
+        self.memory_retrieval_future = None # Future of the running memory retrieval, if there is one
+        self.memory_retrieval_generation = 0 # incremented whenever a retrieval is started or cancelled, retrievals only publish their memories if they're still the newest one
+        self.memory_retrieval_lock = threading.Lock()
         self.logical_memories = ""
         self.emotional_memories = ""
         self.emotional_state = {}
@@ -89,43 +89,7 @@ class MemoryManager(base_MemoryManager):
         
     def predict(self, string, emoji_count=10):
         """Predict emojis from a string"""
-        if string.strip() == '':
-            # dotted face emoji
-            return {"🫥":1}
-
-        return_label = {}
-        # tokenize input text
-        tokenized, _, _ = self.torchmoji_tokenizer.tokenize_sentences([string])
-
-        if len(tokenized) == 0:
-            # dotted face emoji
-            return {"🫥":1}
-        
-        # print(tokenized,type(tokenized))
-
-        prob = self.torchmoji_model(tokenized)
-
-        for prob in [prob]:
-            # Find top emojis for each sentence. Emoji ids (0-63)
-            # correspond to the mapping in emoji_overview.png
-            # at the root of the torchMoji repo.
-            for i, t in enumerate([string]):
-                t_prob = prob[i]
-                # sort top
-                ind_top_ids = top_elements(t_prob, emoji_count)
-
-                for ind in ind_top_ids:
-                    # unicode emoji + :alias:
-                    label_name = self.emoji_codes[str(ind)]
-                    # propability
-                    label_prob = t_prob[ind]
-                    return_label[label_name] = label_prob
-
-        if len(return_label) == 0:
-            # dotted face emoji
-            return {"🫥":1}
-
-        return return_label
+        return self.emotion_model.predict(string, emoji_count)
 
     def before_step(self):
         """Perform a step in the memory manager - Some memory managers may need to perform some action every step"""
@@ -149,11 +113,60 @@ class MemoryManager(base_MemoryManager):
         """Update the memories stored in the memory manager - Some memory managers may need to update memories every step"""
         if len(self.conversation_manager.messages) == 0:
             return
-        self.current_memories = self.get_most_related_memories(self.query,self.config.logical_memories,self.config.chromadb_memory_messages_before,self.config.chromadb_memory_messages_after)
+        if self.config.chromadb_async_memory_retrieval:
+            self.start_memory_retrieval()
+        else:
+            self.current_memories = self.get_most_related_memories(self.query,self.config.logical_memories,self.config.chromadb_memory_messages_before,self.config.chromadb_memory_messages_after)
+
+    def start_memory_retrieval(self):
+        """Start retrieving memories for the current conversation in the background - The query is built now, so messages added while it runs don't change what's being looked up"""
+        query_string = self.query
+        with self.memory_retrieval_lock:
+            self.memory_retrieval_generation += 1
+            generation = self.memory_retrieval_generation
+            if self.memory_retrieval_future is not None:
+                self.memory_retrieval_future.cancel() # only stops it if it hasn't started yet, a running query finishes but its memories are thrown away
+            self.memory_retrieval_future = self.memory_retrieval_executor.submit(self._retrieve_memories, query_string, generation)
+        logging.info(f"Started memory retrieval for {self.name}")
+
+    def _retrieve_memories(self, query_string, generation):
+        """Run on the memory retrieval thread - Queries ChromaDB and publishes the memories if nothing newer was started or the retrieval wasn't cancelled in the meantime"""
+        try:
+            memories = self.get_most_related_memories(query_string,self.config.logical_memories,self.config.chromadb_memory_messages_before,self.config.chromadb_memory_messages_after)
+        except Exception as e:
+            logging.error(f"Memory retrieval failed for {self.name}, keeping the previous memories: {e}")
+            return
+        with self.memory_retrieval_lock:
+            if generation != self.memory_retrieval_generation:
+                logging.info(f"Discarding outdated memories for {self.name}")
+                return
+            self.current_memories = memories
+
+    def cancel_memory_retrieval(self):
+        """Cancel the running memory retrieval, if there is one - Its memories won't be published"""
+        with self.memory_retrieval_lock:
+            self.memory_retrieval_generation += 1
+            if self.memory_retrieval_future is not None:
+                self.memory_retrieval_future.cancel()
+                self.memory_retrieval_future = None
+
+    def wait_for_memories(self):
+        """Wait up to chromadb_memory_wait_timeout seconds for the running memory retrieval to finish - If it doesn't finish in time the previous memories are used and the new ones are picked up next step"""
+        with self.memory_retrieval_lock:
+            future = self.memory_retrieval_future
+        if future is None or future.done():
+            return
+        try:
+            future.result(timeout=self.config.chromadb_memory_wait_timeout)
+        except FutureTimeoutError:
+            logging.warning(f"Memory retrieval for {self.name} took longer than {self.config.chromadb_memory_wait_timeout} seconds, using the previous memories")
+        except Exception:
+            pass # cancelled, or failed and already logged by _retrieve_memories()
     
     def reached_conversation_limit(self):
         """Ran when the conversation limit is reached, or the conversation is ended - Some memory managers may need to perform some action when the conversation limit is reached"""
-        logging.info("Conversation limit reached, nothing to do in ChromaDB Memory Manager.")
+        self.cancel_memory_retrieval() # the conversation being retrieved for is over
+        logging.info("Conversation limit reached, cancelled any running memory retrieval in ChromaDB Memory Manager.")
     
     def _add_message(self, message, token_count):
         """Add a message to the memory manager - ChromaDB keeps a log of all messages in a SQLite db"""
@@ -178,6 +191,7 @@ class MemoryManager(base_MemoryManager):
             if self.config.empathy or message["role"] == self.name: # if empathy is enabled or the message is from the bot
                 self.emotional_state[emotion] += emotion_data[emotion]
         self.messages_memories.add(documents=[message["content"]], metadatas=[memory_metadata], ids=[message["id"]])
+        self.index_message(self.message_from_record(message["content"], memory_metadata, message["id"]))
         # test_memory = self.get_most_related_memories(message["content"],self.config.logical_memories,self.config.chromadb_memory_messages_before,self.config.chromadb_memory_messages_after)
         # logging.info(f"Most Related Memories:", json.dumps(test_memory, indent=2))
         logging.info(f"Added message to ChromaDB: {message}")
@@ -187,6 +201,7 @@ class MemoryManager(base_MemoryManager):
         if len(self.conversation_manager.messages) > 0:
             last_message = self.conversation_manager.messages[-1]
             self.messages_memories.delete(ids=[last_message["id"]])
+            self.unindex_message(last_message["id"])
             self.update_memories()
 
     @property
@@ -293,66 +308,89 @@ class MemoryManager(base_MemoryManager):
         # logging.info(f"Unique Memories:", json.dumps(unique_memories, indent=2)) # Disabled because it's too verbose
         return unique_memories
     
-    def get_all_messages(self):
-        """Get all messages in the memory of this character"""
+    def message_from_record(self, msg_doc, metadata, id):
+        """Build a message dictionary from a document and its metadata as stored in ChromaDB"""
+        emotions = {}
+        for emotion in self.emotion_composition:
+            if emotion in metadata:
+                emotions[emotion] = metadata[emotion]
+        msg = {
+            "role": metadata["role"],
+            "timestamp": metadata["timestamp"],
+            "location": metadata["location"],
+            "type": "memory", # "message" or "memory"
+            "content": msg_doc,
+            "emotions": emotions,
+            "id": id,
+            "conversation_id": metadata["conversation_id"],
+        }
+        if "name" in metadata:
+            msg["name"] = metadata["name"]
+        if "token_count" not in metadata:
+            metadata["token_count"] = self.conversation_manager.tokenizer.get_token_count_of_message(msg)
+        msg["token_count"] = metadata["token_count"]
+        return msg
+
+    def load_message_index(self):
+        """Load every message in memory from ChromaDB into the in-memory chronological index - Only needs to happen once per memory manager"""
         messages = self.messages_memories.get()
         # print("All Messages:",json.dumps(messages, indent=2)) # Disabled because it's too verbose
         msgs = []
         for i in range(len(messages["documents"])):
-            msg_doc = messages["documents"][i]
-            metadata = messages["metadatas"][i]
-            id = messages["ids"][i]
-            emotions = {}
-            for emotion in self.emotion_composition:
-                if emotion in metadata:
-                    emotions[emotion] = metadata[emotion]
-            msg = {
-                "role": metadata["role"],
-                "timestamp": metadata["timestamp"],
-                "location": metadata["location"],
-                "type": "memory", # "message" or "memory"
-                "content": msg_doc,
-                "emotions": emotions,
-                "id": id,
-                "conversation_id": metadata["conversation_id"],
-            }
-            if "name" in metadata:
-                msg["name"] = metadata["name"]
-            if "token_count" not in metadata:
-                metadata["token_count"] = self.conversation_manager.tokenizer.get_token_count_of_message(msg)
-            msg["token_count"] = metadata["token_count"]
-            msgs.append(msg)
-        return msgs
+            msgs.append(self.message_from_record(messages["documents"][i], messages["metadatas"][i], messages["ids"][i]))
+        self.message_index = sorted(msgs, key=lambda x: x["timestamp"]) # sorted() is stable, so messages with the same timestamp keep the order ChromaDB stored them in
+        self.message_timestamps = [msg["timestamp"] for msg in self.message_index]
+        self.message_positions = {msg["id"]: i for i, msg in enumerate(self.message_index)}
+        logging.info(f"Loaded {len(self.message_index)} messages into the message index of {self.name}")
+
+    def index_message(self, msg):
+        """Add a message to the message index - New messages are nearly always the newest, so this is usually just an append"""
+        with self.message_index_lock:
+            if msg["id"] in self.message_positions:
+                self.unindex_message(msg["id"])
+            position = bisect.bisect_right(self.message_timestamps, msg["timestamp"])
+            self.message_index.insert(position, msg)
+            self.message_timestamps.insert(position, msg["timestamp"])
+            for i in range(position, len(self.message_index)):
+                self.message_positions[self.message_index[i]["id"]] = i
+
+    def unindex_message(self, id):
+        """Remove a message from the message index - The forgotten message is nearly always the newest, so this is usually just a pop"""
+        with self.message_index_lock:
+            position = self.message_positions.pop(id, None)
+            if position is None:
+                return
+            del self.message_index[position]
+            del self.message_timestamps[position]
+            for i in range(position, len(self.message_index)):
+                self.message_positions[self.message_index[i]["id"]] = i
+
+    def get_all_messages(self):
+        """Get all messages in the memory of this character"""
+        with self.message_index_lock:
+            return [dict(msg) for msg in self.message_index] # copies, because callers like load_messages() modify the messages they get back
 
     def get_message_index(self, message):
         """Get the index of a message"""
-        messages = self.get_all_messages()
-        for i in range(len(messages)):
-            if messages[i]["id"] == message["id"]:
-                return i # Message found
-        return -1 # Message not found
+        return self.message_positions.get(message["id"], -1) # -1 if the message isn't found
 
     def get_around_message(self, message, messages_before=2, messages_after=2):
         """Get the messages around a message"""
         logging.info(f"Getting messages around message:", json.dumps(message, indent=2))
-        message_index = self.get_message_index(message)
-        messages = self.get_all_messages()
-        if message_index == -1:
-            logging.error("Message not found in memory, cannot get messages around it.")
-            return []
-        around_messages = []
-        for i in range(message_index-messages_before, message_index+messages_after+1):
-            if i >= 0 and i < len(messages):
-                around_messages.append(messages[i])
-        # sort by timestamp
-        around_messages = sorted(around_messages, key=lambda x: x["timestamp"])
+        with self.message_index_lock:
+            message_index = self.get_message_index(message)
+            if message_index == -1:
+                logging.error("Message not found in memory, cannot get messages around it.")
+                return []
+            around_messages = [dict(msg) for msg in self.message_index[max(0, message_index-messages_before):message_index+messages_after+1]] # already sorted by timestamp
         return around_messages
 
     @property
     def memories(self):
         """Return the current memories of the character"""
         mem_messages = []
-        if len(self.current_memories) == 0:
+        current_memories = self.current_memories # read once, a retrieval finishing now replaces the list instead of changing it
+        if len(current_memories) == 0:
             return mem_messages
         explanation_message = {
             "role": self.config.system_name,
@@ -362,7 +400,7 @@ class MemoryManager(base_MemoryManager):
         explanation_tokens = self.conversation_manager.tokenizer.get_token_count_of_message(explanation_message)
         explanation_message["token_count"] = explanation_tokens
         mem_messages.append(explanation_message)
-        for memory in self.current_memories:
+        for memory in current_memories:
             if memory["role"] != self.config.system_name:
                 mem_messages.append(memory)
         return mem_messages
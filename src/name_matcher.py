@@ -0,0 +1,54 @@
+print("Importing name_matcher.py")
+from src.logging import logging
+logging.info("Imported required libraries in name_matcher.py")
+
+class NameMatcher:
+    """Finds which of a large set of names are mentioned in a message in one pass over the message's words
+
+    Names are split into words the same way messages are, and indexed by their first word, so multi-word names like "Jarl Balgruuf" are matched as a sequence of words.
+    A name is matched if the words appear exactly as in the name, or in all lowercase.
+    """
+    def __init__(self, names, strip_characters=[]):
+        self.strip_table = str.maketrans('', '', "".join(strip_characters))
+        self.index = {} # first word -> [(words, name)] for every name starting with that word
+        self.name_count = 0
+        for name in names:
+            if name is None:
+                continue
+            name = str(name)
+            for variant in {name, name.lower()}:
+                words = self.split(variant)
+                if len(words) == 0:
+                    continue
+                self.index.setdefault(words[0], []).append((words, name))
+            self.name_count += 1
+        logging.info(f"Built name matcher for {self.name_count} names")
+
+    def split(self, text):
+        """Split text into words with the strip characters removed"""
+        words = []
+        for word in text.split():
+            word = word.translate(self.strip_table)
+            if word != "":
+                words.append(word)
+        return tuple(words)
+
+    def find(self, text, extra_names=[]):
+        """Return every name mentioned in text, in the order they're first mentioned - extra_names are matched as well without being added to the index"""
+        words = self.split(text)
+        extra_index = {}
+        for name in extra_names:
+            if name is None:
+                continue
+            name = str(name)
+            for variant in {name, name.lower()}:
+                name_words = self.split(variant)
+                if len(name_words) > 0:
+                    extra_index.setdefault(name_words[0], []).append((name_words, name))
+        found = {} # dicts keep insertion order, so this doubles as an ordered set
+        for position, word in enumerate(words):
+            for index in (self.index, extra_index):
+                for name_words, name in index.get(word, []):
+                    if name not in found and words[position:position+len(name_words)] == name_words:
+                        found[name] = True
+        return list(found.keys())
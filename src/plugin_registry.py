@@ -0,0 +1,114 @@
+print("Importing plugin_registry.py")
+from src.logging import logging
+import os
+import ast
+import time
+import importlib
+logging.info("Imported required libraries in plugin_registry.py")
+
+with open(os.path.join(os.path.dirname(__file__), "module_banlist"), "r") as f:
+    banned_modules = f.read().split("\n")
+
+registries = [] # every PluginRegistry that's been created, for startup_report()
+
+def read_slug(path, slug_variable):
+    """Get the value of a module level `slug_variable = "..."` assignment from a python file without running it, or None if there isn't one"""
+    with open(path, "r", encoding="utf-8") as f:
+        source = f.read()
+    if slug_variable not in source: # don't bother parsing modules that can't have the slug
+        return None
+    for node in ast.parse(source, filename=path).body:
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str):
+            for target in node.targets:
+                if isinstance(target, ast.Name) and target.id == slug_variable:
+                    return node.value.value
+    return None
+
+class PluginRegistry:
+    """Dictionary-like view of the plugins in one of the src/ plugin directories that only imports a plugin when it's used
+
+    The slug of every plugin is read from its source with ast, so listing the available plugins doesn't import torch, transformers etc. for engines that aren't selected in config.json.
+    registry[slug] imports the plugin the first time it's asked for and returns the module, the same as the dictionaries of imported modules this replaces.
+    """
+    def __init__(self, package, slug_variable, base_module, kind):
+        self.package = package # e.g. "tts_types"
+        self.slug_variable = slug_variable # e.g. "tts_slug"
+        self.kind = kind # e.g. "TTS", only used for logging
+        self.module_names = {} # slug -> module name in src.{package}
+        self.modules = {} # slug -> imported module
+        self.aliases = {} # alias -> slug, e.g. "default" -> "xvasynth"
+        self.import_times = {} # slug -> seconds it took to import
+        for file in os.listdir(os.path.join(os.path.dirname(__file__), f"{package}/")):
+            if file.endswith(".py") and not file.startswith("__"):
+                module_name = file[:-3]
+                if module_name in banned_modules:
+                    logging.warning(f"Skipping banned {kind}: {module_name}")
+                    continue
+                if module_name == base_module:
+                    continue
+                slug = read_slug(os.path.join(os.path.dirname(__file__), package, file), slug_variable)
+                if slug is None: # the slug isn't a plain string, so the only way to find it is to import the module
+                    logging.warning(f"Could not read {slug_variable} from src.{package}.{module_name} without importing it, importing it now")
+                    try:
+                        module = self._import(module_name)
+                    except Exception as e:
+                        logging.error(f"Failed to import {module_name}: {e}")
+                        continue
+                    slug = getattr(module, slug_variable)
+                    self.modules[slug] = module
+                self.module_names[slug] = module_name
+        registries.append(self)
+
+    def _import(self, module_name):
+        logging.info(f"Importing {module_name} from src.{self.package}")
+        start = time.time()
+        module = importlib.import_module(f"src.{self.package}.{module_name}")
+        self.import_times[module_name] = time.time() - start
+        logging.info(f"Imported {module_name} from src.{self.package} in {round(self.import_times[module_name], 3)} seconds")
+        return module
+
+    def alias(self, alias, slug):
+        """Make registry[alias] return the same plugin as registry[slug]"""
+        if slug not in self.module_names:
+            raise KeyError(slug)
+        self.aliases[alias] = slug
+
+    def __getitem__(self, slug):
+        slug = self.aliases.get(slug, slug)
+        if slug not in self.modules:
+            if slug not in self.module_names:
+                raise KeyError(slug)
+            try:
+                self.modules[slug] = self._import(self.module_names[slug])
+            except Exception as e:
+                logging.error(f"Failed to import {self.kind} '{slug}' from src.{self.package}.{self.module_names[slug]}: {e}")
+                raise e
+        return self.modules[slug]
+
+    def __contains__(self, slug):
+        return slug in self.module_names or slug in self.aliases
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def keys(self):
+        return list(self.module_names.keys()) + list(self.aliases.keys())
+
+    def get(self, slug, default=None):
+        if slug not in self:
+            return default
+        return self[slug]
+
+def startup_report():
+    """Log how long each plugin that's been imported so far took to import, slowest first"""
+    import_times = []
+    for registry in registries:
+        for module_name, seconds in registry.import_times.items():
+            import_times.append((seconds, f"src.{registry.package}.{module_name}"))
+    import_times.sort(reverse=True)
+    logging.config(f"Imported {len(import_times)} plugins in {round(sum(seconds for seconds, _ in import_times), 3)} seconds")
+    for seconds, module in import_times:
+        logging.config(f"  {round(seconds, 3):>8}s {module}")
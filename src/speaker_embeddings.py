@@ -0,0 +1,156 @@
+print("Importing speaker_embeddings.py")
+from src.logging import logging
+import os
+import json
+import threading
+from collections import OrderedDict
+import numpy as np
+logging.info("Imported required libraries in speaker_embeddings.py")
+
+_stores = {} # folder -> SpeakerEmbeddingStore, so engines created again by change_tts reuse the embeddings already in memory
+_stores_lock = threading.Lock()
+
+def get_speaker_embedding_store(tts_slug, folder, prepare, restore=None, max_size=64):
+    """Get the speaker embedding store saved in folder, or create it with the engine's prepare and restore functions"""
+    folder = os.path.abspath(folder)
+    with _stores_lock:
+        if folder not in _stores:
+            _stores[folder] = SpeakerEmbeddingStore(tts_slug, folder, prepare, restore, max_size)
+        else: # the engine was created again, use its functions since they're bound to the new engine
+            _stores[folder].prepare = prepare
+            _stores[folder].restore = restore
+        return _stores[folder]
+
+def encode_embedding(embedding):
+    """Turn a speaker embedding(a dict of numpy arrays, strings, numbers and json serializable values) into arrays np.savez can store without pickling"""
+    arrays = {}
+    for key, value in embedding.items():
+        if isinstance(value, np.ndarray):
+            arrays[key] = value
+        elif isinstance(value, (str, int, float, bool)):
+            arrays[key] = np.asarray(value)
+        else:
+            arrays["json:"+key] = np.asarray(json.dumps(value))
+    return arrays
+
+def decode_embedding(arrays):
+    """Undo encode_embedding()"""
+    embedding = {}
+    for key in arrays.files:
+        value = arrays[key]
+        if key.startswith("json:"):
+            embedding[key[5:]] = json.loads(value.item())
+        elif value.ndim == 0:
+            embedding[key] = value.item()
+        else:
+            embedding[key] = value
+    return embedding
+
+class SpeakerEmbeddingStore:
+    """Speaker embeddings(the prepared reference audio of each voice) for one tts engine, kept in memory and saved to disk as .npz files
+
+    The engine registers a prepare function that turns a voice sample into an embedding - a dict of numpy arrays, strings, numbers or json serializable values - and optionally a restore function that turns a saved embedding back into whatever the engine needs at synthesis time.
+    Embeddings are prepared the first time a voice is used(or by warm_up()), saved, and reused across runs until the voice sample, its tts_settings JSON or the extra signature given by the engine changes.
+    """
+    def __init__(self, tts_slug, folder, prepare, restore=None, max_size=64):
+        self.tts_slug = tts_slug
+        self.folder = folder
+        self.prepare = prepare # (voice_model, speaker_wav_path) -> embedding
+        self.restore = restore # (voice_model, embedding) -> what the engine uses to synthesize, the embedding itself if None
+        self.max_size = max(1, max_size)
+        self.entries = OrderedDict() # voice_model -> (signature, restored embedding), least recently used first
+        self.lock = threading.Lock()
+        self.voice_locks = {} # voice_model -> lock, so two lines for the same voice don't prepare it twice
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.folder, exist_ok=True)
+
+    def path(self, voice_model):
+        return os.path.join(self.folder, f"{voice_model}.npz")
+
+    def get_signature(self, speaker_wav_path, settings_path, extra=None):
+        """The voice sample's and tts_settings JSON's mtimes and sizes, and anything else the engine says the embedding depends on - As a JSON string so it can be saved alongside the embedding"""
+        def stat(path):
+            try:
+                stat = os.stat(path)
+                return [stat.st_mtime_ns, stat.st_size]
+            except (OSError, TypeError):
+                return None
+        return json.dumps([speaker_wav_path, stat(speaker_wav_path), stat(settings_path), extra])
+
+    def get(self, voice_model, speaker_wav_path, settings_path=None, extra=None):
+        """Get the embedding for a voice, preparing it if it isn't in memory or on disk for the current voice sample"""
+        signature = self.get_signature(speaker_wav_path, settings_path, extra)
+        with self.lock:
+            entry = self.entries.get(voice_model)
+            if entry is not None and entry[0] == signature:
+                self.entries.move_to_end(voice_model)
+                self.hits += 1
+                return entry[1]
+            voice_lock = self.voice_locks.setdefault(voice_model, threading.Lock())
+        with voice_lock:
+            with self.lock: # another thread might have prepared it while this one was waiting
+                entry = self.entries.get(voice_model)
+                if entry is not None and entry[0] == signature:
+                    self.hits += 1
+                    return entry[1]
+            embedding = self.load(voice_model, signature)
+            if embedding is None:
+                if speaker_wav_path is None:
+                    raise FileNotFoundError(f"{self.tts_slug} - No voice sample found for {voice_model}, can't prepare its speaker embedding")
+                logging.info(f"{self.tts_slug} - Preparing speaker embedding for {voice_model}")
+                embedding = self.prepare(voice_model, speaker_wav_path)
+                self.save(voice_model, signature, embedding)
+                with self.lock:
+                    self.misses += 1
+            else:
+                with self.lock:
+                    self.hits += 1
+            restored = self.restore(voice_model, embedding) if self.restore is not None else embedding
+            with self.lock:
+                self.entries[voice_model] = (signature, restored)
+                self.entries.move_to_end(voice_model)
+                while len(self.entries) > self.max_size:
+                    self.entries.popitem(last=False)
+            return restored
+
+    def load(self, voice_model, signature):
+        """Load a saved embedding, or None if there isn't one for this signature"""
+        path = self.path(voice_model)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as arrays:
+                if "__signature__" not in arrays.files or arrays["__signature__"].item() != signature:
+                    return None
+                embedding = decode_embedding(arrays)
+            del embedding["__signature__"]
+            return embedding
+        except Exception as e:
+            logging.warning(f"{self.tts_slug} - Could not load speaker embedding for {voice_model} from {path}, preparing it again: {e}")
+            return None
+
+    def save(self, voice_model, signature, embedding):
+        path = self.path(voice_model)
+        temp_path = path + ".tmp"
+        try:
+            arrays = encode_embedding(embedding)
+            arrays["__signature__"] = np.asarray(signature)
+            with open(temp_path, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(temp_path, path)
+        except Exception as e:
+            logging.warning(f"{self.tts_slug} - Could not save speaker embedding for {voice_model} to {path}: {e}")
+
+    def warm_up(self, voices, get_speaker_wav_path, get_settings_path, get_extra=None):
+        """Prepare the embeddings of every voice that doesn't have an up to date one yet - Returns (prepared or loaded, failed)"""
+        done = 0
+        failed = 0
+        for voice_model in voices:
+            try:
+                self.get(voice_model, get_speaker_wav_path(voice_model), get_settings_path(voice_model), get_extra(voice_model) if get_extra is not None else None)
+                done += 1
+            except Exception as e:
+                logging.warning(f"{self.tts_slug} - Could not prepare speaker embedding for {voice_model}: {e}")
+                failed += 1
+        return done, failed
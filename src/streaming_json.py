@@ -0,0 +1,326 @@
+print("Importing streaming_json.py")
+from src.logging import logging
+import json
+logging.info("Imported required libraries in streaming_json.py")
+
+WHITESPACE = " \t\n\r"
+LITERAL_CHARACTERS = "0123456789+-.eEtruefalsn"
+ESCAPES = {
+    '"': '"',
+    '\\': '\\',
+    '/': '/',
+    'b': '\b',
+    'f': '\f',
+    'n': '\n',
+    'r': '\r',
+    't': '\t',
+}
+
+class _PartialString:
+    """A JSON string that is still being streamed - Kept as a list of parts so appending to it doesn't copy the whole string every time"""
+    def __init__(self):
+        self.parts = []
+
+    def __str__(self):
+        return "".join(self.parts)
+
+class StreamingJSONParser:
+    """Resumable JSON parser that only looks at the text it hasn't seen before
+
+    feed() takes the next chunk of text from the LLM and returns the new content as (path, delta) events, where path is a tuple of object keys and array indices.
+    String values are reported as they stream in, one delta per feed() call, so a field like ("response_to_user",) can be spoken before the rest of the JSON has been generated.
+    Numbers, booleans and null are reported once they're complete. Parsing is lenient - characters that can't be part of the JSON are skipped rather than raising.
+    """
+    def __init__(self):
+        self.root = None
+        self.done = False # True once the root value has been closed, anything after it is ignored
+        self.stack = [] # open containers, each entry is [container, path, expecting, key] where expecting is one of "key", "colon", "value", "comma" and key is the object key currently being filled
+        self.in_string = False
+        self.string_is_key = False
+        self.string_value = None # _PartialString being written to when the string is a value
+        self.string_path = None
+        self.key_parts = [] # characters of the object key being read
+        self.escape = None # None when not in an escape sequence, otherwise the characters of the escape read so far(starting with the backslash)
+        self.high_surrogate = None
+        self.literal = "" # number/true/false/null being read
+        self.literal_path = None
+        self.events = []
+
+    def feed(self, text):
+        """Parse the next chunk of text and return the list of (path, delta) events it produced"""
+        self.events = []
+        index = 0
+        length = len(text)
+        while index < length and not self.done:
+            if self.in_string:
+                index = self._read_string(text, index)
+                continue
+            character = text[index]
+            index += 1
+            if self.literal != "":
+                if character in LITERAL_CHARACTERS:
+                    self.literal += character
+                    continue
+                self._end_literal()
+            if character in WHITESPACE:
+                continue
+            self._read_structure(character)
+        return self.events
+
+    def finish(self):
+        """Call once the stream has ended to complete a number/boolean/null that was still being read, and return the events it produced"""
+        self.events = []
+        if self.literal != "":
+            self._end_literal()
+        return self.events
+
+    def value(self):
+        """Return everything parsed so far as plain Python objects, with unfinished strings cut off where the stream currently is"""
+        return StreamingJSONParser._materialize(self.root)
+
+    @staticmethod
+    def _materialize(node):
+        if isinstance(node, _PartialString):
+            return str(node)
+        if isinstance(node, dict):
+            return {key: StreamingJSONParser._materialize(value) for key, value in node.items()}
+        if isinstance(node, list):
+            return [StreamingJSONParser._materialize(value) for value in node]
+        return node
+
+    def _emit(self, path, delta):
+        if len(self.events) > 0 and self.events[-1][0] == path and isinstance(delta, str) and isinstance(self.events[-1][1], str):
+            self.events[-1] = (path, self.events[-1][1] + delta)
+        else:
+            self.events.append((path, delta))
+
+    def _next_value_path(self):
+        """Work out where the value that's about to start belongs, or None if a value isn't expected here"""
+        if len(self.stack) == 0:
+            return () if self.root is None else None
+        container, path, expecting, key = self.stack[-1]
+        if expecting != "value":
+            return None
+        if isinstance(container, list):
+            return path + (len(container),)
+        return path + (key,)
+
+    def _store(self, value):
+        """Put a new value into the open container(or make it the root) and mark the container as waiting for a comma"""
+        if len(self.stack) == 0:
+            self.root = value
+            if not isinstance(value, (dict, list, _PartialString)):
+                self.done = True
+            return
+        container, _, _, key = self.stack[-1]
+        if isinstance(container, list):
+            container.append(value)
+        else:
+            container[key] = value
+        self.stack[-1][2] = "comma"
+
+    def _read_structure(self, character):
+        frame = self.stack[-1] if len(self.stack) > 0 else None
+        if character == '"':
+            if frame is not None and isinstance(frame[0], dict) and frame[2] == "key":
+                self.in_string = True
+                self.string_is_key = True
+                self.key_parts = []
+                return
+            path = self._next_value_path()
+            if path is None:
+                return
+            self.string_value = _PartialString()
+            self.string_path = path
+            self._store(self.string_value)
+            self.in_string = True
+            self.string_is_key = False
+            return
+        if character == '{' or character == '[':
+            path = self._next_value_path()
+            if path is None:
+                return
+            container = {} if character == '{' else []
+            self._store(container)
+            self.stack.append([container, path, "key" if character == '{' else "value", None])
+            return
+        if character == '}' or character == ']':
+            if frame is None or isinstance(frame[0], dict) != (character == '}'):
+                return
+            self.stack.pop()
+            if len(self.stack) == 0:
+                self.done = True
+            return
+        if frame is None:
+            if self.root is None and character in LITERAL_CHARACTERS:
+                self.literal = character
+                self.literal_path = ()
+            return
+        if character == ':':
+            if isinstance(frame[0], dict) and frame[2] == "colon":
+                frame[2] = "value"
+            return
+        if character == ',':
+            if frame[2] == "comma":
+                frame[2] = "key" if isinstance(frame[0], dict) else "value"
+            return
+        if character in LITERAL_CHARACTERS:
+            path = self._next_value_path()
+            if path is None:
+                return
+            self.literal = character
+            self.literal_path = path
+
+    def _end_literal(self):
+        literal = self.literal
+        self.literal = ""
+        try:
+            value = json.loads(literal)
+        except Exception:
+            logging.debug(f"Could not parse JSON literal: {literal}")
+            value = literal
+        self._store(value)
+        self._emit(self.literal_path, value)
+
+    def _read_string(self, text, index):
+        """Read string characters from text starting at index until the string ends or the text runs out, and return the new index"""
+        length = len(text)
+        run_start = index
+        while index < length:
+            character = text[index]
+            if self.escape is not None:
+                self._add_to_string(text[run_start:index])
+                self.escape += character
+                index += 1
+                run_start = index
+                self._read_escape()
+                continue
+            if character == '\\':
+                self._add_to_string(text[run_start:index])
+                self.escape = "\\"
+                index += 1
+                run_start = index
+                continue
+            if character == '"':
+                self._add_to_string(text[run_start:index])
+                self._end_string()
+                return index + 1
+            index += 1
+        self._add_to_string(text[run_start:index])
+        return index
+
+    def _read_escape(self):
+        if len(self.escape) == 2 and self.escape[1] != 'u':
+            self._add_to_string(ESCAPES.get(self.escape[1], self.escape[1]))
+            self.escape = None
+        elif len(self.escape) == 6: # \uXXXX
+            try:
+                code_point = int(self.escape[2:], 16)
+            except ValueError:
+                code_point = ord("?")
+            self.escape = None
+            if 0xD800 <= code_point <= 0xDBFF: # first half of a surrogate pair, wait for the second half
+                self.high_surrogate = code_point
+                return
+            if 0xDC00 <= code_point <= 0xDFFF and self.high_surrogate is not None:
+                code_point = 0x10000 + ((self.high_surrogate - 0xD800) << 10) + (code_point - 0xDC00)
+            self.high_surrogate = None
+            self._add_to_string(chr(code_point))
+
+    def _add_to_string(self, characters):
+        if characters == "":
+            return
+        if self.string_is_key:
+            self.key_parts.append(characters)
+        else:
+            self.string_value.parts.append(characters)
+            self._emit(self.string_path, characters)
+
+    def _end_string(self):
+        self.in_string = False
+        self.escape = None
+        self.high_surrogate = None
+        if self.string_is_key:
+            self.stack[-1][3] = "".join(self.key_parts)
+            self.stack[-1][2] = "colon"
+            return
+        if len(self.stack) > 0: # swap the partial string for a real one now that it's finished
+            container, _, _, key = self.stack[-1]
+            if isinstance(container, list):
+                container[-1] = str(self.string_value)
+            else:
+                container[key] = str(self.string_value)
+        else:
+            self.root = str(self.string_value)
+            self.done = True
+        self.string_value = None
+
+def events_to_dict(events):
+    """Nest (path, delta) events into a dictionary of only the new content, e.g. [(("response_to_user",), "Hello")] -> {"response_to_user": "Hello"}"""
+    result = {}
+    for path, delta in events:
+        if len(path) == 0:
+            continue
+        node = result
+        for key in path[:-1]:
+            if key not in node or not isinstance(node[key], dict):
+                node[key] = {}
+            node = node[key]
+        if path[-1] in node and isinstance(node[path[-1]], str) and isinstance(delta, str):
+            node[path[-1]] += delta
+        else:
+            node[path[-1]] = delta
+    return result
+
+class JSONAccumulator:
+    """Rebuilds the JSON from the (path, delta) events a StreamingJSONParser produced, so the consumer of a stream can get the complete JSON it has received so far without touching the parser, which is still being fed on the producer's thread
+
+    Strings are kept as lists of parts until value() is called, so adding events stays linear in the response length. Empty strings and containers don't produce events, so they're missing from value() until something is put in them.
+    """
+    def __init__(self):
+        self.root = None
+
+    def add(self, events):
+        for path, delta in events:
+            if len(path) == 0: # the root is a string or literal rather than a container
+                if isinstance(delta, str):
+                    if not isinstance(self.root, _PartialString): # a root string arrives as one delta per chunk
+                        self.root = _PartialString()
+                    self.root.parts.append(delta)
+                else:
+                    self.root = delta
+                continue
+            if self.root is None:
+                self.root = [] if isinstance(path[0], int) else {}
+            node = self.root
+            for index, key in enumerate(path[:-1]):
+                next_container = [] if isinstance(path[index+1], int) else {}
+                node = self._child(node, key, next_container)
+            key = path[-1]
+            if isinstance(delta, str):
+                string = self._child(node, key, _PartialString())
+                if isinstance(string, _PartialString):
+                    string.parts.append(delta)
+            else:
+                self._set(node, key, delta)
+
+    def _child(self, node, key, default):
+        if isinstance(node, list):
+            while len(node) <= key:
+                node.append(None)
+            if node[key] is None:
+                node[key] = default
+            return node[key]
+        if key not in node:
+            node[key] = default
+        return node[key]
+
+    def _set(self, node, key, value):
+        if isinstance(node, list):
+            while len(node) <= key:
+                node.append(None)
+        node[key] = value
+
+    def value(self):
+        """Return everything received so far as plain Python objects"""
+        return StreamingJSONParser._materialize(self.root)
@@ -0,0 +1,85 @@
+print("Importing synthesis_pipeline.py")
+from src.logging import logging
+import asyncio
+import traceback
+import functools
+logging.info("Imported required libraries in synthesis_pipeline.py")
+
+class SynthesisPipeline:
+    """Bounded, ordered TTS stage that sits between process_response() and send_response()
+
+    Voicelines are submitted as soon as process_response() finalizes them and are synthesized on the synthesizer's executor while the LLM keeps generating and earlier voicelines are still playing.
+    Finished voicelines are put on the sentence_queue as [audio_file, subtitle] in the order they were submitted, no matter which worker finishes first.
+    """
+    def __init__(self, conversation_manager, sentence_queue, event):
+        self.conversation_manager = conversation_manager
+        self.config = conversation_manager.config
+        self.synthesizer = conversation_manager.synthesizer
+        self.sentence_queue = sentence_queue
+        self.event = event
+        self.loop = asyncio.get_running_loop()
+        self.executor = self.synthesizer.get_synthesis_executor()
+        self.pending = asyncio.Queue() # (future, voiceline) pairs in the order they were submitted
+        self.capacity = asyncio.Semaphore(max(1, self.config.tts_synthesis_queue_size)) # limits how many voicelines can be waiting on synthesis or playback at once
+        self.error = None # the first exception raised by synthesize(), re-raised on the next submit() or flush()
+        self.sender = asyncio.ensure_future(self._send_in_order())
+
+    async def submit(self, voiceline, character):
+        """Queue a voiceline for synthesis, waiting if the pipeline is already full - The synthesizer can split it into parts that are synthesized and played one after another"""
+        self._raise_error()
+        for part in self.synthesizer.split_for_playback(voiceline, character): # e.g. the first phrase of a long xVASynth voiceline, so it can play while the rest is synthesized
+            await self.capacity.acquire()
+            future = self.loop.run_in_executor(self.executor, functools.partial(self.synthesizer.synthesize, part, character, wait_for_lip=False)) # the lip file is generated on the lip generation pool while the next voiceline is synthesized
+            await self.pending.put((future, part))
+
+    async def flush(self):
+        """Wait until every submitted voiceline has been handed to send_response() - Used before anything that has to happen after the queued voicelines, like changing speaker or the narrator speaking"""
+        await self.pending.join()
+        self._raise_error()
+
+    async def close(self):
+        """Flush the pipeline and stop the sender task"""
+        try:
+            await self.flush()
+        finally:
+            self.sender.cancel()
+            try:
+                await self.sender
+            except asyncio.CancelledError:
+                pass
+
+    def cancel(self):
+        """Stop the sender task without waiting for queued voicelines - Used when process_response() gives up on the response"""
+        self.sender.cancel()
+
+    def _raise_error(self):
+        if self.error is not None:
+            error = self.error
+            self.error = None
+            input('Press enter to continue...')
+            raise error
+
+    async def _send_in_order(self):
+        while True:
+            future, voiceline = await self.pending.get()
+            try:
+                try:
+                    audio_file = await future
+                    lip_future = self.synthesizer.lip_generation.future(audio_file)
+                    if lip_future is not None:
+                        try:
+                            await asyncio.wrap_future(lip_future) # the game needs the lip file before the voiceline is sent
+                        except Exception:
+                            pass # already logged by the lip generation pool, the game interface falls back to the default lip file
+                except Exception as e:
+                    logging.error(f"TTS Error: {e}")
+                    logging.error(traceback.format_exc())
+                    if self.error is None:
+                        self.error = e
+                    continue
+                await self.sentence_queue.put([audio_file, voiceline]) # Put the audio file path in the sentence_queue
+                self.event.clear() # clear the event for the next voiceline
+                await self.event.wait() # wait for send_response() to pick up this voiceline before sending the next one
+            finally:
+                self.capacity.release()
+                self.pending.task_done()
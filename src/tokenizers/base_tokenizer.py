@@ -1,10 +1,19 @@
 from src.logging import logging
+import threading
+from collections import OrderedDict
 tokenizer_slug = "base_tokenizer"
+NAME_PLACEHOLDER = "\x00name\x00" # stands in for the speaker's name in compiled message templates
 class base_Tokenizer(): # Tokenizes(only availble for counting the tokens in a string presently for local_models), and parses and formats messages for use with the language model
     def __init__(self, conversation_manager):
         self.conversation_manager = conversation_manager
         self.config = self.conversation_manager.config
         self.tokenizer_slug = tokenizer_slug # Fastest tokenizer for OpenAI models, change if you want to use a different tokenizer (use 'embedding' for compatibility with any model using the openai API)
+        self.message_token_counts = OrderedDict() # message id -> (role, name, content, formatted token count), least recently used first - Messages are counted once when they're added instead of every time the context is measured
+        self.message_token_counts_size = 4096
+        self.message_token_counts_lock = threading.Lock() # memory managers count messages from their own threads
+        self.reply_prefix_token_count = (None, 0) # (start of the assistant's reply, its token count)
+        self.message_templates = {} # (role, has name) -> (prefix, suffix) compiled from message_format
+        self.message_templates_version = None # config.prompt_style_version the templates were compiled for
         # Prommpt Parsing Stuff
         # self.BOS_token = self.config.BOS_token # Beginning of string token
         # self.EOS_token = self.config.EOS_token # End of string token
@@ -39,22 +48,62 @@ class base_Tokenizer(): # Tokenizes(only availble for counting the tokens in a s
 
     def new_message(self, content, role, name=None): # Parses a string into a message format with the name of the speaker
         """Parses a string into a message format with the name of the speaker"""
-        parsed_msg = self.start_message(role, name)
-        if type(content) == list:
+        if type(content) == str:
+            if content.strip() == "":
+                return ""
+            parsed_content = content
+        elif type(content) == list:
+            parsed_content = ""
             for item in content:
                 if item["type"] == "text":
-                    parsed_msg += item["text"]
+                    parsed_content += item["text"]
                 elif item["type"] == "image_url":
-                    parsed_msg += "[IMAGE_EMBEDDED_HERE]"
-        elif type(content) == str:
-            if content.strip() == "":
-                return ""
-            parsed_msg += content
-        parsed_msg += self.end_message(role, name)
-        return parsed_msg
+                    parsed_content += "[IMAGE_EMBEDDED_HERE]"
+        else:
+            parsed_content = ""
+        prefix, suffix = self.get_message_template(role, name)
+        if suffix is None:
+            suffix = self.compile_end_message(role, name) # raises the same error the template failed to compile with
+        if name:
+            return prefix.replace(NAME_PLACEHOLDER, name) + parsed_content + suffix.replace(NAME_PLACEHOLDER, name)
+        return prefix + parsed_content + suffix
 
     def start_message(self, role="", name=None): # Returns the start of a message with the name of the speaker
         """Returns the start of a message with the name of the speaker"""
+        prefix, _ = self.get_message_template(role, name)
+        if name:
+            return prefix.replace(NAME_PLACEHOLDER, name)
+        return prefix
+
+    def end_message(self, role="", name=None): # Returns the end of a message with the name of the speaker (Incase the message format chosen requires the name be on the end for some reason, but it's optional to include the name in the end message)
+        """Returns the end of a message with the name of the speaker (Incase the message format chosen requires the name be on the end for some reason, but it's optional to include the name in the end message)"""
+        _, suffix = self.get_message_template(role, name)
+        if suffix is None:
+            return self.compile_end_message(role, name) # raises the same error the template failed to compile with
+        if name:
+            return suffix.replace(NAME_PLACEHOLDER, name)
+        return suffix
+
+    def get_message_template(self, role, name):
+        """Returns the (prefix, suffix) around the content of a message from role, with NAME_PLACEHOLDER where the name goes - Compiled once per (role, has name) and recompiled when the prompt style changes"""
+        if self.message_templates_version != self.config.prompt_style_version:
+            self.message_templates = {}
+            self.message_templates_version = self.config.prompt_style_version
+            self.clear_token_count_cache() # cached token counts were made with the old message format
+        key = (role, bool(name))
+        template = self.message_templates.get(key)
+        if template is None:
+            template_name = NAME_PLACEHOLDER if name else None
+            try:
+                suffix = self.compile_end_message(role, template_name)
+            except IndexError: # some message formats can't end a message without a role, only starting one is supported for those
+                suffix = None
+            template = (self.compile_start_message(role, template_name), suffix)
+            self.message_templates[key] = template
+        return template
+
+    def compile_start_message(self, role="", name=None):
+        """Fill in the start of message_format for a role and name"""
         parsed_msg_part = self.message_format
         msg_sig = self.message_signifier
         if not name:
@@ -78,8 +127,8 @@ class base_Tokenizer(): # Tokenizes(only availble for counting the tokens in a s
         parsed_msg_part = parsed_msg_part.split("[content]")[0]
         return parsed_msg_part
 
-    def end_message(self, role="", name=None): # Returns the end of a message with the name of the speaker (Incase the message format chosen requires the name be on the end for some reason, but it's optional to include the name in the end message)
-        """Returns the end of a message with the name of the speaker (Incase the message format chosen requires the name be on the end for some reason, but it's optional to include the name in the end message)"""
+    def compile_end_message(self, role="", name=None):
+        """Fill in the end of message_format for a role and name"""
         parsed_msg_part = self.message_format
         msg_sig = self.message_signifier
         if not name:
@@ -104,7 +153,7 @@ class base_Tokenizer(): # Tokenizes(only availble for counting the tokens in a s
 
     def get_string_from_messages(self, messages): # Returns a formatted string from a list of messages
         """Returns a formatted string from a list of messages"""
-        context = ""
+        parsed_messages = []
         logging.info(f"Creating string from messages: {len(messages)}")
         for message in messages:
             # logging.info(f"Message:",message)
@@ -120,9 +169,8 @@ class base_Tokenizer(): # Tokenizes(only availble for counting the tokens in a s
                 name = message["name"]
             else:
                 name = None
-            msg_string = self.new_message(content, role, name)
-            context += msg_string
-        return context
+            parsed_messages.append(self.new_message(content, role, name))
+        return "".join(parsed_messages)
 
     def num_tokens_from_messages(self, messages): # Returns the number of tokens used by a list of messages
         """Returns the number of tokens used by a list of messages"""
@@ -130,11 +178,46 @@ class base_Tokenizer(): # Tokenizes(only availble for counting the tokens in a s
         context += self.start_message(self.config.assistant_name) # Simulate the assistant replying to add a little more to the token count to be safe (this is a bit of a hack, but it should work 99% of the time I think) TODO: Determine if needed
         return self.get_token_count(context)
     
+    def num_tokens_from_messages_cached(self, messages): # Returns the number of tokens used by a list of messages, using the token count of each message instead of tokenizing the whole context
+        """Returns the number of tokens used by a list of messages by adding up the token count of each formatted message - Only messages that haven't been counted before are tokenized, so this is cheap enough to run every step
+
+        Tokens can merge across the boundary between two messages, so this can be off by a token or so per message compared to num_tokens_from_messages(), which is fine for checking the context budget.
+        """
+        token_count = 0
+        for message in messages:
+            token_count += self.get_token_count_of_message(message)
+        reply_prefix = self.start_message(self.config.assistant_name) # Simulate the assistant replying, same as num_tokens_from_messages()
+        if self.reply_prefix_token_count[0] != reply_prefix:
+            self.reply_prefix_token_count = (reply_prefix, self.get_token_count(reply_prefix))
+        return token_count + self.reply_prefix_token_count[1]
+
     def get_token_count_of_message(self, message): # Returns the number of tokens in a message
-        """Returns the number of tokens in a message"""
+        """Returns the number of tokens in a message - Messages with an id are only tokenized again if their role, name or content changes"""
         if "name" not in message:
             message["name"] = None
-        return self.get_token_count(self.new_message(message["content"], message["role"], message["name"]))
+        if "id" not in message:
+            return self.get_token_count(self.new_message(message["content"], message["role"], message["name"]))
+        with self.message_token_counts_lock:
+            cached = self.message_token_counts.get(message["id"])
+            if cached is not None and cached[0] == message["role"] and cached[1] == message["name"] and cached[2] == message["content"]:
+                self.message_token_counts.move_to_end(message["id"])
+                return cached[3]
+        token_count = self.get_token_count(self.new_message(message["content"], message["role"], message["name"]))
+        content = message["content"]
+        if type(content) == list: # copy multimodal content so changes to the message are noticed
+            content = [dict(item) for item in content]
+        with self.message_token_counts_lock:
+            self.message_token_counts[message["id"]] = (message["role"], message["name"], content, token_count)
+            self.message_token_counts.move_to_end(message["id"])
+            while len(self.message_token_counts) > self.message_token_counts_size:
+                self.message_token_counts.popitem(last=False)
+        return token_count
+
+    def clear_token_count_cache(self):
+        """Forget every cached message token count - Needs to be called when the message format changes"""
+        with self.message_token_counts_lock:
+            self.message_token_counts.clear()
+        self.reply_prefix_token_count = (None, 0)
         
     def get_token_count(self, string):
         """Returns the number of tokens in a string"""
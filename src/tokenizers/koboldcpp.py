@@ -2,7 +2,7 @@ print("Importing koboldcpp.py...")
 from src.logging import logging
 import src.utils as utils
 import src.tokenizers.base_tokenizer as tokenizer
-import requests
+import src.http_client as http_client
 logging.info("Imported required libraries in koboldcpp.py")
 
 tokenizer_slug = "koboldcpp"
@@ -15,13 +15,14 @@ class Tokenizer(tokenizer.base_Tokenizer): # Gets token count from OpenAI's embe
             raise ValueError(f"koboldcpp tokenizer only works using OpenAI's API! Please check your config.json file and try again!")
         self.tokenizer_slug = tokenizer_slug
         self.client = client # Unnecessary for this tokenizer, but it's here for compatibility with other openai tokenizers
+        self.http = http_client.get_client("koboldcpp", self.config) # keep-alive connections to koboldcpp, token counts are requested often
         
     @utils.time_it
     def get_token_count(self, string):
         """Returns the number of tokens in the string"""
         url = self.config.alternative_openai_api_base.replace("/v1","") + "/extra/tokencount"
         data = {"prompt": string}
-        r = requests.post(url, json=data).json()
+        r = self.http.post(url, json=data).json()
         num_tokens = int(r["value"])
         return num_tokens
     
\ No newline at end of file
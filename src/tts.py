@@ -1,31 +1,13 @@
 print("Imported tts.py")
 from src.logging import logging
-import os
-import importlib
+from src.plugin_registry import PluginRegistry
 logging.info("Imported required libraries in tts.py")
 
-with open(os.path.join(os.path.dirname(__file__), "module_banlist"), "r") as f:
-    banned_modules = f.read().split("\n")
-
 default = "xvasynth" # The default TTS to use if the one specified in config.json is not found or if default is specified in config.json
-tts_Types = {}
-# Get all TTSes from src/ttses/ and add them to TTS_Types
-for file in os.listdir(os.path.join(os.path.dirname(__file__), "tts_types/")):
-    if file.endswith(".py") and not file.startswith("__"):
-        module_name = file[:-3]
-        if module_name in banned_modules:
-            logging.warning(f"Skipping banned TTS: {module_name}")
-            continue
-        logging.info(f"Importing {module_name} from src.tts_types")
-        if module_name != "base_tts":
-            try:
-                module = importlib.import_module(f"src.tts_types.{module_name}")
-                logging.info(f"Imported {module_name} from src.tts_types")
-                tts_Types[module.tts_slug] = module
-            except Exception as e:
-                logging.error(f"Failed to import {module_name}: {e}")
-tts_Types["default"] = tts_Types[default]
-logging.info("Imported TTS types in tts.py")
+# Find all TTSes in src/tts_types/ - they're only imported once they're used, so unused engines don't pull in their dependencies
+tts_Types = PluginRegistry("tts_types", "tts_slug", "base_tts", "TTS")
+tts_Types.alias("default", default)
+logging.info("Found TTS types in tts.py")
 # print available TTS types
 logging.config(f"Available TTS types: {tts_Types.keys()}")
 
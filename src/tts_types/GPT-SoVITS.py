@@ -27,6 +27,8 @@ try:
     import re
     import chinese
     import soundfile as sf
+    import threading
+    from collections import OrderedDict
     logging.info("Imported GPT-SoVITS libraries")
 except Exception as e:
     logging.error(f"Failed to import GPT-SoVITS: {e}")
@@ -224,11 +226,82 @@ def cut5(inp):
 
 logging.info("Imported required libraries in GPT-SoVITS.py")
 
+class ConditioningCache:
+    """LRU cache of the reference side of GPT-SoVITS synthesis for each voice model(prompt semantic tokens, reference phones and BERT features, reference spectrograms)
+
+    None of it depends on the line being spoken, so it's worked out once per voice instead of for every voiceline(and every sentence chunk of it).
+    Each entry is stored with a signature made from the reference wavs' and tts_settings JSON's mtimes and the settings that change the result, so editing a voice's files makes it get worked out again.
+    If a folder is given, entries are also saved there as .pt files so they survive restarts.
+    """
+    def __init__(self, max_size, folder=None):
+        self.max_size = max(1, max_size)
+        self.folder = folder
+        self.entries = OrderedDict() # voice model -> (signature, conditioning), least recently used first
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if self.folder is not None:
+            os.makedirs(self.folder, exist_ok=True)
+
+    def path(self, voice_model):
+        return os.path.join(self.folder, f"{voice_model}.pt")
+
+    def get(self, voice_model, signature, device):
+        """Get the cached conditioning for a voice model, or None if there isn't one for this signature"""
+        with self.lock:
+            entry = self.entries.get(voice_model)
+            if entry is not None and entry[0] == signature:
+                self.entries.move_to_end(voice_model)
+                self.hits += 1
+                return entry[1]
+        if self.folder is not None and os.path.exists(self.path(voice_model)):
+            try:
+                saved = torch.load(self.path(voice_model), map_location="cpu")
+                if saved["signature"] == signature:
+                    conditioning = {key: self._to(value, device) for key, value in saved["conditioning"].items()}
+                    self._remember(voice_model, signature, conditioning)
+                    with self.lock:
+                        self.hits += 1
+                    logging.info(f"GPT-SoVITS - Loaded conditioning for {voice_model} from {self.path(voice_model)}")
+                    return conditioning
+            except Exception as e:
+                logging.warning(f"GPT-SoVITS - Could not load conditioning for {voice_model} from {self.path(voice_model)}, working it out again: {e}")
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, voice_model, signature, conditioning):
+        """Cache the conditioning for a voice model, and save it to disk if there's a folder"""
+        self._remember(voice_model, signature, conditioning)
+        if self.folder is not None:
+            try:
+                temp_path = self.path(voice_model) + ".tmp"
+                torch.save({"signature": signature, "conditioning": {key: self._to(value, "cpu") for key, value in conditioning.items()}}, temp_path)
+                os.replace(temp_path, self.path(voice_model))
+            except Exception as e:
+                logging.warning(f"GPT-SoVITS - Could not save conditioning for {voice_model} to {self.path(voice_model)}: {e}")
+
+    def _remember(self, voice_model, signature, conditioning):
+        with self.lock:
+            self.entries[voice_model] = (signature, conditioning)
+            self.entries.move_to_end(voice_model)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def _to(self, value, device):
+        """Move the tensors in a conditioning value to a device"""
+        if isinstance(value, torch.Tensor):
+            return value.to(device)
+        if isinstance(value, list):
+            return [self._to(item, device) for item in value]
+        return value
+
 tts_slug = "GPT-SoVITS"
 class Synthesizer(base_tts.base_Synthesizer):
     def __init__(self, conversation_manager, ttses = []):
         super().__init__(conversation_manager)
         self.tts_slug = tts_slug
+        self.voiceline_cache_config_keys = ["gpt_sovits_version", "gpt_sovits_cut_type", "gpt_sovits_temperature", "gpt_sovits_top_k", "gpt_sovits_top_p", "gpt_sovits_prompt_language", "gpt_sovits_text_language"] # part of the voiceline cache key, see voiceline_cache_settings()
         logging.info(f"Initializing {self.tts_slug}...")
         self.torch_dtype=torch.float16 if self.config.gpt_sovits_is_half == True else torch.float32
         self.np_dtype=np.float16 if self.config.gpt_sovits_is_half == True else np.float32
@@ -296,6 +369,11 @@ class Synthesizer(base_tts.base_Synthesizer):
         self.max_sec = 10
         self.cache = {}
 
+        conditioning_folder = None
+        if self.config.gpt_sovits_conditioning_cache_to_disk:
+            conditioning_folder = os.path.abspath(os.path.join(".", "data", "tts_conditioning", self.tts_slug))
+        self.conditioning_cache = ConditioningCache(self.config.gpt_sovits_conditioning_cache_size, conditioning_folder)
+
         self.gpt_sovits_sovits_path = sovits_base_dir_path+"s2G488k.pth"
         self.gpt_sovits_gpt_path = sovits_base_dir_path+"s1bert25hz-2kh-longer-epoch=68e-step=50232.ckpt"
 
@@ -310,12 +388,7 @@ class Synthesizer(base_tts.base_Synthesizer):
 
     def voices(self):
         """Return a list of available voices"""
-        voices = []
-        for speaker_wavs_folder in self.speaker_wavs_folders:
-            for speaker_wav_file in os.listdir(speaker_wavs_folder):
-                speaker = speaker_wav_file.split(".")[0]
-                if speaker_wav_file.endswith(".wav") and speaker not in voices:
-                    voices.append(speaker)
+        voices = self.get_speaker_wav_voices() # only lists the speaker wav folders again when they've changed
         for banned_voice in self.config.gpt_sovits_banned_voice_models:
             if banned_voice in voices:
                 voices.remove(banned_voice)
@@ -507,33 +580,47 @@ class Synthesizer(base_tts.base_Synthesizer):
         # with open("./weight.json","w")as f:
         #     f.write(json.dumps(data))
 
-    def get_tts_wav(self, ref_wav_path, prompt_text, text, ref_free=False, speed=1, if_freeze=False, inp_refs=None):
-        # if ref_wav_path:
-        #     pass
-        # else:
-        #     gr.Warning('Please Upload the Reference Audio')
-        # if text:
-        #     pass
-        # else:
-        #     gr.Warning('Please Fill in the Terget Text')
-        t = []
-        if prompt_text is None or len(prompt_text) == 0:
-            ref_free = True
-        t0 = time.time()
-
-        if not ref_free:
-            prompt_text = prompt_text.strip("\n")
-            if (prompt_text[-1] not in splits): prompt_text += "。" if self.config.gpt_sovits_prompt_language != "en" else "."
-            print("Actual Input Reference Text:", prompt_text)
-        text = text.strip("\n")
-        # if (text[0] not in splits and len(get_first(text)) < 4): text = "。" + text if text_language != "en" else "." + text
-        
-        print("Actual Input Target Text:", text)
-        zero_wav = np.zeros(
-            int(self.hps.data.sampling_rate * 0.3),
-            dtype=self.np_dtype
+    def get_conditioning_signature(self, voice_model, ref_wav_path, prompt_text, ref_free, inp_refs):
+        """Everything the conditioning of a voice model depends on - The reference wavs' and tts_settings JSON's mtimes, the reference transcription and the settings that change how they're processed"""
+        def mtime(path):
+            try:
+                return os.stat(path).st_mtime_ns
+            except (OSError, TypeError):
+                return None
+        return (
+            ref_wav_path,
+            mtime(ref_wav_path),
+            tuple((path, mtime(path)) for path in (inp_refs or [])),
+            mtime(self.voice_model_settings_path(voice_model)),
+            prompt_text,
+            ref_free,
+            self.config.gpt_sovits_prompt_language,
+            self.config.gpt_sovits_version,
+            self.config.gpt_sovits_is_half,
+            self.gpt_sovits_sovits_path,
+            int(self.hps.data.sampling_rate),
         )
+
+    def get_conditioning(self, voice_model, ref_wav_path, prompt_text, ref_free=False, inp_refs=None):
+        """Get the reference side of synthesis for a voice - Returns a dict of the prompt semantic tokens, reference phones and BERT features(None when ref_free) and the reference spectrograms"""
+        signature = None
+        if voice_model is not None:
+            signature = self.get_conditioning_signature(voice_model, ref_wav_path, prompt_text, ref_free, inp_refs)
+            conditioning = self.conditioning_cache.get(voice_model, signature, self.config.gpt_sovits_device)
+            if conditioning is not None:
+                return conditioning
+            logging.info(f"{self.tts_slug} - Working out the conditioning for {voice_model}")
+        conditioning = {
+            "prompt": None,
+            "phones": None,
+            "bert": None,
+            "refers": [],
+        }
         if not ref_free:
+            zero_wav = np.zeros(
+                int(self.hps.data.sampling_rate * 0.3),
+                dtype=self.np_dtype
+            )
             with torch.no_grad():
                 wav16k, sr = librosa.load(ref_wav_path, sr=16000)
                 if (wav16k.shape[0] > 160000 or wav16k.shape[0] < 48000):
@@ -558,7 +645,49 @@ class Synthesizer(base_tts.base_Synthesizer):
                 )  # .float()
                 codes = self.vq_model.extract_latent(ssl_content)
                 prompt_semantic = codes[0, 0]
-                prompt = prompt_semantic.unsqueeze(0).to(self.config.gpt_sovits_device)
+                conditioning["prompt"] = prompt_semantic.unsqueeze(0).to(self.config.gpt_sovits_device)
+            conditioning["phones"], conditioning["bert"], _ = self.get_phones_and_bert(prompt_text)
+        if(inp_refs):
+            for path in inp_refs:
+                try:
+                    refer = self.get_spepc(path).to(self.torch_dtype).to(self.config.gpt_sovits_device)
+                    conditioning["refers"].append(refer)
+                except:
+                    traceback.print_exc()
+        if(len(conditioning["refers"])==0):
+            conditioning["refers"] = [self.get_spepc(ref_wav_path).to(self.torch_dtype).to(self.config.gpt_sovits_device)]
+        if voice_model is not None:
+            self.conditioning_cache.put(voice_model, signature, conditioning)
+        return conditioning
+
+    def get_tts_wav(self, ref_wav_path, prompt_text, text, ref_free=False, speed=1, if_freeze=False, inp_refs=None, voice_model=None):
+        # if ref_wav_path:
+        #     pass
+        # else:
+        #     gr.Warning('Please Upload the Reference Audio')
+        # if text:
+        #     pass
+        # else:
+        #     gr.Warning('Please Fill in the Terget Text')
+        t = []
+        if prompt_text is None or len(prompt_text) == 0:
+            ref_free = True
+        t0 = time.time()
+
+        if not ref_free:
+            prompt_text = prompt_text.strip("\n")
+            if (prompt_text[-1] not in splits): prompt_text += "。" if self.config.gpt_sovits_prompt_language != "en" else "."
+            print("Actual Input Reference Text:", prompt_text)
+        text = text.strip("\n")
+        # if (text[0] not in splits and len(get_first(text)) < 4): text = "。" + text if text_language != "en" else "." + text
+        
+        print("Actual Input Target Text:", text)
+        zero_wav = np.zeros(
+            int(self.hps.data.sampling_rate * 0.3),
+            dtype=self.np_dtype
+        )
+        conditioning = self.get_conditioning(voice_model, ref_wav_path, prompt_text, ref_free, inp_refs) # cached per voice model, see ConditioningCache
+        prompt = conditioning["prompt"]
 
         t1 = time.time()
         t.append(t1-t0)
@@ -581,7 +710,7 @@ class Synthesizer(base_tts.base_Synthesizer):
         texts = merge_short_text_in_array(texts, 5)
         audio_opt = []
         if not ref_free:
-            phones1, bert1, norm_text1 = self.get_phones_and_bert(prompt_text)
+            phones1, bert1 = conditioning["phones"], conditioning["bert"]
 
         for i_text,text in enumerate(texts):
             # 解决输入目标文本的空行导致报错的问题
@@ -620,16 +749,7 @@ class Synthesizer(base_tts.base_Synthesizer):
                     pred_semantic = pred_semantic[:, -idx:].unsqueeze(0)
                     self.cache[i_text]=pred_semantic
             t3 = time.time()
-            refers=[]
-            if(inp_refs):
-                for path in inp_refs:
-                    try:
-                        refer = self.get_spepc(path).to(self.torch_dtype).to(self.config.gpt_sovits_device)
-                        refers.append(refer)
-                    except:
-                        traceback.print_exc()
-            if(len(refers)==0):
-                refers = [self.get_spepc(ref_wav_path).to(self.torch_dtype).to(self.config.gpt_sovits_device)]
+            refers = conditioning["refers"]
             audio = (self.vq_model.decode(pred_semantic, torch.LongTensor(phones2).to(self.config.gpt_sovits_device).unsqueeze(0), refers,speed=speed).detach().cpu().numpy()[0, 0])
             max_audio=np.abs(audio).max()#简单防止16bit爆音
             if max_audio>1:audio/=max_audio
@@ -658,7 +778,8 @@ class Synthesizer(base_tts.base_Synthesizer):
         synthesis_result = self.get_tts_wav(prompt_text=settings["transcription"],
             ref_wav_path=speaker_wav_path, 
             text=voiceline,
-            inp_refs=inp_refs
+            inp_refs=inp_refs,
+            voice_model=voice_model
         )
         
         result_list = list(synthesis_result)
@@ -1,13 +1,20 @@
 from src.logging import logging
 logging.info("Importing base_tts.py")
 import src.utils as utils
-import subprocess
+import src.voiceline_cache as voiceline_cache
+import src.speaker_embeddings as speaker_embeddings
+import src.audio_merge as audio_merge
+import src.lip_generator as lip_generator
 import os
 from pathlib import Path
 import soundfile as sf
 import time
 import numpy as np
 import json
+import uuid
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 try:
     logging.info("Trying to import winsound")
     import winsound
@@ -49,7 +56,46 @@ class base_Synthesizer:
         # last active voice model
         self.crashable = self.config.continue_on_voice_model_error
         self._voices = None
+        self.speaker_wav_voices = None # (speaker wav folders signature, voices with a voice sample in them), see get_speaker_wav_voices()
+        self.voice_aliases = None # (voices signature, alias tables), see get_voice_aliases()
+        self.voice_resolutions = {} # (voice_model, voice_model_folder) -> voice model get_valid_voice_model() found for it(or None), cleared when voices_signature() changes
+        self.voice_resolutions_signature = None
+        self.voice_resolution_lock = threading.Lock()
         self.last_voice = ''
+        self.synthesis_executor = None # Created on first use by get_synthesis_executor()
+        self.kept_voiceline_count = max(self.config.tts_synthesis_queue_size + self.config.tts_synthesis_workers, 1) * 4 # How many of the most recent voiceline files to keep on disk before deleting the oldest
+        self.recent_voiceline_files = deque() # Voiceline files written by synthesize(), oldest first
+        self.voiceline_files_lock = threading.Lock()
+        self.lip_generation = lip_generator.get_lip_generation_pool(self.conversation_manager) # Shared between every tts engine, see src/lip_generator.py
+        self.voiceline_cache_config_keys = [] # Engine wide config values that change how voicelines sound, set by each tts type and added to the voiceline cache key by voiceline_cache_settings()
+        self.speaker_embeddings = None # Set by engines that condition on a voice sample with register_speaker_embeddings(), see src/speaker_embeddings.py
+        self.voiceline_cache = None # Shared between every tts engine, see src/voiceline_cache.py
+        if self.config.voiceline_cache_enabled:
+            if self.config.linux_mode:
+                self.voiceline_cache = voiceline_cache.get_voiceline_cache(f"{self.output_path}/voiceline_cache", self.config.voiceline_cache_max_size_mb)
+            else:
+                self.voiceline_cache = voiceline_cache.get_voiceline_cache(f"{self.output_path}\\voiceline_cache", self.config.voiceline_cache_max_size_mb)
+
+    def get_synthesis_executor(self):
+        """Get the executor used by the synthesis pipeline to run synthesize() off of the event loop"""
+        if self.synthesis_executor is None:
+            self.synthesis_executor = ThreadPoolExecutor(max_workers=max(1, self.config.tts_synthesis_workers), thread_name_prefix=f"{self.tts_slug}_synthesis")
+        return self.synthesis_executor
+
+    def remember_voiceline_file(self, final_voiceline_file):
+        """Track a newly written voiceline and delete the oldest ones once there are more than kept_voiceline_count of them"""
+        with self.voiceline_files_lock:
+            self.recent_voiceline_files.append(final_voiceline_file)
+            old_voiceline_files = []
+            while len(self.recent_voiceline_files) > self.kept_voiceline_count:
+                old_voiceline_files.append(self.recent_voiceline_files.popleft())
+        for old_voiceline_file in old_voiceline_files:
+            for old_file in [old_voiceline_file, old_voiceline_file.replace(".wav", ".lip")]:
+                try:
+                    if os.path.exists(old_file):
+                        os.remove(old_file)
+                except:
+                    logging.warning(f"Failed to remove old voiceline file: {old_file}")
 
     @property
     def speaker_wavs_folders(self):
@@ -123,6 +169,14 @@ class base_Synthesizer:
         # Write the 16-bit audio data back to a file
         sf.write(output_file, data_16bit, samplerate, subtype='PCM_16')
     
+    def split_for_playback(self, voiceline, character):
+        """Split a voiceline into parts the synthesis pipeline synthesizes and plays one after another, so engines that split long lines can start playing before the whole line is synthesized - Not split by default"""
+        return [voiceline]
+
+    def merge_audio_files(self, audio_files, voiceline_location):
+        """Merge the phrases of a voiceline that was synthesized in parts into one file - audio_files can be paths or in-memory audio files, see src/audio_merge.py"""
+        return audio_merge.merge_audio_files(audio_files, voiceline_location)
+
     def voices(self):
         """"Return a list of available voices"""
         logging.info("Warning: Using voice() method of base_tts.py, this means you haven't implemented the voices() method in your new tts type. This method should return a list of available voices models for the current game from the tts.")
@@ -143,40 +197,86 @@ class base_Synthesizer:
                 return speaker_wav_path
         return None
     
-    def get_valid_voice_model(self, character_or_voice_model, crashable=None, multi_tts=True, log=True):
-        """Get the valid voice model for the character from the available voices - Order of preference: voice_model, voice_model without spaces, lowercase voice_model, uppercase voice_model, lowercase voice_model without spaces, uppercase voice_model without spaces"""
-        if crashable is None:
-            crashable = self.crashable
-        # log = True
-        voice_model_folder = None
-        if type(character_or_voice_model) == str:
-            voice_model = character_or_voice_model
+    def register_speaker_embeddings(self, prepare, restore=None):
+        """Use a speaker embedding store for this engine - prepare(voice_model, speaker_wav_path) turns a voice sample into an embedding(a dict of numpy arrays, strings, numbers or json serializable values), restore(voice_model, embedding) optionally turns a saved embedding into what the engine synthesizes with"""
+        if self.config.linux_mode:
+            folder = os.path.abspath(f"./data/speaker_embeddings/{self.tts_slug}/{self.language['tts_language_code']}/")
         else:
-            voice_model = character_or_voice_model.voice_model
-            if "voice_model_folder" in character_or_voice_model.__dict__ and character_or_voice_model.voice_model_folder != None:
-                voice_model_folder = character_or_voice_model.voice_model_folder
-        options = [voice_model] # add the voice model from the character object
-        options.append(voice_model.replace(' ', '')) # add the voice model without spaces
-        options.append(voice_model.lower()) # add the lowercase version of the voice model
-        options.append(voice_model.upper()) # add the uppercase version of the voice model
-        options.append(voice_model.lower().replace(' ', '')) # add the lowercase version of the voice model without spaces
-        options.append(voice_model.upper().replace(' ', '')) # add the uppercase version of the voice model without spaces
-        if voice_model_folder != None:
-            options.append(voice_model_folder) # add the voice model folder from the character object
-
-        available_voices = self.voices()
+            folder = os.path.abspath(f".\\data\\speaker_embeddings\\{self.tts_slug}\\{self.language['tts_language_code']}\\")
+        self.speaker_embeddings = speaker_embeddings.get_speaker_embedding_store(self.tts_slug, folder, prepare, restore, self.config.speaker_embedding_cache_size)
+
+    def speaker_embedding_extra_signature(self, voice_model):
+        """Anything besides the voice sample and its tts_settings JSON that the speaker embedding of a voice depends on - Override this if your engine's prepare function uses settings from config.json"""
+        return None
+
+    def get_speaker_embedding(self, voice_model):
+        """Get the speaker embedding of a voice model from the store registered with register_speaker_embeddings(), preparing it if there isn't an up to date one"""
+        return self.speaker_embeddings.get(voice_model, self.get_speaker_wav_path(voice_model), self.voice_model_settings_path(voice_model), self.speaker_embedding_extra_signature(voice_model))
+
+    def warm_up_speaker_embeddings(self, voices=None):
+        """Prepare the speaker embeddings of every voice(or the voices given) ahead of time, so the first line each voice says doesn't have to - Returns (prepared or loaded, failed)"""
+        if self.speaker_embeddings is None:
+            return 0, 0
+        if voices is None:
+            voices = self.voices()
+        logging.info(f"{self.tts_slug} - Warming up speaker embeddings for {len(voices)} voices...")
+        done, failed = self.speaker_embeddings.warm_up(voices, self.get_speaker_wav_path, self.voice_model_settings_path, self.speaker_embedding_extra_signature)
+        logging.info(f"{self.tts_slug} - Speaker embeddings ready for {done} voices, {failed} failed")
+        return done, failed
+
+    def get_speaker_wav_folders_signature(self):
+        """The mtime of every speaker wav folder - Adding, removing or renaming a voice sample changes the mtime of its folder"""
+        signature = []
+        for speaker_wavs_folder in self.speaker_wavs_folders:
+            try:
+                signature.append((speaker_wavs_folder, os.stat(speaker_wavs_folder).st_mtime_ns))
+            except OSError:
+                signature.append((speaker_wavs_folder, None))
+        return tuple(signature)
+
+    def get_speaker_wav_voices(self):
+        """Get the voice models that have a .wav voice sample in the speaker wav folders - The folders are only listed again when one of them changes"""
+        signature = self.get_speaker_wav_folders_signature()
+        if self.speaker_wav_voices is None or self.speaker_wav_voices[0] != signature:
+            voices = []
+            found = set()
+            for speaker_wavs_folder, _ in signature:
+                if not os.path.isdir(speaker_wavs_folder):
+                    continue
+                for speaker_wav_file in os.listdir(speaker_wavs_folder):
+                    speaker = speaker_wav_file.split(".")[0]
+                    if speaker_wav_file.endswith(".wav") and speaker not in found:
+                        found.add(speaker)
+                        voices.append(speaker)
+            self.speaker_wav_voices = (signature, voices)
+        return list(self.speaker_wav_voices[1])
+
+    def voices_signature(self):
+        """Something that changes whenever voices() could return something different, used to know when cached voice resolutions are out of date"""
+        signature = (id(self._voices), len(self._voices) if self._voices is not None else None) # engines that get their voices from a server or from settings files keep them in self._voices
+        if self.speaker_wav_voices is not None: # engines that get their voices from the speaker wav folders
+            signature += self.get_speaker_wav_folders_signature()
+        return signature
+
+    def get_voice_aliases(self):
+        """Get (available voices, lowercase -> voice, spaceless lowercase -> voice) for matching voice model names that don't quite match, only rebuilt when the voices change"""
+        signature = self.voices_signature()
+        if self.voice_aliases is None or self.voice_aliases[0] != signature:
+            available_voices = self.voices()
+            lower_voices = {}
+            spaceless_lower_voices = {}
+            for voice in available_voices:
+                lower_voices[voice.lower()] = voice
+                spaceless_lower_voices[voice.replace(' ', '').lower()] = voice
+            self.voice_aliases = (self.voices_signature(), (set(available_voices), lower_voices, spaceless_lower_voices)) # voices() can change the signature the first time it's called
+        return self.voice_aliases[1]
+
+    def resolve_voice_model(self, options, log=True):
+        """Return the first of options that matches an available voice, exactly or ignoring case and spaces, or None if none of them do"""
+        available_voices, lower_voices, spaceless_lower_voices = self.get_voice_aliases()
         if log:
             logging.info("Trying to detect voice model using the following aliases: ", options)
-            logging.config("Available voices: ", available_voices)
-        lower_voices = {}
-        for voice in available_voices:
-            lower_voices[voice.lower()] = voice
-        spaceless_voices = {}
-        for voice in available_voices:
-            spaceless_voices[voice.replace(' ', '').lower()] = voice
-        spaceless_lower_voices = {}
-        for voice in available_voices:
-            spaceless_lower_voices[voice.replace(' ', '').lower()] = voice
+            logging.config("Available voices: ", list(available_voices))
         for option in options:
             if option in available_voices:
                 if log:
@@ -186,14 +286,52 @@ class base_Synthesizer:
                 if log:
                     logging.info(f'Voice model "{option}" not found, but "{lower_voices[option.lower()]}" found!')
                 return lower_voices[option.lower()] # return the first valid voice model found
-            if option.replace(' ', '') in spaceless_voices:
-                if log:
-                    logging.info(f'Voice model "{option}" not found, but "{spaceless_voices[option.replace(" ", "").lower()]}" found!')
-                return spaceless_voices[option.replace(' ', '').lower()] # return the first valid voice model found
             if option.lower().replace(' ', '') in spaceless_lower_voices:
                 if log:
                     logging.info(f'Voice model "{option}" not found, but "{spaceless_lower_voices[option.lower().replace(" ", "")]}" found!')
                 return spaceless_lower_voices[option.lower().replace(' ', '')]
+        return None
+
+    def get_valid_voice_model(self, character_or_voice_model, crashable=None, multi_tts=True, log=True):
+        """Get the valid voice model for the character from the available voices - Order of preference: voice_model, voice_model without spaces, lowercase voice_model, uppercase voice_model, lowercase voice_model without spaces, uppercase voice_model without spaces
+        
+        Results are cached by (voice_model, voice_model_folder) until the available voices change, so this is usually a single dictionary lookup."""
+        if crashable is None:
+            crashable = self.crashable
+        # log = True
+        voice_model_folder = None
+        if type(character_or_voice_model) == str:
+            voice_model = character_or_voice_model
+        else:
+            voice_model = character_or_voice_model.voice_model
+            if "voice_model_folder" in character_or_voice_model.__dict__ and character_or_voice_model.voice_model_folder != None:
+                voice_model_folder = character_or_voice_model.voice_model_folder
+        resolution_key = (voice_model, voice_model_folder)
+        with self.voice_resolution_lock:
+            signature = self.voices_signature()
+            if signature != self.voice_resolutions_signature: # a voice was added or removed, anything could resolve differently now
+                self.voice_resolutions = {}
+                self.voice_resolutions_signature = signature
+            cached = resolution_key in self.voice_resolutions
+            resolved_voice_model = self.voice_resolutions.get(resolution_key)
+        if cached:
+            if log and resolved_voice_model is not None:
+                logging.info(f'Voice model "{voice_model}" resolved to "{resolved_voice_model}"')
+        else:
+            options = [voice_model] # add the voice model from the character object
+            options.append(voice_model.replace(' ', '')) # add the voice model without spaces
+            options.append(voice_model.lower()) # add the lowercase version of the voice model
+            options.append(voice_model.upper()) # add the uppercase version of the voice model
+            options.append(voice_model.lower().replace(' ', '')) # add the lowercase version of the voice model without spaces
+            options.append(voice_model.upper().replace(' ', '')) # add the uppercase version of the voice model without spaces
+            if voice_model_folder != None:
+                options.append(voice_model_folder) # add the voice model folder from the character object
+            resolved_voice_model = self.resolve_voice_model(options, log)
+            with self.voice_resolution_lock:
+                if self.voice_resolutions_signature == self.voices_signature(): # don't cache a resolution made against voices that have since changed
+                    self.voice_resolutions[resolution_key] = resolved_voice_model
+        if resolved_voice_model is not None:
+            return resolved_voice_model
         # return None # if no valid voice model is found
         if log:
             logging.error(f'Voice model "{voice_model}" not available in {self.tts_slug}! Please add it to the voices list.')
@@ -238,6 +376,26 @@ class base_Synthesizer:
                     settings[setting] = voice_model_settings[setting]
         return settings
     
+    def voiceline_cache_settings(self, voice_model, aggro=0):
+        """Return everything besides the text, voice model and language that changes how a voiceline sounds - Set voiceline_cache_config_keys or override this if your tts type has engine wide settings that change its output"""
+        return {
+            "voice_model_settings": self.voice_model_settings(voice_model),
+            "aggro": aggro,
+            "config": {key: getattr(self.config, key, None) for key in self.voiceline_cache_config_keys},
+        }
+
+    def get_voiceline_cache_key(self, voiceline, character, aggro=0):
+        """Get the voiceline cache key for a voiceline, or None if it shouldn't be cached"""
+        try:
+            voice_model = self.get_valid_voice_model(character, crashable=False, log=False)
+            if voice_model is None:
+                voice_model = character if type(character) == str else character.voice_model
+            settings = self.voiceline_cache_settings(voice_model, aggro)
+        except Exception as e:
+            logging.warning(f"{self.tts_slug} - Could not get voiceline cache key, skipping the voiceline cache: {e}")
+            return None
+        return self.voiceline_cache.make_key(self.tts_slug, voice_model, self.language["tts_language_code"], voiceline, settings)
+
     @utils.time_it
     def _synthesize(self, voiceline, voice_model, voiceline_location, aggro=0):
         """Synthesize the text passed as a parameter with the voice model specified in the character object."""
@@ -252,18 +410,17 @@ class base_Synthesizer:
         raise NotImplementedError("synthesize() method not implemented in your tts type.")
 
     @utils.time_it
-    def synthesize(self, voiceline, character, aggro=0):
-        """Synthesize the audio for the character specified using TTS"""
+    def synthesize(self, voiceline, character, aggro=0, wait_for_lip=True):
+        """Synthesize the audio for the character specified using TTS - If wait_for_lip is False, this returns before the lip file is written and the caller has to wait for it with self.lip_generation.wait()"""
         logging.out(f'{self.tts_slug} - Starting voiceline synthesis: {voiceline}')
         if type(character) == str:
             voice_model = character
         else:
             voice_model = character.voice_model
-        self.change_voice(character)
         if voiceline.strip() == '': # If the voiceline is empty, don't synthesize anything
             logging.info('No voiceline to synthesize.')
             return ''
-        final_voiceline_file_name = 'voiceline'
+        final_voiceline_file_name = f'voiceline_{uuid.uuid4().hex}' # Unique per utterance so voicelines synthesized concurrently by the synthesis pipeline can't overwrite each other
         # make voice model folder if it doesn't already exist
         if self.config.linux_mode:
             if not os.path.exists(f"{self.output_path}/voicelines/{voice_model}"):
@@ -274,100 +431,49 @@ class base_Synthesizer:
                 os.makedirs(f"{self.output_path}\\voicelines\\{voice_model}")
             final_voiceline_file =  f"{self.output_path}\\voicelines\\{voice_model}\\{final_voiceline_file_name}.wav"
 
+        cache_key = None
+        if self.voiceline_cache is not None:
+            cache_key = self.get_voiceline_cache_key(voiceline, character, aggro)
+            if cache_key is not None and self.voiceline_cache.get(cache_key, final_voiceline_file): # Repeated lines like greetings and goodbyes skip synthesis and lip generation entirely
+                logging.info(f'{self.tts_slug} - Loaded voiceline from the voiceline cache: {self.voiceline_cache.stats()}')
+                self.debug(final_voiceline_file)
+                self.remember_voiceline_file(final_voiceline_file)
+                return final_voiceline_file
 
-        try:
-            if os.path.exists(final_voiceline_file):
-                os.remove(final_voiceline_file)
-            if os.path.exists(final_voiceline_file.replace(".wav", ".lip")):
-                os.remove(final_voiceline_file.replace(".wav", ".lip"))
-        except:
-            logging.warning("Failed to remove spoken voicelines")
-
+        self.change_voice(character)
         # Synthesize voicelines using chat_tts to create the new voiceline
         self._synthesize(voiceline, voice_model, final_voiceline_file, aggro)
         if not os.path.exists(final_voiceline_file):
             logging.error(f'{self.tts_slug} failed to generate voiceline at: {Path(final_voiceline_file)}')
             raise FileNotFoundError()
 
-        self.lip_gen(voiceline, final_voiceline_file)
-        self.debug(final_voiceline_file)
+        self.remember_voiceline_file(final_voiceline_file)
+        # Lip generation runs on the shared lip generation pool so the next voiceline can be synthesized in the meantime
+        self.lip_generation.submit(self.finish_voiceline, final_voiceline_file, voiceline, final_voiceline_file, cache_key)
+        if wait_for_lip:
+            self.lip_generation.wait(final_voiceline_file)
 
         return final_voiceline_file
-         
-    def run_command(self, command):
-        """Run a command in the command prompt"""
-        startupinfo = subprocess.STARTUPINFO()
-        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-
-        sp = subprocess.Popen(command, startupinfo=startupinfo, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-        stdout, stderr = sp.communicate()
-        stderr = stderr.decode("utf-8")
 
-    def check_face_fx_wrapper(self):
-        """Check if FaceFXWrapper is installed and FonixData.cdf exists in the same directory as the script."""
-        current_dir = os.getcwd() # get current directory
-        if self.config.linux_mode:
-            cdf_path = f'{current_dir}/FaceFXWrapper/FonixData.cdf'
-            face_wrapper_executable = f'wine {current_dir}/FaceFXWrapper/FaceFXWrapper.exe'
-        else:
-            cdf_path = f'{current_dir}\\FaceFXWrapper\\FonixData.cdf'
-            face_wrapper_executable = f'{current_dir}\\FaceFXWrapper\\FaceFXWrapper.exe'
-        installed = False
-
-        logging.info(f'Checking if FonixData.cdf exists at: {cdf_path}')
-        if os.path.isfile(cdf_path):
-            logging.info(f'Found FonixData.cdf at: {cdf_path}')
-            installed = True
-        else:
-            logging.error(f'Could not find FonixData.cdf in "{Path(cdf_path).parent}" required by FaceFXWrapper.')
-        
-        logging.info(f'Checking if FaceFXWrapper.exe exists at: {face_wrapper_executable}')
-        if os.path.isfile(face_wrapper_executable):
-            logging.info(f'Found FaceFXWrapper.exe at: {face_wrapper_executable}')
-            installed = True
-        else:
-            logging.error(f'Could not find FaceFXWrapper.exe in "{Path(face_wrapper_executable).parent}" with which to create a Lip Sync file, download it from: https://github.com/Haurrus/FaceFXWrapper/releases')
-            
-        return installed
+    def finish_voiceline(self, voiceline, final_voiceline_file, cache_key=None):
+        """Generate the lip file for a synthesized voiceline and add it to the voiceline cache - Runs on the lip generation pool"""
+        self.lip_gen(voiceline, final_voiceline_file)
+        self.debug(final_voiceline_file)
+        if cache_key is not None and (os.path.exists(final_voiceline_file.replace(".wav", ".lip")) or not self.lip_generation.lip_generator.is_installed()): # Don't cache a voiceline whose lip file failed to generate, so it gets another try next time
+            self.voiceline_cache.put(cache_key, final_voiceline_file)
 
+    @utils.time_it
     def lip_gen(self, voiceline, final_voiceline_file):
-        """Generate a lip file using FaceFXWrapper and FonixData.cdf"""
-        current_dir = utils.resolve_path() # get current directory
-        if self.config.linux_mode:
-            cdf_path = f'{current_dir}/FaceFXWrapper/FonixData.cdf'
-            face_wrapper_executable = f'{current_dir}/FaceFXWrapper/FaceFXWrapper.exe'
-        else:
-            cdf_path = f'{current_dir}\\FaceFXWrapper\\FonixData.cdf'
-            face_wrapper_executable = f'{current_dir}\\FaceFXWrapper\\FaceFXWrapper.exe'
-        logging.info(f'Generating lip file for voiceline: {voiceline} to: {final_voiceline_file.replace(".wav", ".lip")}')
-
-        face_wrapper_game = self.game.lower()
-        if face_wrapper_game == 'fallout4vr' or face_wrapper_game == 'fallout4':
-            face_wrapper_game = 'Fallout4'
-        if face_wrapper_game == 'skyrimvr' or face_wrapper_game == 'skyrim':
-            face_wrapper_game = 'Skyrim'
-        logging.info(f'FaceFXWrapper Detected Game: {face_wrapper_game}')
-
-        if self.check_face_fx_wrapper():
-            try:
-                if self.config.linux_mode:
-                    command = f'wine "{face_wrapper_executable}" "{face_wrapper_game}" "USEnglish" "{cdf_path}" "{final_voiceline_file}" "{final_voiceline_file.replace(".wav", "_r.wav")}" "{final_voiceline_file.replace(".wav", ".lip")}" "{voiceline}"'
-                else:
-                    command = f'{face_wrapper_executable} "{face_wrapper_game}" "USEnglish" "{cdf_path}" "{final_voiceline_file}" "{final_voiceline_file.replace(".wav", "_r.wav")}" "{final_voiceline_file.replace(".wav", ".lip")}" "{voiceline}"'
-
-                logging.info(f'Running command: {command}')
-                self.run_command(command)
-                # remove file created by FaceFXWrapper
-                if os.path.exists(final_voiceline_file.replace(".wav", "_r.wav")):
-                    os.remove(final_voiceline_file.replace(".wav", "_r.wav"))
-            except:
-                logging.error(f'FaceFXWrapper failed to generate lip file at: {final_voiceline_file} - Falling back to default/last lip file in Pantella-Spell')
-        else:
-            logging.error(f'FaceFXWrapper not installed:. Falling back to default lip file in Pantella-Spell')
+        """Generate a lip file for the voiceline using the configured lip generator"""
+        lip_file = final_voiceline_file.replace(".wav", ".lip")
+        logging.info(f'Generating lip file for voiceline: {voiceline} to: {lip_file}')
+        try:
+            self.lip_generation.lip_generator.generate(voiceline, final_voiceline_file)
+        except Exception as e:
+            logging.error(f'{self.lip_generation.lip_generator.lip_generator_slug} failed to generate lip file at: {lip_file} - Falling back to default/last lip file in Pantella-Spell: {e}')
 
-        if not os.path.exists(final_voiceline_file.replace(".wav", ".lip")):
-            logging.error(f'FaceFXWrapper failed to generate lip file at: {Path(final_voiceline_file).with_suffix(".lip")}')
+        if not os.path.exists(lip_file):
+            logging.error(f'{self.lip_generation.lip_generator.lip_generator_slug} failed to generate lip file at: {Path(lip_file)}')
 
     def debug(self, final_voiceline_file):
         """Play the voiceline from the script if debug_mode is enabled."""
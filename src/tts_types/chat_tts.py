@@ -54,8 +54,10 @@ class Synthesizer(base_tts.base_Synthesizer):
     def __init__(self, conversation_manager, ttses = []):
         super().__init__(conversation_manager)
         self.tts_slug = tts_slug
+        self.voiceline_cache_config_keys = ["chat_tts_default_infer_code_prompt", "chat_tts_default_infer_code_repetition_penalty", "chat_tts_default_infer_code_temperature", "chat_tts_default_refine_text_prompt", "chat_tts_default_refine_text_repetition_penalty", "chat_tts_default_refine_text_temperature", "chat_tts_default_refine_text_top_k", "chat_tts_default_refine_text_top_p"] # part of the voiceline cache key, see voiceline_cache_settings()
         self.chat = ChatTTS.Chat()
         self.chat.load(compile=False) # Set to True for better performance
+        self.register_speaker_embeddings(self.prepare_speaker_embedding) # the speaker sampled from each voice sample is saved and reused instead of decoding and sampling it for every voiceline
         logging.info(f'ChatTTS speaker wavs folders: {self.speaker_wavs_folders}')
         logging.config(f'ChatTTS - Available voices: {self.voices()}')
         if self.config.ensure_all_voice_samples_have_inference_settings:
@@ -106,14 +108,16 @@ class Synthesizer(base_tts.base_Synthesizer):
 
         return decoded_audio
 
+    def prepare_speaker_embedding(self, voice_model, speaker_wav_path):
+        """Decode a voice sample and sample the speaker from it"""
+        wav = self.load_audio(speaker_wav_path,24000)
+        return {
+            "speaker_sample": self.chat.sample_audio_speaker(wav)
+        }
+
     def voices(self):
         """Return a list of available voices"""
-        voices = []
-        for speaker_wavs_folder in self.speaker_wavs_folders:
-            for speaker_wav_file in os.listdir(speaker_wavs_folder):
-                speaker = speaker_wav_file.split(".")[0]
-                if speaker_wav_file.endswith(".wav") and speaker not in voices:
-                    voices.append(speaker)
+        voices = self.get_speaker_wav_voices() # only lists the speaker wav folders again when they've changed
         for banned_voice in self.config.chat_tts_banned_voice_models:
             if banned_voice in voices:
                 voices.remove(banned_voice)
@@ -174,12 +178,8 @@ class Synthesizer(base_tts.base_Synthesizer):
         refine_text_top_P = voice_model_settings["refine_text_top_P"]
         refine_text_top_K = voice_model_settings["refine_text_top_K"]
         refine_text_repetition_penalty = voice_model_settings["refine_text_repetition_penalty"]
-        logging.output("Loading audio...")
-        # np.ndarray wav
-        wav = self.load_audio(speaker_wav_path,24000)
-        
-        logging.output("Sampling speaker...")
-        speaker_sample = self.chat.sample_audio_speaker(wav)
+        logging.output("Getting speaker sample...")
+        speaker_sample = self.get_speaker_embedding(voice_model)["speaker_sample"] # sampled from the voice sample the first time the voice is used, see prepare_speaker_embedding()
         logging.output("Speaker sampled")
         logging.output("Getting infer_code params...")
         speaker_params_infer_code = ChatTTS.Chat.InferCodeParams(
@@ -47,9 +47,11 @@ class Synthesizer(base_tts.base_Synthesizer):
     def __init__(self, conversation_manager, ttses = []):
         super().__init__(conversation_manager)
         self.tts_slug = tts_slug
+        self.voiceline_cache_config_keys = ["f5_tts_volume"] # part of the voiceline cache key, see voiceline_cache_settings()
         logging.info(f"Initializing {self.tts_slug}...")
         self.model = load_f5tts(self.config.f5_tts_device)
 
+        self.register_speaker_embeddings(self.prepare_speaker_embedding, self.restore_speaker_embedding) # the trimmed and resampled reference clip of each voice is saved and reused instead of preprocessing it for every voiceline
         logging.info(f'{self.tts_slug} speaker wavs folders: {self.speaker_wavs_folders}')
         logging.config(f'{self.tts_slug} - Available voices: {self.voices()}')
         if len(self.voices()) > 0:
@@ -59,17 +61,34 @@ class Synthesizer(base_tts.base_Synthesizer):
 
     def voices(self):
         """Return a list of available voices"""
-        voices = []
-        for speaker_wavs_folder in self.speaker_wavs_folders:
-            for speaker_wav_file in os.listdir(speaker_wavs_folder):
-                speaker = speaker_wav_file.split(".")[0]
-                if speaker_wav_file.endswith(".wav") and speaker not in voices:
-                    voices.append(speaker)
+        voices = self.get_speaker_wav_voices() # only lists the speaker wav folders again when they've changed
         for banned_voice in self.config.f5_tts_banned_voice_models:
             if banned_voice in voices:
                 voices.remove(banned_voice)
         return voices
     
+    def prepare_speaker_embedding(self, voice_model, speaker_wav_path):
+        """Trim and resample a voice sample into the reference clip the model conditions on"""
+        settings = self.voice_model_settings(voice_model)
+        if not settings["transcription"].strip():
+            raise ValueError("Please enter reference text.")
+        ref_audio, ref_text = preprocess_ref_audio_text(speaker_wav_path, settings["transcription"])
+        audio, sample_rate = sf.read(ref_audio, dtype="float32")
+        return {
+            "audio": audio,
+            "sample_rate": sample_rate,
+            "ref_text": ref_text,
+        }
+
+    def restore_speaker_embedding(self, voice_model, speaker_embedding):
+        """Write a prepared reference clip to the speaker embeddings folder, since infer_process() loads the reference audio from a file"""
+        ref_audio = os.path.join(self.speaker_embeddings.folder, f"{voice_model}.ref.wav")
+        sf.write(ref_audio, speaker_embedding["audio"], speaker_embedding["sample_rate"])
+        return {
+            "ref_audio": ref_audio,
+            "ref_text": speaker_embedding["ref_text"],
+        }
+
     def infer(self,
         ref_audio_orig,
         ref_text,
@@ -81,6 +100,7 @@ class Synthesizer(base_tts.base_Synthesizer):
         speed=1,
         cfg_strength=2,
         sway_sampling_coef=-1,
+        voice_model=None,
     ):
         if not ref_audio_orig:
             raise ValueError("Please provide reference audio.")
@@ -88,7 +108,11 @@ class Synthesizer(base_tts.base_Synthesizer):
         if not ref_text.strip():
             raise ValueError("Please enter reference text.")
 
-        ref_audio, ref_text = preprocess_ref_audio_text(ref_audio_orig, ref_text)
+        if voice_model is not None: # prepared once per voice, see prepare_speaker_embedding()
+            speaker_embedding = self.get_speaker_embedding(voice_model)
+            ref_audio, ref_text = speaker_embedding["ref_audio"], speaker_embedding["ref_text"]
+        else:
+            ref_audio, ref_text = preprocess_ref_audio_text(ref_audio_orig, ref_text)
 
         final_wave, final_sample_rate, combined_spectrogram = infer_process(
             ref_audio,
@@ -135,5 +159,6 @@ class Synthesizer(base_tts.base_Synthesizer):
             speed=1,
             cfg_strength=2,
             sway_sampling_coef=-1,
+            voice_model=voice_model,
         )
         logging.output(f'{self.tts_slug} - synthesized {voiceline} with voice model "{voice_model}"')
\ No newline at end of file
@@ -1,6 +1,7 @@
 print("Loading multi_tts.py...")
 from src.logging import logging
 import random
+import threading
 import src.tts_types.base_tts as base_tts
 logging.info("Imported required libraries in multi_tts.py")
 
@@ -10,6 +11,9 @@ class Synthesizer(base_tts.base_Synthesizer):
         super().__init__(conversation_manager)
         self.tts_slug = tts_slug
         self.tts_engines = ttses
+        self.engine_routes = {} # (voice_model, voice_model_folder, tts_override) -> the tts engine lines for it are sent to(or None), cleared when any engine's voices change
+        self.engine_routes_signature = None
+        self.engine_routes_lock = threading.Lock()
         fallback_order = ""
         for tts_index, tts in enumerate(self.tts_engines):
             fallback_order += f"{str(tts_index+1)}. {tts.tts_slug}\n"
@@ -27,39 +31,70 @@ class Synthesizer(base_tts.base_Synthesizer):
         voices = list(set(voices))
         return voices
     
-    def get_valid_voice_model(self, character, crashable=False, multi_tts=True, log=True):
-        """Synthesize the text for the character specified using either the 'tts_override' property of the character or using the first tts engine that supports the voice model of the character"""
-        tts = None
-        # print(voiceline)
-        # print(character)
+    def warm_up_speaker_embeddings(self, voices=None):
+        """Warm up the speaker embeddings of every tts engine that uses them"""
+        done = 0
+        failed = 0
+        for tts in self.tts_engines:
+            tts_done, tts_failed = tts.warm_up_speaker_embeddings(voices)
+            done += tts_done
+            failed += tts_failed
+        return done, failed
+
+    def voices_signature(self):
+        return tuple(tts.voices_signature() for tts in self.tts_engines)
+
+    def find_tts_engine(self, character):
+        """Find the tts engine for a character or voice model - The engine named by the character's 'tts_override' property if it supports their voice model, otherwise the first tts engine that does"""
+        tts_override = None
         if type(character) != str and "tts_override" in character.__dict__:
-            if character.tts_override in self.tts_engines:
-                tts = self.tts_engines[character.tts_override]
-                if log:
+            tts_override = character.tts_override
+            for tts_engine in self.tts_engines:
+                if tts_engine.tts_slug == tts_override and tts_engine.get_valid_voice_model(character, crashable=False, multi_tts=True, log=False) != None:
+                    return tts_engine
+        for tts_engine in self.tts_engines:
+            if tts_engine.get_valid_voice_model(character, crashable=False, multi_tts=True, log=False) != None:
+                return tts_engine
+        return None
+
+    def get_tts_engine(self, character, log=True):
+        """Get the tts engine for a character or voice model, cached by (voice_model, voice_model_folder, tts_override) until the voices of any of the tts engines change"""
+        if type(character) == str:
+            route_key = (character, None, None)
+        else:
+            route_key = (character.voice_model, character.__dict__.get("voice_model_folder"), character.__dict__.get("tts_override"))
+        with self.engine_routes_lock:
+            signature = self.voices_signature()
+            if signature != self.engine_routes_signature:
+                self.engine_routes = {}
+                self.engine_routes_signature = signature
+            cached = route_key in self.engine_routes
+            tts = self.engine_routes.get(route_key)
+        if not cached:
+            tts = self.find_tts_engine(character)
+            with self.engine_routes_lock:
+                if self.engine_routes_signature == self.voices_signature():
+                    self.engine_routes[route_key] = tts
+            if log and tts is not None:
+                if type(character) == str:
+                    logging.info(f"Character for voice model '{character}' cannot have tts_override set. Using the first tts engine that supports the voice model of the character. TTS engine: {tts.tts_slug}")
+                elif route_key[2] is None:
+                    logging.info(f"Character {character.name} does not have tts_override set. Using the first tts engine that supports the voice model of the character. TTS engine: {tts.tts_slug}")
+                elif route_key[2] == tts.tts_slug:
                     logging.info(f"Character {character.name} has tts_override set to {character.tts_override}.")
+                else:
+                    logging.warn(f"Character {character.name} has tts_override set to {character.tts_override}, but that tts engine does not support the voice model of the character. Falling back to the first tts engine that supports the voice model of the character. TTS engine: {tts.tts_slug}")
+        if tts is None and log:
+            if type(character) != str:
+                logging.error(f"Could not find tts engine for voice model: {character.voice_model}! Please check your config.json file and try again!")
             else:
-                for tts_engine in self.tts_engines:
-                    if tts_engine.get_valid_voice_model(character, multi_tts=True, log=log) != None:
-                        if log:
-                            logging.warn(f"Character {character.name} has tts_override set to {character.tts_override}, but that tts engine does not support the voice model of the character. Falling back to the first tts engine that supports the voice model of the character. TTS engine: {tts_engine.tts_slug}")
-                        tts = tts_engine
-                        break
-        else:
-            for tts_engine in self.tts_engines:
-                if tts_engine.get_valid_voice_model(character, multi_tts=True, log=log) != None:
-                    if log:
-                        if type(character) != str:
-                            logging.info(f"Character {character.name} does not have tts_override set. Using the first tts engine that supports the voice model of the character. TTS engine: {tts_engine.tts_slug}")
-                        else:
-                            logging.info(f"Character for voice model '{character}' cannot have tts_override set. Using the first tts engine that supports the voice model of the character. TTS engine: {tts_engine.tts_slug}")
-                    tts = tts_engine
-                    break
+                logging.error(f"Could not find tts engine for voice model: {character}! Please check your config.json file and try again!")
+        return tts
+    
+    def get_valid_voice_model(self, character, crashable=False, multi_tts=True, log=True):
+        """Get the valid voice model for the character from the tts engine chosen using either the 'tts_override' property of the character or the first tts engine that supports the voice model of the character"""
+        tts = self.get_tts_engine(character, log=log)
         if tts is None:
-            if log:
-                if type(character) != str:
-                    logging.error(f"Could not find tts engine for voice model: {character.voice_model}! Please check your config.json file and try again!")
-                else:
-                    logging.error(f"Could not find tts engine for voice model: {character}! Please check your config.json file and try again!")
             if self.crashable:
                 input("Press enter to continue...")
                 if type(character) != str:
@@ -69,24 +104,16 @@ class Synthesizer(base_tts.base_Synthesizer):
         else:
             return tts.get_valid_voice_model(character, crashable=self.crashable, multi_tts=True, log=log)
     
+    def split_for_playback(self, voiceline, character):
+        """Split the voiceline the way the tts engine that will synthesize it does"""
+        tts = self.get_tts_engine(character, log=False)
+        if tts is None:
+            return [voiceline]
+        return tts.split_for_playback(voiceline, character)
+
     def synthesize(self, voiceline, character, **kwargs):
         """Synthesize the text for the character specified using either the 'tts_override' property of the character or using the first tts engine that supports the voice model of the character"""
-        tts = None
-        # print(voiceline)
-        # print(character)
-        if "tts_override" in character.__dict__:
-            for tts_engine in self.tts_engines:
-                if character.tts_override == tts_engine.tts_slug and tts_engine.get_valid_voice_model(character) != None:
-                    tts = tts_engine
-                    break
-                elif tts_engine.get_valid_voice_model(character) != None:
-                    tts = tts_engine
-                    break
-        else:
-            for tts_engine in self.tts_engines:
-                if tts_engine.get_valid_voice_model(character) != None:
-                    tts = tts_engine
-                    break
+        tts = self.get_tts_engine(character, log=False)
         if tts is None:
             logging.error(f"Could not find tts engine for voice model: {character.voice_model}! Please check your config.json file and try again!")
             if self.crashable:
@@ -96,11 +123,7 @@ class Synthesizer(base_tts.base_Synthesizer):
             return tts.synthesize(voiceline, character, **kwargs)
         
     def _say(self, voiceline, voice_model="Female Sultry", volume=0.5):
-        tts = None
-        for tts_engine in self.tts_engines:
-            if tts_engine.get_valid_voice_model(voice_model) != None:
-                tts = tts_engine
-                break
+        tts = self.get_tts_engine(voice_model, log=False)
         if tts is None:
             logging.error(f"Could not find tts engine for voice model: {voice_model}! Please check your config.json file and try again!")
             if self.crashable:
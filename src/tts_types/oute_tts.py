@@ -18,6 +18,7 @@ class Synthesizer(base_tts.base_Synthesizer):
     def __init__(self, conversation_manager, ttses = []):
         super().__init__(conversation_manager)
         self.tts_slug = tts_slug
+        self.voiceline_cache_config_keys = ["oute_tts_max_length", "oute_tts_repetition_penalty", "oute_tts_temperature"] # part of the voiceline cache key, see voiceline_cache_settings()
         logging.info(f"Initializing {self.tts_slug}...")
         self.model_config = outetts.HFModelConfig_v1(
             model_path="OuteAI/OuteTTS-0.2-500M",
@@ -25,6 +26,7 @@ class Synthesizer(base_tts.base_Synthesizer):
         )
         self.interface = outetts.InterfaceHF(model_version="0.2", cfg=self.model_config)
 
+        self.register_speaker_embeddings(self.prepare_speaker_embedding) # the speaker profile of each voice is saved and reused instead of being created for every voiceline
         logging.info(f'{self.tts_slug} speaker wavs folders: {self.speaker_wavs_folders}')
         logging.config(f'{self.tts_slug} - Available voices: {self.voices()}')
         if len(self.voices()) > 0:
@@ -33,17 +35,22 @@ class Synthesizer(base_tts.base_Synthesizer):
 
     def voices(self):
         """Return a list of available voices"""
-        voices = []
-        for speaker_wavs_folder in self.speaker_wavs_folders:
-            for speaker_wav_file in os.listdir(speaker_wavs_folder):
-                speaker = speaker_wav_file.split(".")[0]
-                if speaker_wav_file.endswith(".wav") and speaker not in voices:
-                    voices.append(speaker)
+        voices = self.get_speaker_wav_voices() # only lists the speaker wav folders again when they've changed
         for banned_voice in self.config.oute_tts_banned_voice_models:
             if banned_voice in voices:
                 voices.remove(banned_voice)
         return voices
     
+    def prepare_speaker_embedding(self, voice_model, speaker_wav_path):
+        """Create the speaker profile of a voice from its voice sample and transcription"""
+        settings = self.voice_model_settings(voice_model)
+        return {
+            "speaker": self.interface.create_speaker(
+                audio_path=speaker_wav_path,
+                transcript=settings["transcription"]
+            )
+        }
+
     @property
     def default_voice_model_settings(self):
         return {
@@ -61,10 +68,7 @@ class Synthesizer(base_tts.base_Synthesizer):
         logging.output(f'{self.tts_slug} - using voice model settings: {settings}')
         if not voiceline.endswith(".") and not voiceline.endswith("!") and not voiceline.endswith("?"): # Add a period to the end of the voiceline if it doesn't have one.
             voiceline += "."
-        speaker = self.interface.create_speaker(
-            audio_path=speaker_wav_path,
-            transcript=settings["transcription"]
-        )
+        speaker = self.get_speaker_embedding(voice_model)["speaker"] # created the first time the voice is used, see prepare_speaker_embedding()
         temperature = settings["temperature"] if "temperature" in settings else self.config.oute_tts_temperature
         repetition_penalty = settings["repetition_penalty"] if "repetition_penalty" in settings else self.config.oute_tts_repetition_penalty
         max_length = self.config.oute_tts_max_length
@@ -37,6 +37,7 @@ class Synthesizer(base_tts.base_Synthesizer):
     def __init__(self, conversation_manager, ttses = []):
         super().__init__(conversation_manager)
         self.tts_slug = tts_slug
+        self.voiceline_cache_config_keys = ["parler_tts_model", "parler_temperature", "parler_tts_max_length"] # part of the voiceline cache key, see voiceline_cache_settings()
         logging.info(f"Initializing {self.tts_slug}({self.config.parler_tts_model}) to device {self.config.parler_tts_device}")
         self.model = ParlerTTSForConditionalGeneration.from_pretrained(self.config.parler_tts_model).to(self.config.parler_tts_device)
         self.tokenizer = AutoTokenizer.from_pretrained(self.config.parler_tts_model)
@@ -2,9 +2,9 @@ print("Loading xtts_api.py...")
 from src.logging import logging
 import src.utils as utils
 import src.tts_types.base_tts as base_tts
+import src.http_client as http_client
 import os
 from pathlib import Path
-import requests
 import time
 import subprocess
 import threading
@@ -18,6 +18,8 @@ class Synthesizer(base_tts.base_Synthesizer):
     def __init__(self, conversation_manager):
         super().__init__(conversation_manager)
         self.tts_slug = tts_slug
+        self.voiceline_cache_config_keys = ["xtts_api_data"] # part of the voiceline cache key, see voiceline_cache_settings()
+        self.http = http_client.get_client("xtts_api", self.config) # keep-alive connections to the xTTS API server, with timeouts and retries
         if not self.xtts_api_dir == "" or not self.xtts_api_dir == None or not self.xtts_api_dir.lower() == "none":
             if conversation_manager.config.linux_mode:
                 if not os.path.exists(self.xtts_api_dir+"/xtts_api_server/__init__.py"):
@@ -132,7 +134,7 @@ class Synthesizer(base_tts.base_Synthesizer):
         """Return a list of available voices"""
         # Code to request and return the list of available models
         if self._voices == None:
-            response = requests.get(self.xtts_get_speakers_list)
+            response = self.http.get(self.xtts_get_speakers_list)
             if response.status_code != 200:
                 logging.error(f'Failed to get xTTS voices list: {response.status_code}')
                 return []
@@ -153,7 +155,7 @@ class Synthesizer(base_tts.base_Synthesizer):
     def available_models(self):
         """Return a list of available models"""
         # Code to request and return the list of available models
-        response = requests.get(self.xtts_get_models_list)
+        response = self.http.get(self.xtts_get_models_list)
         return response.json() if response.status_code == 200 else []
     
     def set_model(self, model):
@@ -165,12 +167,12 @@ class Synthesizer(base_tts.base_Synthesizer):
         if self.current_model == model: # if the model is already set, do nothing
             return
         self.current_model = model # else: set the current model to the new model
-        requests.post(self.switch_model_url, json={"model_name": model}) # Request to switch the voice model
+        self.http.post(self.switch_model_url, json={"model_name": model}) # Request to switch the voice model
     
     def is_running(self):
         """Check if the xTTS server is running"""
         try:
-            response = requests.post(self.xtts_set_tts_settings, json=self.xtts_data)
+            response = self.http.post(self.xtts_set_tts_settings, json=self.xtts_data, timeout=5, retries=0) # the caller retries while the server is starting up
             response.raise_for_status()  # If the response contains an HTTP error status code, 
             return True
         except:
@@ -279,7 +281,7 @@ class Synthesizer(base_tts.base_Synthesizer):
         }
         # print(data)
         try:
-            response = requests.post(self.synthesize_url_xtts, json=data)
+            response = self.http.post(self.synthesize_url_xtts, json=data)
             if response.status_code == 200: # if the request was successful, write the wav file to disk at the specified path
                 self.convert_to_16bit(io.BytesIO(response.content), voiceline_location)
             else:
@@ -2,6 +2,7 @@ print("Loading xvasynth.py")
 from src.logging import logging, time
 import src.utils as utils
 import src.tts_types.base_tts as base_tts
+import src.http_client as http_client
 import requests
 import subprocess
 import os
@@ -13,6 +14,7 @@ import requests
 import threading
 import traceback
 import random
+from concurrent.futures import ThreadPoolExecutor
 logging.info("Imported required libraries in xVASynth TTS")
 
 tts_slug = "xvasynth"
@@ -20,6 +22,8 @@ class Synthesizer(base_tts.base_Synthesizer):
     def __init__(self, conversation_manager):
         super().__init__(conversation_manager)
         self.tts_slug = tts_slug
+        self.voiceline_cache_config_keys = ["pace", "use_sr", "use_cleanup"] # part of the voiceline cache key, see voiceline_cache_settings()
+        self.http = http_client.get_client("xvasynth", self.config) # keep-alive connections to the xVASynth server, with timeouts and retries
         self.xvasynth_path = self.config.xvasynth_path
         self.process_device = self.config.xvasynth_process_device
         self.times_checked_xvasynth = 0
@@ -71,6 +75,7 @@ class Synthesizer(base_tts.base_Synthesizer):
             
 
         self._voices = None
+        self.phrase_executor = None # Created on first use by get_phrase_executor()
 
         self.synthesize_url = f'{self.config.xvasynth_base_url}/synthesize'
         self.synthesize_batch_url = f'{self.config.xvasynth_base_url}/synthesize_batch'
@@ -103,7 +108,7 @@ class Synthesizer(base_tts.base_Synthesizer):
         try:
             # contact local xVASynth server; ~2 second timeout
             logging.info(f'Checking if xVASynth is already running...')
-            response = requests.get(f'{self.config.xvasynth_base_url}/')
+            response = self.http.get(f'{self.config.xvasynth_base_url}/', timeout=2, retries=0) # the caller retries while the server is starting up
             response.raise_for_status()  # If the response contains an HTTP error status code, raise an exception
             return True
         except requests.exceptions.RequestException as err:
@@ -139,8 +144,8 @@ class Synthesizer(base_tts.base_Synthesizer):
         if self._voices is None:
             self._voices = []
             logging.config(f"Getting available voices from {self.get_available_voices_url}...")
-            requests.post(self.set_available_voices_url, json={'modelsPaths': json.dumps({self.game: self.model_path})}) # Set the available voices to the ones in the models folder
-            r = requests.post(self.get_available_voices_url) # Get the available voices
+            self.http.post(self.set_available_voices_url, json={'modelsPaths': json.dumps({self.game: self.model_path})}) # Set the available voices to the ones in the models folder
+            r = self.http.post(self.get_available_voices_url) # Get the available voices
             if r.status_code == 200:
                 logging.config(f"Got available voices from {self.get_available_voices_url}...")
                 # logging.info(f"Response code: {r.status_code}")
@@ -194,7 +199,7 @@ class Synthesizer(base_tts.base_Synthesizer):
         logging.config(f'Pace: {self.pace}')
         logging.config(f'Use SR: {self.use_sr}')
         logging.config(f'Use Cleanup: {self.use_cleanup}')
-        requests.post(self.synthesize_url, json=data)
+        self.http.post(self.synthesize_url, json=data)
 
     @utils.time_it
     def _batch_synthesize(self, grouped_sentences, voiceline_files):
@@ -212,25 +217,45 @@ class Synthesizer(base_tts.base_Synthesizer):
             'useSR': None,
             'useCleanup': None,
         }
-        requests.post(self.synthesize_batch_url, json=data)
+        self.http.post(self.synthesize_batch_url, json=data)
+
+    def get_phrase_executor(self):
+        """Get the executor the phrases of long xVAPitch voicelines are synthesized on, at most xvasynth_phrase_concurrency at once"""
+        if self.phrase_executor is None:
+            self.phrase_executor = ThreadPoolExecutor(max_workers=max(1, self.config.xvasynth_phrase_concurrency), thread_name_prefix="xvasynth_phrase")
+        return self.phrase_executor
+
+    def split_for_playback(self, voiceline, character):
+        """Split off the first phrase of a long voiceline so it can be synthesized and played while the rest is synthesized, if xvasynth_early_first_phrase is enabled"""
+        if not self.config.xvasynth_early_first_phrase:
+            return [voiceline]
+        phrases = self._split_voiceline(' ' + voiceline.strip() + ' ')
+        if len(phrases) <= 1:
+            return [voiceline]
+        return [phrases[0], ' '.join(phrases[1:])]
 
     def _synthesize(self, voiceline, voice_model, voiceline_location, aggro=0):
         voiceline = ' ' + voiceline.strip() + ' ' # xVASynth apparently performs better having spaces at the start and end of the voiceline for some reason
-        voiceline_files = []
         phrases = self._split_voiceline(voiceline)
-        for phrase in phrases:
-            voiceline_file = f"{self.output_path}\\voicelines\\{self.last_voice}\\{utils.clean_text(phrase)[:150]}.wav"
-            voiceline_files.append(voiceline_file)
         if len(phrases) == 1:
             self._synthesize_line(phrases[0], voiceline_location, voice_model, aggro)
-        else:
-            # TODO: include batch synthesis for v3 models (batch not needed very often)
+            return
+        voiceline_files = [voiceline_location.replace(".wav", f"_phrase_{i}.wav") for i in range(len(phrases))] # named after the voiceline so voicelines synthesized at the same time can't overwrite each other's phrases
+        try:
             if self.model_type != 'xVAPitch':
                 self._batch_synthesize(phrases, voiceline_files)
-            else:
-                for i, voiceline_file in enumerate(voiceline_files):
-                    self._synthesize_line(phrases[i], voiceline_files[i], voice_model)
+            else: # xVAPitch models can't be batch synthesized, so the phrases are sent as separate requests at the same time
+                futures = [self.get_phrase_executor().submit(self._synthesize_line, phrase, voiceline_file, voice_model, aggro) for phrase, voiceline_file in zip(phrases, voiceline_files)]
+                for future in futures:
+                    future.result()
             self.merge_audio_files(voiceline_files, voiceline_location)
+        finally:
+            for voiceline_file in voiceline_files:
+                try:
+                    if os.path.exists(voiceline_file):
+                        os.remove(voiceline_file)
+                except:
+                    logging.warning(f"Failed to remove phrase file: {voiceline_file}")
 
     @utils.time_it
     def _group_sentences(self, voiceline_sentences, max_length=150):
@@ -298,29 +323,6 @@ class Synthesizer(base_tts.base_Synthesizer):
 
         return result
 
-    def merge_audio_files(self, audio_files, voiceline_file_name, retries=3):
-        """Merge multiple audio files into one file"""
-        logging.info(f'Merging audio files: {audio_files}')
-        logging.info(f'Output file: {voiceline_file_name}')
-        merged_audio = np.array([])
-        
-        for audio_file in audio_files:
-            tries_left = int(retries)
-            while tries_left > 0:
-                try:
-                    audio, samplerate = sf.read(audio_file)
-                    merged_audio = np.concatenate((merged_audio, audio))
-                    break
-                except:
-                    logging.info(f'Could not find voiceline file: {audio_file}')
-                    tries_left -= 1
-                    if tries_left == 0:
-                        logging.error(f'Could not find voiceline file: {audio_file}')
-                        raise FileNotFoundError(f'Could not find voiceline file: {audio_file}')
-                    else:
-                        time.sleep(0.2)
-        sf.write(voiceline_file_name, merged_audio, samplerate)
-  
     @utils.time_it
     def change_voice(self, character):
         """Change the voice model to the specified character's voice model"""
@@ -372,7 +374,7 @@ class Synthesizer(base_tts.base_Synthesizer):
             'base_lang': character.tts_language_code if type(character) != str else 'en',
             'pluginsContext': '{}',
         }
-        requests.post(self.loadmodel_url, json=model_change)
+        self.http.post(self.loadmodel_url, json=model_change)
 
         self.last_voice = voice
         logging.info('Voice model loaded.')
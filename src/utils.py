@@ -4,6 +4,8 @@ import re
 import string
 import sys
 import os
+import asyncio
+import threading
 from shutil import rmtree
 from charset_normalizer import detect
 logging.info("Imported required libraries in utils.py")
@@ -19,6 +21,63 @@ def time_it(func):
     return wrapper
 
 
+class _ThreadedStreamEnd:
+    """Marks the end of a stream produced by stream_in_thread()"""
+    pass
+
+class _ThreadedStreamError:
+    """Carries an exception raised in a stream_in_thread() producer thread back to the event loop"""
+    def __init__(self, exception):
+        self.exception = exception
+
+async def stream_in_thread(generator_function, *args, **kwargs):
+    """Run a blocking generator in a producer thread and yield its items on the asyncio event loop as soon as they arrive
+
+    The generator is created inside the producer thread as well, so any blocking setup work(building prompts, opening HTTP streams, etc.) also happens off of the event loop.
+    Closing the returned async generator (or breaking out of it and calling aclose()) tells the producer thread to stop and close the underlying generator.
+    """
+    loop = asyncio.get_running_loop()
+    stream_queue = asyncio.Queue()
+    stop_event = threading.Event()
+
+    def put(item):
+        try:
+            loop.call_soon_threadsafe(stream_queue.put_nowait, item)
+        except RuntimeError: # the event loop was closed before the producer finished
+            stop_event.set()
+
+    def producer():
+        generator = None
+        try:
+            generator = generator_function(*args, **kwargs)
+            for item in generator:
+                if stop_event.is_set():
+                    break
+                put(item)
+        except Exception as e:
+            put(_ThreadedStreamError(e))
+        finally:
+            if generator is not None and hasattr(generator, "close"):
+                try:
+                    generator.close()
+                except Exception as e:
+                    logging.warning(f"Error closing threaded stream: {e}")
+            put(_ThreadedStreamEnd())
+
+    producer_thread = threading.Thread(target=producer, name=f"stream_in_thread-{getattr(generator_function, '__name__', 'generator')}", daemon=True)
+    producer_thread.start()
+    try:
+        while True:
+            item = await stream_queue.get()
+            if isinstance(item, _ThreadedStreamEnd):
+                break
+            if isinstance(item, _ThreadedStreamError):
+                raise item.exception
+            yield item
+    finally:
+        stop_event.set()
+
+
 def clean_text(text):
     """Clean up text by removing punctuation and extra whitespace"""
     # Remove all punctuation from the sentence
@@ -0,0 +1,149 @@
+print("Importing voiceline_cache.py")
+from src.logging import logging
+import os
+import json
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+logging.info("Imported required libraries in voiceline_cache.py")
+
+_caches = {} # cache_dir -> VoicelineCache, so every tts engine(including the ones inside multi_tts) shares the same size budget and counters
+_caches_lock = threading.Lock()
+
+def get_voiceline_cache(cache_dir, max_size_mb):
+    """Get the shared voiceline cache stored in cache_dir"""
+    cache_dir = os.path.abspath(cache_dir)
+    with _caches_lock:
+        if cache_dir not in _caches:
+            _caches[cache_dir] = VoicelineCache(cache_dir, max_size_mb)
+        return _caches[cache_dir]
+
+def normalize_voiceline(voiceline):
+    """Collapse whitespace so the same line with different spacing maps to the same cache entry - Case and punctuation are kept because they change how the line is spoken"""
+    return " ".join(voiceline.split())
+
+class VoicelineCache:
+    """Persistent, size bounded LRU cache of finished voicelines(the .wav and its .lip file)
+
+    Entries are content addressed - the file name is a hash of the tts engine, the resolved voice model, the language, the normalized text and the voice settings.
+    The last time an entry was used is stored as the modification time of its .wav file, so the LRU order survives restarts.
+    """
+    def __init__(self, cache_dir, max_size_mb):
+        self.cache_dir = cache_dir
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.entries = OrderedDict() # key -> size of the cached files in bytes, least recently used first
+        self.total_size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.load_index()
+
+    def load_index(self):
+        """Rebuild the LRU index from the files already in the cache directory"""
+        found = {}
+        for file in os.scandir(self.cache_dir):
+            if not file.is_file():
+                continue
+            key, extension = os.path.splitext(file.name)
+            if extension == ".wav":
+                size, _ = found.get(key, (0, 0))
+                found[key] = (size + file.stat().st_size, file.stat().st_mtime)
+            elif extension == ".lip":
+                size, last_used = found.get(key, (0, 0))
+                found[key] = (size + file.stat().st_size, last_used)
+            elif extension == ".tmp": # left over from an interrupted write
+                os.remove(file.path)
+        for key, (size, last_used) in sorted(found.items(), key=lambda item: item[1][1]):
+            if os.path.exists(self.wav_path(key)):
+                self.entries[key] = size
+                self.total_size += size
+            else:
+                self.remove_files(key)
+        self.evict()
+        logging.info(f"Loaded voiceline cache with {len(self.entries)} voicelines ({round(self.total_size / 1024 / 1024, 2)}MB) from {self.cache_dir}")
+
+    def make_key(self, tts_slug, voice_model, language_code, voiceline, settings):
+        """Hash everything that changes what a voiceline sounds like into a cache key"""
+        settings_hash = hashlib.sha256(json.dumps(settings, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        key_data = json.dumps([tts_slug, voice_model, language_code, normalize_voiceline(voiceline), settings_hash])
+        return hashlib.sha256(key_data.encode("utf-8")).hexdigest()
+
+    def wav_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.wav")
+
+    def lip_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.lip")
+
+    def get(self, key, final_voiceline_file):
+        """Copy a cached voiceline to final_voiceline_file - Returns False if the voiceline isn't cached"""
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return False
+            self.entries.move_to_end(key)
+            self.hits += 1
+            try:
+                shutil.copyfile(self.wav_path(key), final_voiceline_file)
+                if os.path.exists(self.lip_path(key)):
+                    shutil.copyfile(self.lip_path(key), final_voiceline_file.replace(".wav", ".lip"))
+                os.utime(self.wav_path(key)) # mark as recently used for the next time the index is loaded
+            except Exception as e:
+                logging.warning(f"Failed to read voiceline {key} from the voiceline cache: {e}")
+                self.total_size -= self.entries.pop(key)
+                self.remove_files(key)
+                self.hits -= 1
+                self.misses += 1
+                return False
+        return True
+
+    def put(self, key, final_voiceline_file):
+        """Store a finished voiceline and its lip file in the cache"""
+        lip_file = final_voiceline_file.replace(".wav", ".lip")
+        temp_suffix = f".{threading.get_ident()}.tmp" # synthesis workers may be writing the same voiceline at the same time
+        try:
+            size = os.path.getsize(final_voiceline_file)
+            shutil.copyfile(final_voiceline_file, self.wav_path(key) + temp_suffix)
+            if os.path.exists(lip_file):
+                size += os.path.getsize(lip_file)
+                shutil.copyfile(lip_file, self.lip_path(key) + temp_suffix)
+                os.replace(self.lip_path(key) + temp_suffix, self.lip_path(key))
+            os.replace(self.wav_path(key) + temp_suffix, self.wav_path(key)) # the .wav is written last so a voiceline is only ever found with its lip file
+        except Exception as e:
+            logging.warning(f"Failed to add voiceline to the voiceline cache: {e}")
+            return
+        with self.lock:
+            if key in self.entries:
+                self.total_size -= self.entries.pop(key)
+            self.entries[key] = size
+            self.total_size += size
+            self.evict()
+
+    def evict(self):
+        """Remove the least recently used voicelines until the cache fits in max_size - Caller must hold the lock(or be the constructor)"""
+        while self.total_size > self.max_size and len(self.entries) > 0:
+            key, size = self.entries.popitem(last=False)
+            self.total_size -= size
+            self.remove_files(key)
+
+    def remove_files(self, key):
+        for path in [self.wav_path(key), self.lip_path(key)]:
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+            except Exception as e:
+                logging.warning(f"Failed to remove {path} from the voiceline cache: {e}")
+
+    def stats(self):
+        """Return the hit/miss counters and current size of the cache"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups > 0 else 0.0,
+                "voicelines": len(self.entries),
+                "size_mb": round(self.total_size / 1024 / 1024, 2),
+                "max_size_mb": round(self.max_size / 1024 / 1024, 2),
+            }
@@ -0,0 +1,127 @@
+import argparse
+import io
+import json
+import threading
+import time
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Stands in for the xVASynth, xTTS API and koboldcpp servers so the HTTP clients can be tested and benchmarked offline.
+# Every backend is served from the same port since none of their paths overlap - point xvasynth_base_url, xtts_api_base_url and alternative_openai_api_base at it.
+
+VOICES = ["FemaleEvenToned", "MaleEvenToned", "FemaleNord", "MaleNord"]
+MODELS = ["main", "v2.0.2"]
+
+def silent_wav(seconds=0.1, sample_rate=22050):
+    """A silent 16 bit mono wav file"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(b"\x00\x00" * int(seconds * sample_rate))
+    return buffer.getvalue()
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep connections alive like the real servers do
+    disable_nagle_algorithm = True # otherwise the headers and body of a response on a kept alive connection can be held back ~40ms waiting for a delayed ACK
+    latency = 0.0 # seconds added to every response, set by StubServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, status, body, content_type="application/json"):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        if length == 0:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except json.JSONDecodeError:
+            return {}
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        if self.path == "/":
+            self.send(200, b"xVASynth stub", "text/plain")
+        elif self.path == "/speakers_list/":
+            self.send(200, VOICES)
+        elif self.path == "/get_models_list/":
+            self.send(200, MODELS)
+        else:
+            self.send(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        data = self.read_json()
+        time.sleep(self.latency)
+        if self.path == "/getAvailableVoices":
+            game = "skyrim"
+            self.send(200, {game: [{"voiceName": voice} for voice in VOICES]})
+        elif self.path in ["/setAvailableVoices", "/loadModel", "/setVocoder", "/switch_model", "/set_tts_settings/"]:
+            self.send(200, {"message": "ok"})
+        elif self.path == "/synthesize": # xVASynth writes the voiceline to the path it's given
+            if "outfile" in data:
+                with open(data["outfile"], "wb") as f:
+                    f.write(silent_wav())
+            self.send(200, b"", "text/plain")
+        elif self.path == "/synthesize_batch":
+            for line in data.get("linesBatch", []):
+                if len(line) > 4 and isinstance(line[4], str):
+                    with open(line[4], "wb") as f:
+                        f.write(silent_wav())
+            self.send(200, b"", "text/plain")
+        elif self.path == "/tts_to_audio/": # the xTTS API returns the voiceline in the response
+            self.send(200, silent_wav(), "audio/wav")
+        elif self.path == "/extra/tokencount": # koboldcpp, roughly one token per word
+            self.send(200, {"value": len(str(data.get("prompt", "")).split())})
+        else:
+            self.send(404, {"error": f"Unknown path {self.path}"})
+
+class StubServer:
+    """Runs the stub backends on a background thread - use as a context manager, or call start() and stop()"""
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0):
+        handler = type("ConfiguredStubHandler", (StubHandler,), {"latency": latency})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="stub_server", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run stub xVASynth, xTTS API and koboldcpp servers for offline testing')
+    parser.add_argument('--host', type=str, default="127.0.0.1", help='Host to listen on')
+    parser.add_argument('--port', type=int, default=8008, help='Port to listen on')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response')
+    args = parser.parse_args()
+    stub_server = StubServer(args.host, args.port, args.latency)
+    print(f"Stub server listening on {stub_server.base_url}")
+    try:
+        stub_server.server.serve_forever()
+    except KeyboardInterrupt:
+        stub_server.server.server_close()
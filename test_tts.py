@@ -16,6 +16,7 @@ print("Starting Pantella TTS Test Script")
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Test TTS')
     parser.add_argument('--initialize', action='store_true', help='Initialize the conversation manager')
+    parser.add_argument('--warm_up_speaker_embeddings', action='store_true', help='Prepare the speaker embeddings of every voice in data/voice_samples for the TTS engines that use them, then exit')
     args = parser.parse_args()
     try:
         config = config_loader.ConfigLoader() # Load config from config.json
@@ -39,6 +40,11 @@ if __name__ == '__main__':
         logging.error(tb)
         input("Press Enter to exit.")
         raise e
+    if args.warm_up_speaker_embeddings:
+        done, failed = conversation_manager.synthesizer.warm_up_speaker_embeddings()
+        logging.success(f"Speaker embeddings ready for {done} voices, {failed} failed")
+        logging.flush()
+        exit()
     voice_model = "MaleNord"
     while True:
         user_input = input("Enter text to convert to speech: ")
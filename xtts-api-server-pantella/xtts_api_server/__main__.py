@@ -18,6 +18,8 @@ parser.add_argument("--listen", action='store_true', help="Allows the server to
 parser.add_argument("--lowvram", action='store_true', help="Enable low vram mode which switches the model to RAM when not actively processing.")
 parser.add_argument("--deepspeed", action='store_true', help="Enables deepspeed mode, speeds up processing by several times.")
 parser.add_argument("--use-cache", action='store_true', help="Enables caching of results, your results will be saved and if there will be a repeated request, you will get a file instead of generation.")
+parser.add_argument("--cache-max-size-mb", default=1024, type=int, help="Maximum size of the cached results in MB, the least recently used results are deleted past it. 0 for no limit.")
+parser.add_argument("--cache-max-age-days", default=30, type=int, help="Cached results older than this many days are deleted. 0 for no limit.")
 parser.add_argument("--streaming-mode", action='store_true', help="Enables streaming mode, currently needs a lot of work.")
 parser.add_argument("--streaming-mode-improve", action='store_true', help="Includes an improved streaming mode that consumes 2gb more VRAM and uses a better tokenizer, good for languages such as Chinese")
 parser.add_argument("--stream-play-sync", action='store_true', help="Additional flag for streaming mod that allows you to play all audio one at a time without interruption")
@@ -39,6 +41,8 @@ os.environ['TUNNEL_URL'] = args.tunnel  # it is necessary to correctly return co
 os.environ['MODEL_SOURCE'] = args.model_source  # Set environment variable for the model source
 os.environ["MODEL_VERSION"] = args.version # Specify version of XTTS model
 os.environ["USE_CACHE"] = str(args.use_cache).lower() # Enable caching results
+os.environ["CACHE_MAX_SIZE_MB"] = str(args.cache_max_size_mb) # Maximum size of the result cache
+os.environ["CACHE_MAX_AGE_DAYS"] = str(args.cache_max_age_days) # Maximum age of cached results
 os.environ["DEEPSPEED"] = str(args.deepspeed).lower() # Enable deepspeed
 os.environ["LOWVRAM_MODE"] = str(args.lowvram).lower() # Set lowvram mode
 os.environ["STREAM_MODE"] = str(args.streaming_mode).lower() # Enable Streaming mode
@@ -0,0 +1,126 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from loguru import logger
+
+class ResultCache:
+    """ Persistent cache of generated audio files, indexed by a hash of everything that affects the result.
+
+    Entries are kept in an SQLite database next to the cached files so they survive restarts.
+    The least recently used entries (and their wav files) are evicted once the cache is bigger than max_size_mb, and entries older than max_age_days are evicted too.
+    """
+    def __init__(self, output_folder, max_size_mb=1024, max_age_days=30):
+        self.db_path = os.path.join(output_folder, "cache.sqlite3")
+        self.max_size = max_size_mb * 1024 * 1024 if max_size_mb > 0 else None # None means no limit
+        self.max_age = max_age_days * 24 * 60 * 60 if max_age_days > 0 else None
+        self.lock = threading.Lock() # FastAPI runs sync endpoints on a thread pool, so requests can hit the cache at the same time
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                file_path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )""")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+        self.remove_missing_files()
+        self.evict()
+        logger.info(f"Result cache loaded from {self.db_path} with {self.stats()['entries']} entries")
+
+    @staticmethod
+    def make_key(params):
+        """ Hash the parameters of a request into a cache key. """
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """ Get the path of the cached file for a key, or None if there isn't one. """
+        with self.lock, self.connection:
+            row = self.connection.execute("SELECT file_path FROM results WHERE key = ?", (key,)).fetchone()
+            if row is not None and not os.path.exists(row[0]): # Deleted from outside the cache
+                self.connection.execute("DELETE FROM results WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.connection.execute("UPDATE results SET last_used = ?, hits = hits + 1 WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, file_path):
+        """ Add a generated file to the cache, evicting old entries if the cache is now too big. """
+        if not os.path.exists(file_path):
+            logger.warning(f"Not caching {file_path}, the file does not exist.")
+            return
+        file_path = os.path.abspath(file_path)
+        now = time.time()
+        with self.lock, self.connection:
+            old = self.connection.execute("SELECT file_path FROM results WHERE key = ?", (key,)).fetchone()
+            self.connection.execute("INSERT OR REPLACE INTO results (key, file_path, size, created, last_used, hits) VALUES (?, ?, ?, ?, ?, 0)",
+                                    (key, file_path, os.path.getsize(file_path), now, now))
+        if old is not None and old[0] != file_path: # Another request generated the same result at the same time
+            self.remove_file(old[0])
+        self.evict()
+
+    def evict(self):
+        """ Remove entries older than max_age, then the least recently used entries until the cache fits in max_size. """
+        evicted = []
+        with self.lock, self.connection:
+            if self.max_age is not None:
+                cutoff = time.time() - self.max_age
+                evicted += self.connection.execute("SELECT key, file_path FROM results WHERE created < ?", (cutoff,)).fetchall()
+                self.connection.execute("DELETE FROM results WHERE created < ?", (cutoff,))
+            if self.max_size is not None:
+                total_size = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+                if total_size > self.max_size:
+                    for key, file_path, size in self.connection.execute("SELECT key, file_path, size FROM results ORDER BY last_used").fetchall():
+                        if total_size <= self.max_size:
+                            break
+                        evicted.append((key, file_path))
+                        total_size -= size
+                    self.connection.executemany("DELETE FROM results WHERE key = ?", [(key,) for key, _ in evicted])
+            self.evictions += len(evicted)
+        for _, file_path in evicted:
+            self.remove_file(file_path)
+        if len(evicted) > 0:
+            logger.info(f"Evicted {len(evicted)} results from the cache.")
+
+    def remove_missing_files(self):
+        """ Remove entries whose files were deleted while the server wasn't running. """
+        with self.lock, self.connection:
+            rows = self.connection.execute("SELECT key, file_path FROM results").fetchall()
+            missing = [(key,) for key, file_path in rows if not os.path.exists(file_path)]
+            self.connection.executemany("DELETE FROM results WHERE key = ?", missing)
+        if len(missing) > 0:
+            logger.info(f"Removed {len(missing)} cached results whose files no longer exist.")
+
+    def remove_file(self, file_path):
+        try:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        except OSError as e:
+            logger.warning(f"Could not remove cached result {file_path}: {e}")
+
+    def stats(self):
+        """ Hit rate counters since the server started, and the current size of the cache. """
+        with self.lock:
+            entries, size = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+            requests = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests > 0 else 0.0,
+                "evictions": self.evictions,
+                "entries": entries,
+                "size_mb": round(size / (1024 * 1024), 2),
+                "max_size_mb": round(self.max_size / (1024 * 1024), 2) if self.max_size is not None else None,
+                "max_age_days": self.max_age / (24 * 60 * 60) if self.max_age is not None else None,
+            }
@@ -33,6 +33,8 @@ MODEL_VERSION = os.getenv("MODEL_VERSION","v2.0.2")
 LOWVRAM_MODE = os.getenv("LOWVRAM_MODE") == 'true'
 DEEPSPEED = os.getenv("DEEPSPEED") == 'true'
 USE_CACHE = os.getenv("USE_CACHE") == 'true'
+CACHE_MAX_SIZE_MB = int(os.getenv("CACHE_MAX_SIZE_MB", "1024"))
+CACHE_MAX_AGE_DAYS = int(os.getenv("CACHE_MAX_AGE_DAYS", "30"))
 
 # STREAMING VARS
 STREAM_MODE = os.getenv("STREAM_MODE") == 'true'
@@ -44,7 +46,7 @@ if(DEEPSPEED):
 
 # Create an instance of the TTSWrapper class and server
 app = FastAPI()
-XTTS = TTSWrapper(OUTPUT_FOLDER,SPEAKER_FOLDER,LATENT_SPEAKER_FOLDER,MODEL_FOLDER,LOWVRAM_MODE,MODEL_SOURCE,MODEL_VERSION,DEVICE,DEEPSPEED,USE_CACHE)
+XTTS = TTSWrapper(OUTPUT_FOLDER,SPEAKER_FOLDER,LATENT_SPEAKER_FOLDER,MODEL_FOLDER,LOWVRAM_MODE,MODEL_SOURCE,MODEL_VERSION,DEVICE,DEEPSPEED,USE_CACHE,CACHE_MAX_SIZE_MB,CACHE_MAX_AGE_DAYS)
 
 # Check for old format model version
 XTTS.model_version = XTTS.check_model_version_old_format(MODEL_VERSION)
@@ -183,6 +185,10 @@ def get_tts_settings():
     settings = {**XTTS.tts_settings,"stream_chunk_size":XTTS.stream_chunk_size}
     return settings
 
+@app.get("/stats")
+def get_stats():
+    return {"cache": XTTS.cache_stats()}
+
 @app.get("/sample/{file_name:path}")
 def get_sample(file_name: str):
     # A fix for path traversal vulenerability. 
@@ -9,6 +9,7 @@ from TTS.tts.models.xtts import Xtts
 from pathlib import Path
 
 from xtts_api_server.modeldownloader import download_model,check_tts_version
+from xtts_api_server.result_cache import ResultCache
 
 from loguru import logger
 from datetime import datetime
@@ -20,6 +21,7 @@ import socket
 import io
 import wave
 import numpy as np
+from uuid import uuid4
 
 # Class to check tts settings
 class InvalidSettingsError(Exception):
@@ -62,7 +64,7 @@ official_model_list_v2 = ["2.0.0","2.0.1","2.0.2","2.0.3"]
 reversed_supported_languages = {name: code for code, name in supported_languages.items()}
 
 class TTSWrapper:
-    def __init__(self,output_folder = "./output", speaker_folder="./speakers",latent_speaker_folders = "./latent_speakers",model_folder="./xtts_folder",lowvram = False,model_source = "local",model_version = "2.0.2",device = "cuda",deepspeed = False,enable_cache_results = True):
+    def __init__(self,output_folder = "./output", speaker_folder="./speakers",latent_speaker_folders = "./latent_speakers",model_folder="./xtts_folder",lowvram = False,model_source = "local",model_version = "2.0.2",device = "cuda",deepspeed = False,enable_cache_results = True,cache_max_size_mb = 1024,cache_max_age_days = 30):
         self.cuda = device # If the user has chosen what to use, we rewrite the value to the value we want to use
         self.device = 'cpu' if lowvram else (self.cuda if torch.cuda.is_available() else "cpu")
         self.lowvram = lowvram  # Store whether we want to run in low VRAM mode.
@@ -93,16 +95,15 @@ class TTSWrapper:
         check_tts_version()
 
         self.enable_cache_results = enable_cache_results
-        self.cache_file_path = os.path.join(output_folder, "cache.json")
+        self.result_cache = None
 
         self.is_official_model = True
         
         self.current_model = None
         
         if self.enable_cache_results:
-            # Reset the contents of the cache file at each initialization.
-            with open(self.cache_file_path, 'w') as cache_file:
-                json.dump({}, cache_file)
+            # The cache is kept between restarts, see result_cache.py
+            self.result_cache = ResultCache(output_folder, cache_max_size_mb, cache_max_age_days)
     # HELP FUNC
     def isModelOfficial(self,model_version):
         if model_version in official_model_list:
@@ -134,46 +135,39 @@ class TTSWrapper:
         return wav_buf.read()
 
     # CACHE FUNCS
+    def get_cache_key(self, text_params):
+        # Everything that changes the generated audio, so a result is only reused for the same model and settings
+        return ResultCache.make_key({**text_params, 'model_version': self.model_version, 'model_source': self.model_source, 'tts_settings': self.tts_settings})
+
+    def get_speaker_files_signature(self, paths):
+        # Path, mtime and size of each of the speaker's files that exist, so results made with an old sample aren't reused
+        signature = []
+        for path in paths:
+            if isinstance(path, list): # a speaker with several samples
+                signature += self.get_speaker_files_signature(path)
+                continue
+            if path is None or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            signature.append([os.path.abspath(path), stat.st_mtime_ns, stat.st_size])
+        return signature
+
     def check_cache(self, text_params):
         if not self.enable_cache_results:
             return None
-
-        try:
-            with open(self.cache_file_path) as cache_file:
-                cache_data = json.load(cache_file)
-
-            for entry in cache_data.values():
-                if all(entry[key] == value for key, value in text_params.items()):
-                    return entry['file_name']
-
-            return None
-
-        except FileNotFoundError:
-            return None
+        return self.result_cache.get(self.get_cache_key(text_params))
 
     def update_cache(self, text_params, file_name):
         if not self.enable_cache_results:
             return None
-        try:
-            # Check if the file exists and its contents before downloading.
-            if os.path.exists(self.cache_file_path) and os.path.getsize(self.cache_file_path) > 0:
-                with open(self.cache_file_path, 'r') as cache_file:
-                    cache_data = json.load(cache_file)
-            else:
-                cache_data = {}  # Initialization of an empty dictionary if the file does not exist or is empty.
-
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            cache_data[timestamp] = {**text_params, 'file_name': file_name}
+        self.result_cache.put(self.get_cache_key(text_params), file_name)
+        logger.info("Cache updated successfully.")
 
-            with open(self.cache_file_path, 'w') as cache_file:
-                json.dump(cache_data, cache_file)
+    def cache_stats(self):
+        if not self.enable_cache_results:
+            return {"enabled": False}
+        return {"enabled": True, **self.result_cache.stats()}
 
-            logger.info("Cache updated successfully.")
-        except IOError as e:
-            print("I/O error occurred while updating the cache: ", str(e))
-        except json.JSONDecodeError as e:
-            print("JSON decode error occurred while updating the cache: ", str(e))
-            
     # LOAD FUNCS
     def load_model(self,load=True):
         if self.model_source == "api":
@@ -780,12 +774,6 @@ class TTSWrapper:
                 with open(text, 'r', encoding='utf-8') as f:
                     text = f.read()
 
-            # Generate unic name for cached result
-            if self.enable_cache_results:
-                timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-                file_name_or_path = timestamp + "_cache_" + file_name_or_path
-                output_file = os.path.join(self.output_folder, file_name_or_path)
-
             # Replace double quotes with single, asterisks, carriage returns, and line feeds
             clear_text = self.clean_text(text)
 
@@ -795,9 +783,15 @@ class TTSWrapper:
               'speaker_name_or_path': speaker_name_or_path,
               'language': language,
               'accent': accent,
-              'file_name_or_path': file_name_or_path
+              'speaker_files': self.get_speaker_files_signature([speaker_json_path, speaker_wav if speaker_wav != "out.wav" else None]), # replacing a speaker's latents or sample changes the key, "out.wav" is only a placeholder when the latents are used
             }
 
+            # Generate unic name for cached result, so requests generating at the same time can't overwrite each other's files
+            if self.enable_cache_results:
+                timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+                file_name_or_path = timestamp + "_" + uuid4().hex[:8] + "_cache_" + os.path.basename(file_name_or_path)
+                output_file = os.path.join(self.output_folder, file_name_or_path)
+
             # Check if results are already cached.
             cached_result = self.check_cache(text_params)
 